@@ -165,6 +165,9 @@ CORS_ALLOW_HEADERS = [
     "accept",
     "authorization",
     "content-type",
+    # Raw-body uploads: the file's name, and its compression
+    "content-disposition",
+    "content-encoding",
 ]
 
 # --- DJANGO REST FRAMEWORK ---
@@ -184,3 +187,57 @@ SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
 }
+
+# --- EQUIPMENT INGESTION ---
+# Rows parsed and written per chunk when streaming an upload into the database
+EQUIPMENT_INGEST_CHUNK_SIZE = int(os.environ.get('EQUIPMENT_INGEST_CHUNK_SIZE', 50000))
+# CSV parser: 'pyarrow', 'c' (pandas), or 'auto' to use pyarrow when it is installed
+EQUIPMENT_CSV_ENGINE = os.environ.get('EQUIPMENT_CSV_ENGINE', 'auto')
+# Bytes per chunk of a chunked upload (datasets/uploads/)
+EQUIPMENT_UPLOAD_CHUNK_SIZE = int(os.environ.get('EQUIPMENT_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+# Largest file a chunked upload may declare, in bytes; 0 means no limit
+EQUIPMENT_UPLOAD_MAX_SIZE = int(os.environ.get('EQUIPMENT_UPLOAD_MAX_SIZE', 0) or 0) or None
+# Chunked uploads untouched for this many hours are deleted with their partial files
+EQUIPMENT_UPLOAD_EXPIRY_HOURS = int(os.environ.get('EQUIPMENT_UPLOAD_EXPIRY_HOURS', 24))
+# Rejected rows stored per tolerant upload for the diagnostics endpoint (all are counted)
+EQUIPMENT_QUARANTINE_MAX_ROWS = int(os.environ.get('EQUIPMENT_QUARANTINE_MAX_ROWS', 100000))
+# Rows sent per executemany round trip when inserting equipment
+EQUIPMENT_INSERT_BATCH_SIZE = int(os.environ.get('EQUIPMENT_INSERT_BATCH_SIZE', 5000))
+# Rows sampled per equipment type for the precomputed quantiles (exact below this)
+EQUIPMENT_STATS_SAMPLE_SIZE = int(os.environ.get('EQUIPMENT_STATS_SAMPLE_SIZE', 20000))
+# Default dataset retention per user; RetentionPolicy rows override it. 0 or empty means no limit.
+EQUIPMENT_RETENTION_MAX_DATASETS = int(os.environ.get('EQUIPMENT_RETENTION_MAX_DATASETS', 5) or 0) or None
+EQUIPMENT_RETENTION_MAX_AGE_DAYS = int(os.environ.get('EQUIPMENT_RETENTION_MAX_AGE_DAYS') or 0) or None
+# Prune the uploader's expired datasets at the end of each upload job
+EQUIPMENT_RETENTION_ON_UPLOAD = os.environ.get('EQUIPMENT_RETENTION_ON_UPLOAD', 'True').lower() in ('true', '1', 'yes')
+# Rows fetched per round trip from the server-side cursor when exporting a dataset
+EQUIPMENT_EXPORT_CHUNK_SIZE = int(os.environ.get('EQUIPMENT_EXPORT_CHUNK_SIZE', 2000))
+# Equipment rows listed at the end of each PDF report (0 to omit the listing)
+EQUIPMENT_REPORT_SAMPLE_ROWS = int(os.environ.get('EQUIPMENT_REPORT_SAMPLE_ROWS', 500))
+# Threads per Gunicorn worker rendering reports for bulk ZIP exports
+EQUIPMENT_REPORT_WORKERS = int(os.environ.get('EQUIPMENT_REPORT_WORKERS', 4))
+# Where upload jobs run: 'thread' for a background worker pool, 'inline' to run in the request
+EQUIPMENT_INGEST_EXECUTOR = os.environ.get('EQUIPMENT_INGEST_EXECUTOR', 'thread')
+EQUIPMENT_INGEST_WORKERS = int(os.environ.get('EQUIPMENT_INGEST_WORKERS', 2))
+# Pending or running jobs with no progress for this many seconds are failed
+# (their worker was restarted or killed) when polled or by prune_datasets
+EQUIPMENT_INGEST_STALE_SECONDS = int(os.environ.get('EQUIPMENT_INGEST_STALE_SECONDS', 15 * 60))
+
+# --- RESPONSE CACHE ---
+# Rendered dataset summaries and history. Invalidation must reach every
+# Gunicorn worker, so the cache lives on the filesystem (by default under
+# MEDIA_ROOT, which is not served); with several instances, point
+# EQUIPMENT_CACHE_DIR at storage they share.
+EQUIPMENT_CACHE_DIR = os.environ.get('EQUIPMENT_CACHE_DIR') or os.path.join(MEDIA_ROOT, 'cache')
+EQUIPMENT_CACHE_TIMEOUT = int(os.environ.get('EQUIPMENT_CACHE_TIMEOUT', 24 * 60 * 60))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'equipments': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': EQUIPMENT_CACHE_DIR,
+        'TIMEOUT': EQUIPMENT_CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
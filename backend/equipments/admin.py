@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Dataset, Equipment
+from .models import Dataset, Equipment, IngestJob, RetentionPolicy
 
 @admin.register(Dataset)
 class DatasetAdmin(admin.ModelAdmin):
@@ -7,4 +7,12 @@ class DatasetAdmin(admin.ModelAdmin):
 
 @admin.register(Equipment)
 class EquipmentAdmin(admin.ModelAdmin):
-    list_display = ['equipment_name', 'equipment_type', 'dataset']
\ No newline at end of file
+    list_display = ['equipment_name', 'equipment_type', 'dataset']
+
+@admin.register(IngestJob)
+class IngestJobAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'user', 'state', 'rows_processed', 'created_at']
+
+@admin.register(RetentionPolicy)
+class RetentionPolicyAdmin(admin.ModelAdmin):
+    list_display = ['user', 'max_datasets', 'max_age_days']
\ No newline at end of file
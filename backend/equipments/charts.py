@@ -0,0 +1,97 @@
+import numpy as np
+
+from .models import Equipment
+from .schema import EQUIPMENT_COLUMNS, NUMERIC_COLUMNS
+from .stats import type_stats
+
+
+PARAMETERS = [EQUIPMENT_COLUMNS[column] for column in NUMERIC_COLUMNS]
+DOWNSAMPLE_METHODS = ['lttb', 'minmax']
+
+
+def lttb(y, threshold):
+    """
+    Return the indices kept by Largest-Triangle-Three-Buckets downsampling.
+
+    x is taken to be the row position. The first and last points are always
+    kept, and every bucket in between contributes the point that forms the
+    largest triangle with the previous pick and the next bucket's average.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype='float64')
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype='int64')
+    selected[0] = a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def minmax(y, threshold):
+    """Return the indices of the minimum and maximum of each of threshold / 2 buckets"""
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+    picks = []
+    for bucket in np.array_split(np.arange(n), threshold // 2):
+        values = y[bucket]
+        picks.extend([bucket[values.argmin()], bucket[values.argmax()]])
+    return np.unique(picks)
+
+
+def load_parameters(dataset):
+    """Load ids and parameter values of a dataset in row order as a structured array"""
+    queryset = Equipment.objects.filter(dataset=dataset).order_by('id').values_list('id', *PARAMETERS)
+    dtype = [('id', 'int64')] + [(name, 'float64') for name in PARAMETERS]
+    return np.fromiter(queryset.iterator(chunk_size=10000), dtype=dtype)
+
+
+def chart_data(dataset, bins=20, points=500, method='lttb'):
+    """
+    Build bounded chart series for a dataset.
+
+    The response size depends on the number of types, bins and points, not on
+    the number of equipment rows.
+    """
+    values = load_parameters(dataset)
+    downsample = lttb if method == 'lttb' else minmax
+
+    histograms = {}
+    series = {}
+    selected_ids = set()
+    for name in PARAMETERS:
+        column = values[name]
+        if len(column):
+            counts, edges = np.histogram(column, bins=bins)
+        else:
+            counts, edges = np.zeros(0, dtype='int64'), np.zeros(0)
+        histograms[name] = {'edges': edges.tolist(), 'counts': counts.tolist()}
+
+        indices = downsample(column, points)
+        series[name] = {'x': indices.tolist(), 'y': column[indices].tolist(), 'ids': values['id'][indices].tolist()}
+        selected_ids.update(series[name]['ids'])
+
+    names = dict(Equipment.objects.filter(id__in=selected_ids).values_list('id', 'equipment_name'))
+    for name in PARAMETERS:
+        series[name]['labels'] = [names[pk] for pk in series[name].pop('ids')]
+
+    return {
+        'dataset': dataset.id,
+        'total_count': len(values),
+        'equipment_distribution': dataset.equipment_distribution,
+        'per_type': type_stats(dataset),
+        'histograms': histograms,
+        'series': {'method': method, 'points': points, **series},
+    }
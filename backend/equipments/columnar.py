@@ -0,0 +1,173 @@
+"""
+Columnar binary encoding of equipment rows.
+
+Served for ``Accept: application/vnd.chemviz.columnar`` (or ``?format=columnar``)
+on ``datasets/{id}/`` and ``datasets/{id}/equipment/``; clients that also take
+JSON can send ``application/vnd.chemviz.columnar, application/json;q=0.5``
+(see QualityContentNegotiation). The layout is:
+
+    bytes 0-7    magic ``CHEMVIZC``
+    bytes 8-11   header length N, uint32 little-endian
+    bytes 12-    N bytes of UTF-8 JSON header, zero padded to a multiple of 8
+    body         column buffers, each starting on an 8-byte boundary
+
+The header is::
+
+    {
+        "version": 1,
+        "rows": <row count>,
+        "metadata": {...},            # dataset summary / pagination links
+        "columns": [
+            {"name": ..., "type": ..., "buffers": [{"offset": ..., "length": ...}], ...}
+        ]
+    }
+
+Buffer offsets are relative to the start of the body. Column types:
+
+    int64 / float64  one little-endian buffer of values
+    dictionary       one int32 buffer of codes into the column's "dictionary" list
+    utf8             an int32 buffer of rows + 1 offsets, then the UTF-8 data buffer
+
+Fixed-width buffers can be mapped without copying, e.g. with
+``numpy.frombuffer(payload, '<f8', count=rows, offset=body + buffer['offset'])``.
+"""
+import json
+import struct
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.mediatypes import media_type_matches, order_by_precedence
+
+
+MAGIC = b'CHEMVIZC'
+VERSION = 1
+MEDIA_TYPE = 'application/vnd.chemviz.columnar'
+
+# Equipment columns in wire order, with their encodings.
+COLUMN_TYPES = {
+    'id': 'int64',
+    'equipment_name': 'utf8',
+    'equipment_type': 'dictionary',
+    'flowrate': 'float64',
+    'pressure': 'float64',
+    'temperature': 'float64',
+}
+
+ColumnarData = namedtuple('ColumnarData', ['frame', 'metadata'])
+
+
+def _pad(length):
+    return -length % 8
+
+
+def _column_buffers(series, column_type):
+    """Return (extra header fields, [buffer bytes]) for one column"""
+    if column_type in ('int64', 'float64'):
+        return {}, [series.to_numpy(dtype='<' + column_type[0] + '8').tobytes()]
+    if column_type == 'dictionary':
+        categorical = pd.Categorical(series)
+        codes = categorical.codes.astype('<i4')
+        return {'dictionary': [str(value) for value in categorical.categories]}, [codes.tobytes()]
+    encoded = [str(value).encode('utf-8') for value in series]
+    offsets = np.zeros(len(encoded) + 1, dtype='<i4')
+    lengths = np.fromiter((len(value) for value in encoded), dtype='<i4', count=len(encoded))
+    np.cumsum(lengths, out=offsets[1:])
+    return {}, [offsets.tobytes(), b''.join(encoded)]
+
+
+def _wire_columns(columns):
+    return [name for name in COLUMN_TYPES if columns is None or name in columns]
+
+
+def equipment_frame(queryset, columns=None):
+    """Load the given equipment columns of a queryset into a DataFrame"""
+    columns = _wire_columns(columns)
+    return pd.DataFrame.from_records(queryset.values_list(*columns), columns=columns)
+
+
+def records_frame(records, columns=None):
+    """Build a DataFrame from already fetched values() rows, keeping only columns"""
+    columns = _wire_columns(columns)
+    return pd.DataFrame.from_records(records, columns=columns)
+
+
+def encode(frame, metadata=None):
+    """Encode a DataFrame of equipment columns into the layout described above"""
+    header_columns = []
+    buffers = []
+    offset = 0
+    for name in frame.columns:
+        column_type = COLUMN_TYPES[name]
+        extra, column_buffers = _column_buffers(frame[name], column_type)
+        entry = {'name': name, 'type': column_type, 'buffers': [], **extra}
+        for buffer in column_buffers:
+            entry['buffers'].append({'offset': offset, 'length': len(buffer)})
+            buffers.append(buffer + b'\0' * _pad(len(buffer)))
+            offset += len(buffers[-1])
+        header_columns.append(entry)
+
+    header = json.dumps({
+        'version': VERSION,
+        'rows': len(frame),
+        'metadata': metadata or {},
+        'columns': header_columns,
+    }, default=str).encode('utf-8')
+    prefix = MAGIC + struct.pack('<I', len(header)) + header
+    return b''.join([prefix, b'\0' * _pad(len(prefix)), *buffers])
+
+
+class ColumnarRenderer(BaseRenderer):
+    media_type = MEDIA_TYPE
+    format = 'columnar'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, ColumnarData):
+            return encode(data.frame, data.metadata)
+        # Errors and other non-tabular payloads still go out as JSON.
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return JSONRenderer().render(data, renderer_context=renderer_context)
+
+
+def _quality(media_type):
+    """The q-value of an Accept entry (1 when absent or malformed)"""
+    for param in media_type.split(';')[1:]:
+        key, _, value = param.partition('=')
+        if key.strip() == 'q':
+            try:
+                return float(value)
+            except ValueError:
+                break
+    return 1.0
+
+
+class QualityContentNegotiation(DefaultContentNegotiation):
+    """
+    Content negotiation that honours Accept q-values.
+
+    DRF ranks Accept entries by specificity alone, so "columnar,
+    application/json;q=0.5" is answered by whichever matching renderer is
+    listed first, JSON. Here the renderer is chosen from the highest-q
+    entries first; DRF then picks the media type for it as usual.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        if format_suffix or request.query_params.get(self.settings.URL_FORMAT_OVERRIDE):
+            return super().select_renderer(request, renderers, format_suffix)
+        by_quality = {}
+        for media_type in self.get_accept_list(request):
+            by_quality.setdefault(_quality(media_type), []).append(media_type)
+        for quality in sorted(by_quality, reverse=True):
+            if quality <= 0:
+                break
+            for media_types in order_by_precedence(by_quality[quality]):
+                for renderer in renderers:
+                    if any(media_type_matches(renderer.media_type, media_type) for media_type in media_types):
+                        return super().select_renderer(request, [renderer], format_suffix)
+        return super().select_renderer(request, renderers, format_suffix)
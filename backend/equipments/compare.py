@@ -0,0 +1,105 @@
+import heapq
+
+from django.db.models import Avg, Count
+
+from .models import Equipment
+from .schema import EQUIPMENT_COLUMNS, NUMERIC_COLUMNS
+
+
+PARAMETERS = [EQUIPMENT_COLUMNS[column] for column in NUMERIC_COLUMNS]
+GROUPS = {'type': 'equipment_type', 'name': 'equipment_name'}
+# Equipment names are as many as the rows, so they are opt-in and paged.
+DEFAULT_GROUPS = ['type']
+NAME_PAGE_SIZE = 100
+MAX_NAME_PAGE_SIZE = 1000
+
+
+def _grouped(dataset_ids, field, keys=None):
+    """One aggregate query: count and parameter means per dataset and group"""
+    queryset = Equipment.objects.filter(dataset_id__in=dataset_ids)
+    if keys is not None:
+        queryset = queryset.filter(**{f'{field}__in': keys})
+    return (
+        queryset
+        .values('dataset_id', field)
+        .annotate(count=Count('id'), **{name: Avg(name) for name in PARAMETERS})
+        .order_by()
+    )
+
+
+def name_page(dataset_ids, after=None, limit=NAME_PAGE_SIZE):
+    """
+    Return the first limit distinct equipment names after the cursor across
+    the datasets, and the cursor for the next page (None on the last).
+
+    Each dataset's names are read in (dataset, name) index order, at most
+    limit + 1 of them, so a page costs the same on any dataset size.
+    """
+    per_dataset = []
+    for pk in dataset_ids:
+        queryset = Equipment.objects.filter(dataset_id=pk)
+        if after is not None:
+            queryset = queryset.filter(equipment_name__gt=after)
+        names = queryset.order_by('equipment_name').values_list('equipment_name', flat=True).distinct()
+        per_dataset.append(list(names[:limit + 1]))
+
+    page = []
+    for name in heapq.merge(*per_dataset):
+        if not page or page[-1] != name:
+            page.append(name)
+        if len(page) > limit:
+            return page[:limit], page[limit - 1]
+    return page, None
+
+
+def _delta(current, previous):
+    if current is None or previous is None:
+        return None
+    return {key: current[key] - previous[key] for key in ['count', *PARAMETERS]}
+
+
+def aligned_deltas(dataset_ids, field, keys=None):
+    """
+    Align per-group aggregates across datasets in the given order, limited
+    to the given group keys if any.
+
+    Each entry holds one values slot per dataset (None where the group is
+    absent) and the change from the previous dataset.
+    """
+    position = {pk: i for i, pk in enumerate(dataset_ids)}
+    aligned = {}
+    for row in _grouped(dataset_ids, field, keys):
+        values = aligned.setdefault(row[field], [None] * len(dataset_ids))
+        values[position[row['dataset_id']]] = {key: row[key] for key in ['count', *PARAMETERS]}
+
+    return [
+        {
+            field: key,
+            'values': values,
+            'deltas': [None] + [_delta(values[i], values[i - 1]) for i in range(1, len(values))],
+        }
+        for key, values in sorted(aligned.items())
+    ]
+
+
+def compare_datasets(datasets, groups=None, after=None, limit=NAME_PAGE_SIZE):
+    """
+    Compare datasets (in the given order) by equipment type and/or name.
+
+    Names are compared a page of limit names after the cursor at a time;
+    'by_name_after' holds the cursor of the next page, or None.
+    """
+    dataset_ids = [dataset.id for dataset in datasets]
+    result = {
+        'datasets': [
+            {'id': dataset.id, 'filename': dataset.filename, 'uploaded_at': dataset.uploaded_at}
+            for dataset in datasets
+        ],
+    }
+    for group in groups or DEFAULT_GROUPS:
+        if group == 'name':
+            names, result['by_name_after'] = name_page(dataset_ids, after, limit)
+            result['by_name'] = aligned_deltas(dataset_ids, GROUPS[group], names)
+        else:
+            result[f'by_{group}'] = aligned_deltas(dataset_ids, GROUPS[group])
+    return result
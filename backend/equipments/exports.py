@@ -0,0 +1,90 @@
+import csv
+import json
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .schema import EQUIPMENT_COLUMNS
+
+
+# Equipment field -> CSV header, so an exported file can be uploaded again.
+CSV_HEADERS = {'id': 'id', **{field: column for column, field in EQUIPMENT_COLUMNS.items()}}
+# Rows formatted per chunk of the streamed response.
+ROWS_PER_CHUNK = 1000
+
+
+class _ExportRenderer(BaseRenderer):
+    """
+    Lets ?format= / Accept select an export format. Rows are streamed by the
+    view; anything rendered here is an error payload, which goes out as JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return JSONRenderer().render(data, renderer_context=renderer_context)
+
+
+class CSVExportRenderer(_ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONExportRenderer(_ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+EXPORT_RENDERERS = [CSVExportRenderer, NDJSONExportRenderer]
+
+
+def export_rows(queryset, fields):
+    """Yield value tuples from a server-side cursor, a chunk at a time"""
+    return queryset.values_list(*fields).iterator(chunk_size=settings.EQUIPMENT_EXPORT_CHUNK_SIZE)
+
+
+class _Lines:
+    """File-like target for csv.writer that collects formatted lines"""
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def take(self):
+        data = ''.join(self.lines)
+        self.lines = []
+        return data
+
+
+def csv_stream(rows, fields):
+    """Yield CSV text: the header at once, then ROWS_PER_CHUNK rows at a time"""
+    lines = _Lines()
+    writer = csv.writer(lines)
+    writer.writerow([CSV_HEADERS[field] for field in fields])
+    yield lines.take()
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % ROWS_PER_CHUNK == 0:
+            yield lines.take()
+    yield lines.take()
+
+
+def ndjson_stream(rows, fields):
+    """Yield one JSON object per line, ROWS_PER_CHUNK rows at a time"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(fields, row))) + '\n')
+        if len(lines) == ROWS_PER_CHUNK:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
+
+
+EXPORT_FORMATS = {
+    'csv': (csv_stream, 'text/csv; charset=utf-8'),
+    'ndjson': (ndjson_stream, 'application/x-ndjson; charset=utf-8'),
+}
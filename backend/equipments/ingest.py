@@ -0,0 +1,305 @@
+import io
+from collections import Counter
+from itertools import islice, repeat
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Variance
+import numpy as np
+import pandas as pd
+
+from .models import Dataset, DatasetTypeStats, Equipment, QuarantinedRow
+from .readers import CSVReader
+from .schema import (
+    EQUIPMENT_COLUMNS, NUMERIC_COLUMNS, REQUIRED_COLUMNS, InvalidRowsError, missing_columns_error, row_errors, typed_chunk,
+)
+from .stats import TypeStatsAccumulator, merge_moments
+
+
+class RunningAggregates:
+    """
+    Dataset summary fields accumulated one chunk at a time.
+
+    Each numeric column keeps mergeable (count, mean, m2) moments, which are
+    stored on the dataset so later appends can continue from them.
+    """
+
+    def __init__(self, total_count=0, moments=None, distribution=None):
+        moments = moments or {}
+        self.total_count = total_count
+        self.moments = {
+            column: tuple(moments.get(EQUIPMENT_COLUMNS[column], (0, 0.0, 0.0)))
+            for column in NUMERIC_COLUMNS
+        }
+        self.distribution = Counter(distribution or {})
+
+    @classmethod
+    def from_dataset(cls, dataset):
+        moments = dataset.parameter_moments or dataset_moments(dataset)
+        return cls(dataset.total_count, moments, dataset.equipment_distribution)
+
+    def update(self, chunk):
+        self.total_count += len(chunk)
+        for column in NUMERIC_COLUMNS:
+            # Match DataFrame.mean(), which skips missing values.
+            values = chunk[column].astype('float64')
+            count = int(values.count())
+            if count:
+                m2 = float(values.var(ddof=0)) * count
+                self.moments[column] = merge_moments(self.moments[column], (count, float(values.mean()), m2))
+        for key, value in chunk['Type'].value_counts().items():
+            # Categorical counts include categories absent from this chunk.
+            if value:
+                self.distribution[key] += int(value)
+
+    def as_fields(self):
+        fields = {
+            'total_count': self.total_count,
+            'equipment_distribution': dict(self.distribution.most_common()),
+            'parameter_moments': {
+                EQUIPMENT_COLUMNS[column]: list(moments) for column, moments in self.moments.items()
+            },
+        }
+        for column, field in NUMERIC_COLUMNS.items():
+            count, mean, _ = self.moments[column]
+            fields[field] = mean if count else 0.0
+        return fields
+
+
+def dataset_moments(dataset):
+    """
+    Compute (count, mean, m2) per parameter from a dataset's stored rows.
+
+    Used once for datasets ingested before the moments were kept.
+    """
+    parameters = [EQUIPMENT_COLUMNS[column] for column in NUMERIC_COLUMNS]
+    aggregates = {}
+    for field in parameters:
+        aggregates[f'{field}_count'] = Count(field)
+        aggregates[f'{field}_mean'] = Avg(field)
+        aggregates[f'{field}_var'] = Variance(field)
+    values = Equipment.objects.filter(dataset=dataset).aggregate(**aggregates)
+    moments = {}
+    for field in parameters:
+        count = values[f'{field}_count']
+        if count:
+            moments[field] = [count, values[f'{field}_mean'], values[f'{field}_var'] * count]
+    return moments
+
+
+def find_duplicate(user, fingerprint):
+    """Return the user's most recent dataset ingested from identical content, if any"""
+    return (
+        Dataset.objects.filter(user=user, content_hash=fingerprint)
+        .order_by('-uploaded_at', '-id')
+        .first()
+    )
+
+
+class RowQuarantine:
+    """
+    Collect the invalid rows of a tolerant upload as QuarantinedRow.
+
+    Only the first EQUIPMENT_QUARANTINE_MAX_ROWS rows are stored; count and
+    summary cover every rejected row.
+    """
+
+    def __init__(self, job, max_rows=None):
+        self.job = job
+        self.max_rows = settings.EQUIPMENT_QUARANTINE_MAX_ROWS if max_rows is None else max_rows
+        self.count = 0
+        self.summary = {}
+
+    def add(self, rows, lines, errors):
+        """Record rows (a DataFrame) found at lines, with their row_errors frame"""
+        for (column, error), count in errors.groupby(['column', 'error']).size().items():
+            by_error = self.summary.setdefault(column, {})
+            by_error[error] = by_error.get(error, 0) + int(count)
+        room = max(self.max_rows - self.count, 0)
+        self.count += len(rows)
+        if not room:
+            return
+        rows, lines = rows.head(room), lines[:room]
+        problems = errors[errors['line'] <= lines[-1]].groupby('line', sort=False)[['column', 'error']]
+        problems = {line: group.to_dict('records') for line, group in problems}
+        # Raw values as text: spreadsheet cells may hold dates or numbers.
+        values = rows.astype('string').astype(object).where(rows.notna(), None).to_dict('records')
+        QuarantinedRow.objects.bulk_create(
+            [
+                QuarantinedRow(job=self.job, line=int(line), values=row, errors=problems[line])
+                for line, row in zip(lines, values)
+            ],
+            batch_size=settings.EQUIPMENT_INSERT_BATCH_SIZE,
+        )
+
+
+def iter_chunks(file, chunk_size=None, reader=None, quarantine=None):
+    """
+    Yield the upload as bounded DataFrames of the schema's columns, cast to
+    their declared types. Columns are checked on the first chunk and every
+    row is validated; invalid rows raise InvalidRowsError with line numbers,
+    or are handed to quarantine (a RowQuarantine) and left out if given.
+
+    reader decodes the file's format (see readers.py); the default is CSV.
+    """
+    chunk_size = chunk_size or settings.EQUIPMENT_INGEST_CHUNK_SIZE
+    reader = reader or CSVReader()
+    line = 2  # the header is line 1
+    for index, chunk in enumerate(reader.chunks(file, chunk_size, as_text=quarantine is not None)):
+        if index == 0 and not all(col in chunk.columns for col in REQUIRED_COLUMNS):
+            raise missing_columns_error()
+        size = len(chunk)
+        errors = row_errors(chunk, line)
+        if not errors.empty:
+            if quarantine is None:
+                raise InvalidRowsError(errors)
+            lines = np.arange(line, line + size)
+            invalid = np.isin(lines, errors['line'].to_numpy())
+            quarantine.add(chunk[REQUIRED_COLUMNS][invalid], lines[invalid], errors)
+            chunk = chunk[~invalid]
+        line += size
+        if len(chunk):
+            yield typed_chunk(chunk)
+
+
+def equipment_columns(chunk):
+    """Project a validated chunk onto Equipment fields with their column types"""
+    columns = {}
+    for column, field in EQUIPMENT_COLUMNS.items():
+        dtype = 'float64' if column in NUMERIC_COLUMNS else str
+        columns[field] = chunk[column].astype(dtype)
+    return columns
+
+
+def _insert_fields():
+    return ['dataset_id', *EQUIPMENT_COLUMNS.values()]
+
+
+def executemany_chunk(dataset, chunk, batch_size):
+    """Insert a chunk with batched executemany, bypassing model instances"""
+    quote = connection.ops.quote_name
+    fields = _insert_fields()
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(Equipment._meta.db_table),
+        ', '.join(quote(field) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    columns = [series.tolist() for series in equipment_columns(chunk).values()]
+    rows = zip(repeat(dataset.pk, len(chunk)), *columns)
+    with connection.cursor() as cursor:
+        while batch := list(islice(rows, batch_size)):
+            cursor.executemany(sql, batch)
+
+
+def copy_chunk(dataset, chunk, batch_size):
+    """
+    Stream a chunk into PostgreSQL with COPY ... FROM STDIN.
+
+    The chunk is re-encoded as CSV into an in-memory buffer, so memory is
+    bounded by the chunk size. batch_size does not apply to COPY.
+    """
+    quote = connection.ops.quote_name
+    frame = pd.DataFrame({'dataset_id': dataset.pk, **equipment_columns(chunk)})
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    text_fields = ', '.join(quote(EQUIPMENT_COLUMNS[column]) for column in ['Equipment Name', 'Type'])
+    sql = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL ({}))'.format(
+        quote(Equipment._meta.db_table),
+        ', '.join(quote(field) for field in _insert_fields()),
+        text_fields,
+    )
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            # psycopg2
+            raw.copy_expert(sql, buffer)
+        else:
+            # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+# Chunk writers keyed by connection.vendor; anything else uses executemany.
+CHUNK_WRITERS = {
+    'postgresql': copy_chunk,
+}
+
+
+def write_chunk(dataset, chunk, batch_size=None):
+    """Insert a chunk of validated rows using the fastest path for the database"""
+    batch_size = batch_size or settings.EQUIPMENT_INSERT_BATCH_SIZE
+    writer = CHUNK_WRITERS.get(connection.vendor, executemany_chunk)
+    writer(dataset, chunk, batch_size)
+
+
+def _ingest_chunks(file, dataset, aggregates, type_stats, chunk_size, batch_size, progress, reader, quarantine):
+    """Fold each chunk into the accumulators and write it; return the rows written"""
+    rows = 0
+    for chunk in iter_chunks(file, chunk_size, reader, quarantine):
+        aggregates.update(chunk)
+        type_stats.update(chunk)
+        write_chunk(dataset, chunk, batch_size)
+        rows += len(chunk)
+        if progress:
+            progress(rows)
+    return rows
+
+
+def _save_summary(dataset, aggregates, type_stats, **extra_fields):
+    fields = {**aggregates.as_fields(), **extra_fields}
+    for name, value in fields.items():
+        setattr(dataset, name, value)
+    dataset.save(update_fields=list(fields))
+    DatasetTypeStats.objects.filter(dataset=dataset).delete()
+    DatasetTypeStats.objects.bulk_create(type_stats.rows(dataset))
+
+
+def ingest_csv(
+    file, user, filename, chunk_size=None, batch_size=None, progress=None, content_hash='', reader=None,
+    quarantine=None,
+):
+    """
+    Stream an upload (CSV unless another reader is given) into a new Dataset.
+
+    Each chunk is folded into the running aggregates and written before the
+    next one is read, so peak memory is bounded by the chunk size rather than
+    the file size. The dataset and its rows are created atomically.
+    progress, if given, is called with the running row count after each chunk.
+    content_hash is stored on the dataset for duplicate upload detection.
+    quarantine, a RowQuarantine, makes invalid rows be set aside rather than
+    fail the upload.
+    """
+    aggregates = RunningAggregates()
+    type_stats = TypeStatsAccumulator()
+    with transaction.atomic():
+        dataset = Dataset.objects.create(user=user, filename=filename, content_hash=content_hash)
+        _ingest_chunks(file, dataset, aggregates, type_stats, chunk_size, batch_size, progress, reader, quarantine)
+        extra_fields = {}
+        if quarantine is not None and quarantine.count:
+            # Rows were left out, so a re-upload of the file is not a duplicate of this dataset.
+            extra_fields['content_hash'] = ''
+        _save_summary(dataset, aggregates, type_stats, **extra_fields)
+    return dataset
+
+
+def append_csv(file, dataset, chunk_size=None, batch_size=None, progress=None, reader=None, quarantine=None):
+    """
+    Stream an upload into an existing dataset and return the rows added.
+
+    The summary fields and per-type statistics continue from the moments
+    stored on the dataset, so the work done is proportional to the appended
+    rows. The dataset row is locked for the duration, so concurrent appends
+    to the same dataset are applied one after the other.
+    """
+    with transaction.atomic():
+        dataset = Dataset.objects.select_for_update().get(pk=dataset.pk)
+        aggregates = RunningAggregates.from_dataset(dataset)
+        type_stats = TypeStatsAccumulator.from_dataset(dataset)
+        rows = _ingest_chunks(
+            file, dataset, aggregates, type_stats, chunk_size, batch_size, progress, reader, quarantine
+        )
+        # The dataset no longer corresponds to any single uploaded file.
+        _save_summary(dataset, aggregates, type_stats, content_hash='')
+    return rows
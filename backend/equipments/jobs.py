@@ -0,0 +1,226 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.utils import timezone
+
+from .ingest import RowQuarantine, append_csv, find_duplicate, ingest_csv
+from .models import IngestJob
+from .readers import reader_for
+from .response_cache import get_cache, invalidate
+from .retention import prune_datasets
+from .schema import IngestError
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+PROGRESS_PREFIX = 'equipments:progress'
+STALE_JOB_ERROR = 'The upload stopped being processed (the server restarted?); please upload the file again'
+
+
+class InlineExecutor:
+    """Run submitted work immediately in the calling thread"""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+
+def get_executor():
+    """Return the process-wide executor configured by EQUIPMENT_INGEST_EXECUTOR"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if settings.EQUIPMENT_INGEST_EXECUTOR == 'inline':
+                _executor = InlineExecutor()
+            else:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.EQUIPMENT_INGEST_WORKERS,
+                    thread_name_prefix='ingest',
+                )
+        return _executor
+
+
+def enqueue_ingest(job):
+    """Schedule a job once the transaction that created it has committed"""
+    executor = get_executor()
+    if isinstance(executor, InlineExecutor):
+        task = run_ingest_job
+    else:
+        task = _run_in_worker
+    transaction.on_commit(lambda: executor.submit(task, job.pk))
+
+
+def _progress_key(job_id):
+    return f'{PROGRESS_PREFIX}:{job_id}'
+
+
+def _reported_progress(job):
+    """(rows, unix time) last reported by the job's worker, in any process, or None"""
+    return get_cache().get(_progress_key(job.pk))
+
+
+def rows_processed(job):
+    if job.is_finished:
+        return job.rows_processed
+    reported = _reported_progress(job)
+    return reported[0] if reported else job.rows_processed
+
+
+class _ProgressReporter:
+    """
+    Publish a running job's row count while its ingest transaction is open.
+
+    The job row cannot carry it: the ingest transaction's writes are
+    invisible to other connections until commit. So progress, with the time
+    it was reported, goes to the shared response cache, where a poll served
+    by any worker reads it and fail_stale_jobs checks the job is alive. Where
+    the database allows a second writer it is also written to the job row
+    through a separate autocommit connection, so it survives cache eviction.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.connection = None
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            self.connection = connections.create_connection(DEFAULT_DB_ALIAS)
+
+    def __call__(self, rows):
+        get_cache().set(_progress_key(self.job_id), (rows, time.time()))
+        if self.connection is None:
+            return
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    'UPDATE {} SET rows_processed = %s WHERE id = %s'.format(
+                        self.connection.ops.quote_name(IngestJob._meta.db_table)
+                    ),
+                    [rows, self.job_id],
+                )
+        except DatabaseError:
+            # Progress is advisory; never fail the ingest over it.
+            pass
+
+    def close(self):
+        get_cache().delete(_progress_key(self.job_id))
+        if self.connection is not None:
+            self.connection.close()
+
+
+def _ingest_upload(job, f, reader, progress, quarantine):
+    """Ingest a new upload, or reuse the dataset of an identical earlier one"""
+    fingerprint = reader.fingerprint(f)
+    dataset = find_duplicate(job.user, fingerprint)
+    if dataset is not None:
+        # Same content as an earlier upload: reuse its rows and statistics,
+        # and count it as the newest upload for history and retention.
+        job.deduplicated = True
+        dataset.uploaded_at = timezone.now()
+        dataset.save(update_fields=['uploaded_at'])
+    else:
+        dataset = ingest_csv(
+            f, job.user, job.filename, progress=progress, content_hash=fingerprint, reader=reader,
+            quarantine=quarantine,
+        )
+    return dataset, dataset.total_count
+
+
+def run_ingest_job(job_id):
+    """Parse, aggregate and insert a stored upload, recording the outcome on the job"""
+    started_at = timezone.now()
+    # A job fail_stale_jobs gave up on while it waited is not run after all.
+    if not IngestJob.objects.filter(pk=job_id, state=IngestJob.PENDING).update(
+        state=IngestJob.RUNNING, started_at=started_at
+    ):
+        return IngestJob.objects.get(pk=job_id)
+    job = IngestJob.objects.select_related('user').get(pk=job_id)
+
+    progress = _ProgressReporter(job.pk)
+    quarantine = RowQuarantine(job) if job.tolerant else None
+    try:
+        reader = reader_for(job.filename, job.content_encoding)
+        if reader is None:
+            raise IngestError(f'Unsupported file type: {job.filename}')
+        with job.file.open('rb') as f:
+            if job.append:
+                if job.dataset is None:
+                    raise IngestError('Dataset no longer exists')
+                dataset = job.dataset
+                rows = append_csv(f, dataset, progress=progress, reader=reader, quarantine=quarantine)
+            else:
+                dataset, rows = _ingest_upload(job, f, reader, progress, quarantine)
+    except Exception as e:
+        job.state = IngestJob.FAILED
+        job.error = str(e)
+    else:
+        job.state = IngestJob.SUCCEEDED
+        job.dataset = dataset
+        job.rows_processed = rows
+        if quarantine is not None:
+            job.rows_rejected = quarantine.count
+            job.rejected_summary = quarantine.summary
+        invalidate(user_ids=[job.user_id], dataset_ids=[dataset.pk])
+    finally:
+        progress.close()
+
+    job.finished_at = timezone.now()
+    job.file.delete(save=False)
+    job.save()
+
+    # The rows are committed by now; a retention failure must not fail the job.
+    if job.state == IngestJob.SUCCEEDED and settings.EQUIPMENT_RETENTION_ON_UPLOAD and not job.append:
+        try:
+            prune_datasets(job.user)
+        except Exception:
+            logger.exception('Retention pruning after ingest job %s failed', job.pk)
+    return job
+
+
+def _last_activity(job):
+    reported = _reported_progress(job)
+    if reported:
+        return datetime.fromtimestamp(reported[1], tz=dt_timezone.utc)
+    return job.started_at or job.created_at
+
+
+def fail_stale_jobs(jobs=None):
+    """
+    Fail pending or running jobs that have shown no progress for
+    EQUIPMENT_INGEST_STALE_SECONDS, and return how many there were.
+
+    Jobs run on threads of a Gunicorn worker, so a restarted or timed-out
+    worker takes its queued and running jobs with it and nothing else would
+    ever finish them. Pass a queryset to check only those jobs.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.EQUIPMENT_INGEST_STALE_SECONDS)
+    jobs = IngestJob.objects.all() if jobs is None else jobs
+    failed = 0
+    for job in jobs.filter(state__in=[IngestJob.PENDING, IngestJob.RUNNING], created_at__lt=cutoff):
+        if _last_activity(job) >= cutoff:
+            continue
+        if IngestJob.objects.filter(pk=job.pk, state=job.state).update(
+            state=IngestJob.FAILED, error=STALE_JOB_ERROR, finished_at=now
+        ):
+            job.file.delete(save=False)
+            failed += 1
+    return failed
+
+
+def _run_in_worker(job_id):
+    try:
+        return run_ingest_job(job_id)
+    finally:
+        # Worker threads open their own connections; don't leak them.
+        connections.close_all()
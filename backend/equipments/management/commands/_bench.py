@@ -0,0 +1,73 @@
+"""Shared helpers for the equipments benchmark commands."""
+import csv
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+EQUIPMENT_TYPES = ['Pump', 'Compressor', 'Valve', 'HeatExchanger', 'Reactor', 'Condenser']
+HEADER = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+
+
+def synthetic_rows(rows, seed=0):
+    """Yield deterministic equipment rows in CSV column order"""
+    for i in range(rows):
+        n = i + seed
+        equipment_type = EQUIPMENT_TYPES[n % len(EQUIPMENT_TYPES)]
+        yield [
+            f'{equipment_type}-{i + 1}',
+            equipment_type,
+            round(50 + (n * 7919) % 2000 / 10, 1),
+            round(1 + (n * 104729) % 150 / 10, 1),
+            round(60 + (n * 1299709) % 900 / 10, 1),
+        ]
+
+
+def write_synthetic_csv(path, rows, seed=0):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(synthetic_rows(rows, seed))
+
+
+def measure(fn, *args, trace_memory=True, **kwargs):
+    """
+    Run fn and return (result, seconds, peak traced bytes).
+
+    tracemalloc slows allocation-heavy code considerably, so pass
+    trace_memory=False for throughput figures; the peak is then None.
+    """
+    if not trace_memory:
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        return result, time.perf_counter() - started, None
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+@contextmanager
+def rolled_back_user(username='benchmark'):
+    """Provide a throwaway user whose writes are rolled back afterwards"""
+    with transaction.atomic():
+        user, _ = User.objects.get_or_create(username=username)
+        yield user
+        transaction.set_rollback(True)
+
+
+def format_bytes(value):
+    if value is None:
+        return '-'
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if value < 1024 or unit == 'GiB':
+            return f'{value:.1f} {unit}'
+        value /= 1024
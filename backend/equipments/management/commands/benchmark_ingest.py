@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+import pandas as pd
+
+from equipments.ingest import ingest_csv
+from equipments.models import Dataset, Equipment
+from ._bench import format_bytes, measure, rolled_back_user, write_synthetic_csv
+
+
+def legacy_ingest(file, user, filename):
+    """The original single read_csv + iterrows upload path, kept for comparison"""
+    df = pd.read_csv(file)
+    dataset = Dataset.objects.create(
+        user=user,
+        filename=filename,
+        total_count=len(df),
+        avg_flowrate=float(df['Flowrate'].mean()),
+        avg_pressure=float(df['Pressure'].mean()),
+        avg_temperature=float(df['Temperature'].mean()),
+        equipment_distribution=df['Type'].value_counts().to_dict(),
+    )
+    Equipment.objects.bulk_create([
+        Equipment(
+            dataset=dataset,
+            equipment_name=row['Equipment Name'],
+            equipment_type=row['Type'],
+            flowrate=float(row['Flowrate']),
+            pressure=float(row['Pressure']),
+            temperature=float(row['Temperature'])
+        )
+        for _, row in df.iterrows()
+    ])
+    return dataset
+
+
+class Command(BaseCommand):
+    help = 'Compare peak memory and throughput of the legacy and streaming CSV ingestion paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--skip-legacy', action='store_true')
+        parser.add_argument(
+            '--no-memory', action='store_true',
+            help='Skip tracemalloc so rows/second is not skewed by allocation tracing',
+        )
+
+    def handle(self, *args, **options):
+        paths = {
+            'streaming': lambda f, user: ingest_csv(
+                f, user, 'bench.csv', options['chunk_size'], options['batch_size']
+            ),
+        }
+        if not options['skip_legacy']:
+            paths = {'legacy': lambda f, user: legacy_ingest(f, user, 'bench.csv'), **paths}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for rows in options['rows']:
+                path = os.path.join(tmp, f'bench-{rows}.csv')
+                write_synthetic_csv(path, rows)
+                size = os.path.getsize(path)
+                for name, ingest in paths.items():
+                    with rolled_back_user() as user, open(path, 'rb') as f:
+                        _, elapsed, peak = measure(
+                            ingest, f, user, trace_memory=not options['no_memory']
+                        )
+                    self.stdout.write(
+                        f'{name:>10} rows={rows:<9} file={format_bytes(size):>10} '
+                        f'time={elapsed:8.2f}s rate={rows / elapsed:10.0f} rows/s '
+                        f'peak={format_bytes(peak):>10}'
+                    )
@@ -0,0 +1,78 @@
+import csv
+import importlib.util
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+import pandas as pd
+
+from equipments.ingest import iter_chunks
+from ._bench import HEADER, format_bytes, measure, synthetic_rows
+
+
+def write_wide_csv(path, rows, extra_columns):
+    """Synthetic upload with extra columns the ingest does not store"""
+    extra = [f'Note {i}' for i in range(extra_columns)]
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER + extra)
+        for i, row in enumerate(synthetic_rows(rows)):
+            writer.writerow(row + [f'n{i % 97}-{j}' for j in range(extra_columns)])
+
+
+def inferred_parse(path, chunk_size):
+    """The previous parser: every column read, types inferred per chunk"""
+    rows = 0
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        rows += len(chunk)
+    return rows
+
+
+def schema_parse(path, chunk_size, engine):
+    """The ingest parser: schema columns only, declared types, validated"""
+    rows = 0
+    with override_settings(EQUIPMENT_CSV_ENGINE=engine), open(path, 'rb') as f:
+        for chunk in iter_chunks(f, chunk_size):
+            rows += len(chunk)
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput and peak memory of inferred and schema-typed CSV parsing (no database writes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+        parser.add_argument('--extra-columns', type=int, default=5, help='Unused columns added to each file')
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument(
+            '--no-memory', action='store_true',
+            help='Skip tracemalloc so rows/second is not skewed by allocation tracing',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size'] or settings.EQUIPMENT_INGEST_CHUNK_SIZE
+        parsers = {
+            'inferred': lambda path: inferred_parse(path, chunk_size),
+            'typed-c': lambda path: schema_parse(path, chunk_size, 'c'),
+        }
+        if importlib.util.find_spec('pyarrow'):
+            parsers['typed-arrow'] = lambda path: schema_parse(path, chunk_size, 'pyarrow')
+        else:
+            self.stderr.write('pyarrow is not installed; skipping the pyarrow parser')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for rows in options['rows']:
+                path = os.path.join(tmp, f'bench-{rows}.csv')
+                write_wide_csv(path, rows, options['extra_columns'])
+                size = os.path.getsize(path)
+                for name, parse in parsers.items():
+                    parsed, elapsed, peak = measure(parse, path, trace_memory=not options['no_memory'])
+                    if parsed != rows:
+                        raise CommandError(f'{name} parsed {parsed} of {rows} rows')
+                    self.stdout.write(
+                        f'{name:>11} rows={rows:<9} file={format_bytes(size):>10} '
+                        f'time={elapsed:8.2f}s rate={rows / elapsed:10.0f} rows/s '
+                        f'peak={format_bytes(peak):>10}'
+                    )
@@ -0,0 +1,91 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import localtime
+
+from equipments.ingest import ingest_csv
+from equipments.reports import render_report
+from ._bench import format_bytes, measure, rolled_back_user, write_synthetic_csv
+
+
+def _escape_pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def legacy_report(dataset):
+    """The original single-page in-memory report, kept for comparison"""
+    uploaded_at = localtime(dataset.uploaded_at).strftime('%Y-%m-%d %H:%M:%S %Z')
+    distribution = dataset.equipment_distribution or {}
+    lines = [
+        "Chemical Equipment Report",
+        f"Filename: {dataset.filename}",
+        f"Uploaded: {uploaded_at}",
+        f"Total Records: {dataset.total_count}",
+        f"Average Flowrate: {dataset.avg_flowrate:.2f}",
+        f"Average Pressure: {dataset.avg_pressure:.2f}",
+        f"Average Temperature: {dataset.avg_temperature:.2f}",
+        "Equipment Type Distribution (Top 10):",
+        *[f"{key}: {value}" for key, value in sorted(distribution.items(), key=lambda item: item[1], reverse=True)][:10],
+    ]
+    content_lines = ["BT", "/F1 12 Tf", "72 720 Td"]
+    for idx, line in enumerate(lines):
+        if idx > 0:
+            content_lines.append("0 -16 Td")
+        content_lines.append(f"({_escape_pdf_text(line)}) Tj")
+    content_lines.append("ET")
+    content = "\n".join(content_lines).encode("latin-1", "replace")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = bytearray(b"%PDF-1.4\n%\xE2\xE3\xCF\xD3\n")
+    offsets = [0]
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf.extend(f"{i} 0 obj\n".encode("latin-1") + obj + b"\nendobj\n")
+    xref_start = len(pdf)
+    pdf.extend(f"xref\n0 {len(offsets)}\n".encode("latin-1") + b"0000000000 65535 f \n")
+    for off in offsets[1:]:
+        pdf.extend(f"{off:010d} 00000 n \n".encode("latin-1"))
+    pdf.extend(f"trailer\n<< /Size {len(offsets)} /Root 1 0 R >>\nstartxref\n{xref_start}\n%%EOF".encode("latin-1"))
+    return bytes(pdf)
+
+
+class Command(BaseCommand):
+    help = 'Measure PDF report render time and peak memory for datasets of increasing size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+        parser.add_argument(
+            '--no-memory', action='store_true',
+            help='Skip tracemalloc so render time is not skewed by allocation tracing',
+        )
+
+    def handle(self, *args, **options):
+        trace_memory = not options['no_memory']
+        with tempfile.TemporaryDirectory() as tmp:
+            for rows in options['rows']:
+                path = os.path.join(tmp, f'bench-{rows}.csv')
+                write_synthetic_csv(path, rows)
+                with rolled_back_user() as user:
+                    with open(path, 'rb') as f:
+                        dataset = ingest_csv(f, user, 'bench.csv')
+
+                    pdf, elapsed, peak = measure(legacy_report, dataset, trace_memory=trace_memory)
+                    self.report('legacy', rows, elapsed, peak, len(pdf), 1)
+
+                    output = os.path.join(tmp, f'report-{rows}.pdf')
+                    with open(output, 'wb') as f:
+                        pages, elapsed, peak = measure(render_report, dataset, f, trace_memory=trace_memory)
+                    self.report('streamed', rows, elapsed, peak, os.path.getsize(output), pages)
+
+    def report(self, name, rows, elapsed, peak, size, pages):
+        self.stdout.write(
+            f'{name:>10} rows={rows:<9} time={elapsed:8.3f}s peak={format_bytes(peak):>10} '
+            f'pdf={format_bytes(size):>10} pages={pages}'
+        )
@@ -0,0 +1,41 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from equipments.ingest import ingest_csv
+from equipments.models import Dataset
+from equipments.retention import prune_datasets
+from ._bench import measure, rolled_back_user, write_synthetic_csv
+
+
+def legacy_prune(user, keep=5):
+    """The original per-dataset delete loop, kept for comparison"""
+    user_datasets = Dataset.objects.filter(user=user).order_by('-uploaded_at')
+    if user_datasets.count() > keep:
+        for ds in user_datasets[keep:]:
+            ds.delete()
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-dataset delete loop with set-based retention pruning'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--datasets', type=int, default=20)
+        parser.add_argument('--rows', type=int, default=20000, help='Equipment rows per dataset')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.csv')
+            write_synthetic_csv(path, options['rows'])
+            for name, prune in [('legacy', legacy_prune), ('set-based', prune_datasets)]:
+                with rolled_back_user() as user:
+                    for _ in range(options['datasets']):
+                        with open(path, 'rb') as f:
+                            ingest_csv(f, user, 'bench.csv')
+                    _, elapsed, _ = measure(prune, user, trace_memory=False)
+                    remaining = Dataset.objects.filter(user=user).count()
+                self.stdout.write(
+                    f'{name:>10} datasets={options["datasets"]} rows/dataset={options["rows"]} '
+                    f'time={elapsed:8.3f}s remaining={remaining}'
+                )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from equipments.response_cache import cache_stats, reset_cache_stats
+
+
+# DatasetViewSet actions served through the response cache.
+CACHED_ACTIONS = ['retrieve', 'history', 'chart_data']
+
+
+class Command(BaseCommand):
+    help = 'Show hit and miss counts of the dataset response cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters afterwards')
+
+    def handle(self, *args, **options):
+        for name, counts in cache_stats(CACHED_ACTIONS).items():
+            total = counts['hits'] + counts['misses']
+            rate = f'{counts["hits"] / total:.1%}' if total else '-'
+            self.stdout.write(f'{name:<16} hits={counts["hits"]:<8} misses={counts["misses"]:<8} hit rate={rate}')
+        if options['reset']:
+            reset_cache_stats(CACHED_ACTIONS)
@@ -0,0 +1,36 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from equipments.jobs import fail_stale_jobs
+from equipments.models import IngestJob
+from equipments.retention import expired_datasets, prune_datasets
+from equipments.uploads import prune_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete datasets that fall outside their owner\'s retention policy and chunked uploads '
+        'untouched for EQUIPMENT_UPLOAD_EXPIRY_HOURS, and fail ingest jobs whose worker went away'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only prune this username')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'No such user: {options["user"]}')
+
+        if options['dry_run']:
+            count = expired_datasets(user).count()
+            self.stdout.write(f'{count} dataset(s) would be deleted')
+            return
+        ids = prune_datasets(user)
+        self.stdout.write(f'Deleted {len(ids)} dataset(s)')
+        self.stdout.write(f'Deleted {prune_uploads(user)} stale upload(s)')
+        jobs = IngestJob.objects.filter(user=user) if user else None
+        self.stdout.write(f'Failed {fail_stale_jobs(jobs)} stale ingest job(s)')
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipments', '0002_ingestjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetTypeStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('equipment_type', models.CharField(max_length=100)),
+                ('parameter', models.CharField(max_length=20)),
+                ('count', models.IntegerField()),
+                ('mean', models.FloatField()),
+                ('min', models.FloatField()),
+                ('max', models.FloatField()),
+                ('std', models.FloatField(null=True)),
+                ('p25', models.FloatField(null=True)),
+                ('p50', models.FloatField(null=True)),
+                ('p75', models.FloatField(null=True)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='type_stats', to='equipments.dataset')),
+            ],
+            options={
+                'unique_together': {('dataset', 'equipment_type', 'parameter')},
+            },
+        ),
+    ]
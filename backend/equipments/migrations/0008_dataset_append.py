@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipments', '0007_upload_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='parameter_moments',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='ingestjob',
+            name='append',
+            field=models.BooleanField(default=False),
+        ),
+    ]
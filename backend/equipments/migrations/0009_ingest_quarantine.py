@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipments', '0008_dataset_append'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='rejected_summary',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='ingestjob',
+            name='rows_rejected',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ingestjob',
+            name='tolerant',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='QuarantinedRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line', models.IntegerField()),
+                ('values', models.JSONField()),
+                ('errors', models.JSONField()),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quarantined_rows', to='equipments.ingestjob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job', 'id'], name='quarantine_job_id_idx')],
+            },
+        ),
+    ]
@@ -10,6 +10,19 @@ class Dataset(models.Model):
     avg_pressure = models.FloatField(default=0.0)
     avg_temperature = models.FloatField(default=0.0)
     equipment_distribution = models.JSONField(default=dict)
+    # Running {field: [count, mean, m2]} per numeric parameter, so appends can
+    # update the averages without rereading the dataset; empty for older datasets
+    parameter_moments = models.JSONField(default=dict, blank=True)
+    # SHA-256 of the normalized upload (see readers.content_fingerprint); blank for older datasets
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # DatasetViewSet: filter(user=...).order_by('-uploaded_at')
+            models.Index(fields=['user', '-uploaded_at'], name='dataset_user_uploaded_idx'),
+            # Duplicate upload lookup: filter(user=..., content_hash=...)
+            models.Index(fields=['user', 'content_hash'], name='dataset_user_hash_idx'),
+        ]
 
 class Equipment(models.Model):
     dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='equipment')
@@ -17,4 +30,112 @@ class Equipment(models.Model):
     equipment_type = models.CharField(max_length=100)
     flowrate = models.FloatField()
     pressure = models.FloatField()
-    temperature = models.FloatField()
\ No newline at end of file
+    temperature = models.FloatField()
+
+    class Meta:
+        indexes = [
+            # Per-dataset rows in id order: equipment pages, exports and
+            # EquipmentViewSet's order_by('-id') once joined to the user's datasets.
+            models.Index(fields=['dataset', 'id'], name='equipment_dataset_id_idx'),
+            models.Index(fields=['dataset', 'equipment_type'], name='equipment_dataset_type_idx'),
+            models.Index(fields=['dataset', 'equipment_name'], name='equipment_dataset_name_idx'),
+        ]
+
+
+class DatasetTypeStats(models.Model):
+    """Per equipment type and parameter statistics, computed at ingest time"""
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='type_stats')
+    equipment_type = models.CharField(max_length=100)
+    parameter = models.CharField(max_length=20)
+    count = models.IntegerField()
+    mean = models.FloatField()
+    min = models.FloatField()
+    max = models.FloatField()
+    std = models.FloatField(null=True)
+    p25 = models.FloatField(null=True)
+    p50 = models.FloatField(null=True)
+    p75 = models.FloatField(null=True)
+
+    class Meta:
+        unique_together = [('dataset', 'equipment_type', 'parameter')]
+
+class RetentionPolicy(models.Model):
+    """Per-user override of the EQUIPMENT_RETENTION_* settings; null means no limit"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='dataset_retention')
+    max_datasets = models.PositiveIntegerField(null=True, blank=True)
+    max_age_days = models.PositiveIntegerField(null=True, blank=True)
+
+
+class IngestJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATE_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    file = models.FileField(upload_to='uploads/', blank=True)
+    # Content-Encoding the file was sent with (gzip, zstd); it is stored as
+    # sent and decompressed while it is parsed
+    content_encoding = models.CharField(max_length=10, blank=True)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default=PENDING)
+    rows_processed = models.IntegerField(default=0)
+    # Append the file's rows to dataset instead of creating a new one
+    append = models.BooleanField(default=False)
+    # True when the upload matched an existing dataset and was not re-ingested
+    deduplicated = models.BooleanField(default=False)
+    # Set aside invalid rows as QuarantinedRow and ingest the rest, instead of failing
+    tolerant = models.BooleanField(default=False)
+    rows_rejected = models.IntegerField(default=0)
+    # {column: {error: count}} over the rejected rows
+    rejected_summary = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    dataset = models.ForeignKey(Dataset, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def is_finished(self):
+        return self.state in (self.SUCCEEDED, self.FAILED)
+
+
+class UploadSession(models.Model):
+    """A chunked upload being assembled under MEDIA_ROOT (see uploads.py)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    # Content-Encoding of the bytes being sent, as for IngestJob
+    content_encoding = models.CharField(max_length=10, blank=True)
+    chunk_size = models.IntegerField()
+    # Bytes written and acknowledged so far; chunks are accepted in order
+    received = models.BigIntegerField(default=0)
+    # Passed on to the IngestJob created when the upload completes
+    append = models.BooleanField(default=False)
+    dataset = models.ForeignKey(Dataset, null=True, blank=True, on_delete=models.SET_NULL)
+    tolerant = models.BooleanField(default=False)
+    job = models.ForeignKey(IngestJob, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class QuarantinedRow(models.Model):
+    """A row a tolerant upload left out, with its raw values and what was wrong"""
+    job = models.ForeignKey(IngestJob, on_delete=models.CASCADE, related_name='quarantined_rows')
+    # Line in the uploaded file, counting the header as line 1
+    line = models.IntegerField()
+    # {column: raw value} for the schema's columns
+    values = models.JSONField()
+    # [{"column": ..., "error": ...}]
+    errors = models.JSONField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['job', 'id'], name='quarantine_job_id_idx'),
+        ]
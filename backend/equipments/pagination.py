@@ -0,0 +1,149 @@
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import Cursor, CursorPagination
+
+from .serializers import EquipmentSerializer
+
+
+EQUIPMENT_FIELDS = EquipmentSerializer.Meta.fields
+RANGE_FIELDS = ['flowrate', 'pressure', 'temperature']
+
+
+class EquipmentCursorPagination(CursorPagination):
+    """
+    Cursor pagination over a dataset's equipment.
+
+    Clients may order by any equipment field with ?ordering=field or
+    ?ordering=-field. The cursor holds the (value, id) of the row it starts
+    after, and id breaks ties in the same direction, so every row is served
+    exactly once however many rows share a value.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get('ordering', self.ordering)
+        field = ordering.lstrip('-')
+        if field not in EQUIPMENT_FIELDS:
+            raise ValidationError({'ordering': f'Must be one of: {", ".join(EQUIPMENT_FIELDS)}'})
+        if field == 'id':
+            return (ordering,)
+        return (ordering, '-id' if ordering.startswith('-') else 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+
+        field = self.ordering[0].lstrip('-')
+        descending = self.ordering[0].startswith('-')
+        if reverse:
+            order = [key[1:] if key.startswith('-') else f'-{key}' for key in self.ordering]
+        else:
+            order = list(self.ordering)
+        queryset = queryset.order_by(*order)
+
+        if self.cursor and self.cursor.position is not None:
+            value, pk = self._decode_position(self.cursor.position)
+            lookup = 'lt' if descending != reverse else 'gt'
+            if field == 'id':
+                queryset = queryset.filter(**{f'id__{lookup}': pk})
+            else:
+                # The first condition alone is an index range; the second drops the ties already served.
+                queryset = queryset.filter(**{f'{field}__{lookup}e': value}).filter(
+                    Q(**{f'{field}__{lookup}': value}) | Q(**{f'id__{lookup}': pk})
+                )
+
+        rows = list(queryset[:self.page_size + 1])
+        has_following = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = self.cursor is not None, has_following
+        else:
+            self.has_next, self.has_previous = has_following, self.cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self._position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self._position(self.page[0])))
+
+    def _position(self, row):
+        field = self.ordering[0].lstrip('-')
+        get = row.get if isinstance(row, dict) else lambda name: getattr(row, name)
+        return json.dumps([get(field), get('id')])
+
+    def _decode_position(self, position):
+        try:
+            value, pk = json.loads(position)
+            return value, int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class QuarantineCursorPagination(CursorPagination):
+    """Cursor pagination over a tolerant upload's rejected rows, in file order"""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'id'
+
+
+def parse_fields(params):
+    """Return the requested ?fields= projection, or None for every field"""
+    if not params.get('fields'):
+        return None
+    fields = [name.strip() for name in params['fields'].split(',') if name.strip()]
+    unknown = set(fields) - set(EQUIPMENT_FIELDS)
+    if unknown:
+        raise ValidationError({'fields': f'Unknown fields: {", ".join(sorted(unknown))}'})
+    return fields
+
+
+def filter_equipment(queryset, params):
+    """
+    Apply ?type= and ?<field>_min= / ?<field>_max= filters.
+
+    type accepts a comma separated list; range bounds are inclusive.
+    """
+    if params.get('type'):
+        queryset = queryset.filter(equipment_type__in=params['type'].split(','))
+    for field in RANGE_FIELDS:
+        for suffix, lookup in [('min', 'gte'), ('max', 'lte')]:
+            key = f'{field}_{suffix}'
+            if key not in params:
+                continue
+            try:
+                value = float(params[key])
+            except ValueError:
+                raise ValidationError({key: 'Must be a number'})
+            queryset = queryset.filter(**{f'{field}__{lookup}': value})
+    return queryset
+
+
+def int_param(params, name, default, minimum, maximum):
+    """Read a bounded integer query parameter"""
+    if name not in params:
+        return default
+    try:
+        value = int(params[name])
+    except ValueError:
+        raise ValidationError({name: 'Must be an integer'})
+    if not minimum <= value <= maximum:
+        raise ValidationError({name: f'Must be between {minimum} and {maximum}'})
+    return value
@@ -0,0 +1,264 @@
+"""
+Upload readers.
+
+Each supported upload format has a reader that yields the file as bounded
+DataFrames holding (at most) the schema's columns, so the ingest pipeline
+does not care how rows were stored. Compressed CSV (named .csv.gz or
+.csv.zst, or sent with a Content-Encoding) is decompressed as a stream;
+Parquet and XLSX are read a batch of rows at a time. The Parquet, XLSX
+and zstd readers need pyarrow, openpyxl and zstandard respectively, which
+are imported only when such a file is uploaded.
+"""
+import codecs
+import gzip
+import hashlib
+import importlib.util
+
+from django.conf import settings
+import pandas as pd
+
+from .schema import EQUIPMENT_SCHEMA, REQUIRED_COLUMNS, IngestError, InvalidRowsError, pandas_dtypes, row_errors
+
+
+class ReaderError(IngestError):
+    """Raised when an upload cannot be decoded in its declared format"""
+
+
+def csv_engine():
+    """The CSV parser to use: pyarrow when installed (or configured), else pandas' C parser"""
+    engine = settings.EQUIPMENT_CSV_ENGINE
+    if engine != 'auto':
+        return engine
+    return 'pyarrow' if importlib.util.find_spec('pyarrow') else 'c'
+
+
+def content_fingerprint(stream, block_size=1 << 20):
+    """
+    Return a SHA-256 hex digest of a CSV byte stream's normalized contents.
+
+    A UTF-8 byte order mark, CRLF line endings and trailing line breaks are
+    ignored, so the same export saved on different systems hashes the same.
+    The stream is read in blocks rather than all at once.
+    """
+    digest = hashlib.sha256()
+    pending = b''
+    first = True
+    while block := stream.read(block_size):
+        if first:
+            block = block.removeprefix(codecs.BOM_UTF8)
+            first = False
+        block = pending + block
+        # Hold back trailing line breaks: a CRLF may straddle two blocks, and
+        # breaks at the very end of the file are not part of the content.
+        content = block.rstrip(b'\r\n')
+        pending = block[len(content):]
+        if content:
+            digest.update(content.replace(b'\r\n', b'\n'))
+    return digest.hexdigest()
+
+
+def raw_fingerprint(stream, block_size=1 << 20):
+    """SHA-256 hex digest of a binary stream's bytes"""
+    digest = hashlib.sha256()
+    while block := stream.read(block_size):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+class CSVReader:
+    """
+    Parse only the schema's columns with their declared types.
+
+    A value that cannot be converted stops the typed parser; the file is
+    then scanned again with every column read as text, so the error lists
+    each offending line instead of the parser's first complaint.
+    """
+    suffixes = ['.csv']
+
+    def open(self, file):
+        """Return a binary stream of the CSV bytes"""
+        return file
+
+    def chunks(self, file, chunk_size, as_text=False):
+        """
+        Yield the schema's columns in chunks of about chunk_size rows.
+
+        as_text reads every value as a string (None when empty) and leaves
+        validation to the caller, so one bad value does not stop the parse.
+        """
+        if as_text:
+            yield from self._text_chunks(self.open(file), chunk_size)
+            return
+        parse = self._arrow_chunks if csv_engine() == 'pyarrow' else self._pandas_chunks
+        try:
+            yield from parse(self.open(file), chunk_size)
+        except (ValueError, TypeError) as e:
+            if isinstance(e, IngestError):
+                raise
+            file.seek(0)
+            errors = self._scan_errors(self.open(file), chunk_size)
+            if errors.empty:
+                raise ReaderError(f'Could not parse CSV: {e}')
+            raise InvalidRowsError(errors)
+
+    def _pandas_chunks(self, stream, chunk_size, dtype=None):
+        yield from pd.read_csv(
+            stream,
+            usecols=lambda column: column in EQUIPMENT_SCHEMA,
+            dtype=dtype or pandas_dtypes(),
+            chunksize=chunk_size,
+        )
+
+    def _arrow_chunks(self, stream, chunk_size, as_text=False):
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+
+        types = {'text': pa.string(), 'category': pa.dictionary(pa.int32(), pa.string()), 'number': pa.float64()}
+        try:
+            reader = pacsv.open_csv(
+                stream,
+                # Arrow reads in byte blocks; aim for about chunk_size rows each.
+                read_options=pacsv.ReadOptions(block_size=max(chunk_size * 64, 1 << 20)),
+                convert_options=pacsv.ConvertOptions(
+                    include_columns=REQUIRED_COLUMNS,
+                    column_types={
+                        column: pa.string() if as_text else types[kind] for column, kind in EQUIPMENT_SCHEMA.items()
+                    },
+                    strings_can_be_null=as_text,
+                ),
+            )
+        except KeyError:
+            # A required column is absent; iter_chunks reports which are expected.
+            yield pd.DataFrame()
+            return
+        for batch in reader:
+            yield batch.to_pandas()
+
+    def _text_chunks(self, stream, chunk_size):
+        if csv_engine() == 'pyarrow':
+            yield from self._arrow_chunks(stream, chunk_size, as_text=True)
+            return
+        yield from self._pandas_chunks(stream, chunk_size, dtype=str)
+
+    def _scan_errors(self, stream, chunk_size):
+        """Return the file's schema violations, reading every value as text"""
+        found = []
+        line = 2  # the header is line 1
+        for chunk in self._text_chunks(stream, chunk_size):
+            found.append(row_errors(chunk, line))
+            line += len(chunk)
+        if not found:
+            return row_errors(pd.DataFrame(columns=REQUIRED_COLUMNS), line)
+        return pd.concat(found, ignore_index=True)
+
+    def fingerprint(self, file):
+        """Hash the decoded CSV, so a compressed copy matches the plain file"""
+        try:
+            return content_fingerprint(self.open(file))
+        finally:
+            file.seek(0)
+
+
+class GzipCSVReader(CSVReader):
+    suffixes = ['.csv.gz']
+
+    def open(self, file):
+        return gzip.GzipFile(fileobj=file, mode='rb')
+
+
+class ZstdCSVReader(CSVReader):
+    suffixes = ['.csv.zst']
+
+    def open(self, file):
+        try:
+            import zstandard
+        except ImportError:
+            raise ReaderError('zstd-compressed uploads need the zstandard package installed')
+        return zstandard.ZstdDecompressor().stream_reader(file, read_across_frames=True)
+
+
+class ParquetReader:
+    suffixes = ['.parquet']
+
+    def chunks(self, file, chunk_size, as_text=False):
+        # Values are passed through unconverted; the caller validates them.
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ReaderError('Parquet uploads need the pyarrow package installed')
+        parquet = pq.ParquetFile(file)
+        # Only decode the columns we store; missing ones are reported by the caller.
+        present = [column for column in REQUIRED_COLUMNS if column in parquet.schema_arrow.names]
+        if not present:
+            yield pd.DataFrame(columns=parquet.schema_arrow.names)
+            return
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=present):
+            yield batch.to_pandas()
+
+    def fingerprint(self, file):
+        try:
+            return raw_fingerprint(file)
+        finally:
+            file.seek(0)
+
+
+class XLSXReader:
+    suffixes = ['.xlsx']
+
+    def chunks(self, file, chunk_size, as_text=False):
+        try:
+            import openpyxl
+        except ImportError:
+            raise ReaderError('Excel uploads need the openpyxl package installed')
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = [str(value).strip() if value is not None else '' for value in next(rows, [])]
+            # Only keep the requested columns of the first sheet.
+            indices = [header.index(column) for column in REQUIRED_COLUMNS if column in header]
+            names = [header[i] for i in indices]
+            batch = []
+            yielded = False
+            for row in rows:
+                if all(value is None for value in row):
+                    continue
+                batch.append([row[i] if i < len(row) else None for i in indices])
+                if len(batch) == chunk_size:
+                    yield pd.DataFrame(batch, columns=names)
+                    batch = []
+                    yielded = True
+            if batch or not yielded:
+                yield pd.DataFrame(batch, columns=names)
+        finally:
+            workbook.close()
+
+    def fingerprint(self, file):
+        try:
+            return raw_fingerprint(file)
+        finally:
+            file.seek(0)
+
+
+READERS = [CSVReader(), GzipCSVReader(), ZstdCSVReader(), ParquetReader(), XLSXReader()]
+SUPPORTED_SUFFIXES = [suffix for reader in READERS for suffix in reader.suffixes]
+# An upload sent with one of these Content-Encodings is read as if its name
+# had the suffix, e.g. data.csv sent as gzip by the .csv.gz reader.
+CONTENT_ENCODINGS = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def content_encoding(value):
+    """Normalize a Content-Encoding header; None if it is not one we decode"""
+    value = (value or '').strip().lower()
+    if value in ('', 'identity'):
+        return ''
+    return value if value in CONTENT_ENCODINGS else None
+
+
+def reader_for(filename, encoding=''):
+    """Return the reader for an upload's file name and Content-Encoding, or None if unsupported"""
+    name = filename.lower() + CONTENT_ENCODINGS.get(encoding, '')
+    # Longest suffix first, so .csv.gz is not taken for something else.
+    for suffix in sorted(SUPPORTED_SUFFIXES, key=len, reverse=True):
+        if name.endswith(suffix):
+            return next(reader for reader in READERS if suffix in reader.suffixes)
+    return None
@@ -0,0 +1,442 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.timezone import localtime
+import numpy as np
+
+from .models import Equipment
+from .stats import PARAMETERS, type_stats
+
+
+# Bump when the layout changes so stored reports are rendered again.
+REPORT_VERSION = 1
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 54
+FONTS = {'regular': ('F1', 'Helvetica'), 'bold': ('F2', 'Helvetica-Bold')}
+HISTOGRAM_BINS = 12
+# Most datasets one bulk export may include.
+BULK_REPORT_LIMIT = 100
+# Bytes copied from a stored report per chunk of the streamed archive.
+ZIP_BLOCK_SIZE = 64 * 1024
+# Average Helvetica glyph width as a fraction of the font size, for truncating cells.
+CHAR_WIDTH = 0.52
+
+
+def _escape(text):
+    return str(text).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _fit(text, width, size):
+    """Truncate text to roughly fit width points at the given font size"""
+    text = str(text)
+    limit = max(int(width / (size * CHAR_WIDTH)), 1)
+    return text if len(text) <= limit else text[:max(limit - 2, 1)] + '..'
+
+
+class PDFWriter:
+    """
+    Write PDF objects to a binary file as they are produced.
+
+    Only the byte offset of each object is kept in memory, so the size of
+    the document does not bound what can be written. Object numbers may be
+    reserved before their body is known (e.g. the page tree, whose kids are
+    only known at the end).
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.position = 0
+        self.offsets = {}
+        self.next_id = 1
+        self._write(b'%PDF-1.4\n%\xE2\xE3\xCF\xD3\n')
+
+    def _write(self, data):
+        self.file.write(data)
+        self.position += len(data)
+
+    def reserve(self):
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def write_object(self, body, obj_id=None):
+        obj_id = obj_id or self.reserve()
+        self.offsets[obj_id] = self.position
+        self._write(b'%d 0 obj\n' % obj_id + body + b'\nendobj\n')
+        return obj_id
+
+    def write_stream(self, data, obj_id=None):
+        data = zlib.compress(data)
+        body = b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(data) + data + b'\nendstream'
+        return self.write_object(body, obj_id)
+
+    def close(self, root_id):
+        """Write the cross-reference table and trailer"""
+        xref_start = self.position
+        count = self.next_id
+        lines = [b'xref\n0 %d\n' % count, b'0000000000 65535 f \n']
+        lines.extend(b'%010d 00000 n \n' % self.offsets[obj_id] for obj_id in range(1, count))
+        self._write(b''.join(lines))
+        self._write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (count, root_id, xref_start))
+
+
+class ReportLayout:
+    """
+    Lay out text, tables and bar charts top to bottom over as many pages as
+    needed. Each page's content stream is written out as soon as the page is
+    full, so memory holds at most one page of drawing operators.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.pages_id = writer.reserve()
+        self.fonts = {
+            name: (alias, writer.write_object(
+                b'<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>' % base.encode()
+            ))
+            for name, (alias, base) in FONTS.items()
+        }
+        self.kids = []
+        self.ops = []
+        self.y = PAGE_HEIGHT - MARGIN
+
+    @property
+    def width(self):
+        return PAGE_WIDTH - 2 * MARGIN
+
+    def _flush_page(self):
+        number = len(self.kids) + 1
+        self._text_at(f'Page {number}', PAGE_WIDTH - MARGIN - 40, MARGIN / 2, 8)
+        content_id = self.writer.write_stream('\n'.join(self.ops).encode('latin-1', 'replace'))
+        fonts = b' '.join(b'/%s %d 0 R' % (alias.encode(), obj_id) for alias, obj_id in self.fonts.values())
+        page_id = self.writer.write_object(
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R '
+            b'/Resources << /Font << %s >> >> >>' % (self.pages_id, PAGE_WIDTH, PAGE_HEIGHT, content_id, fonts)
+        )
+        self.kids.append(page_id)
+        self.ops = []
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def ensure(self, height):
+        """Start a new page unless height points fit below the cursor"""
+        if self.y - height < MARGIN:
+            self._flush_page()
+
+    def _text_at(self, text, x, y, size, font='regular'):
+        alias = FONTS[font][0]
+        self.ops.append(f'BT /{alias} {size} Tf {x:.2f} {y:.2f} Td ({_escape(text)}) Tj ET')
+
+    def text(self, text, size=10, font='regular', gap=4):
+        self.ensure(size + gap)
+        self.y -= size
+        self._text_at(text, MARGIN, self.y, size, font)
+        self.y -= gap
+
+    def heading(self, text):
+        self.ensure(60)
+        self.y -= 10
+        self.text(text, size=13, font='bold', gap=8)
+
+    def table(self, headers, widths, rows, size=8):
+        """Draw rows under headers, repeating the header on every page"""
+        row_height = size + 5
+
+        def header():
+            self.ensure(row_height * 2)
+            self.y -= size
+            x = MARGIN
+            for title, width in zip(headers, widths):
+                self._text_at(_fit(title, width, size), x, self.y, size, 'bold')
+                x += width
+            self.y -= 4
+            self.ops.append(f'0.5 w {MARGIN} {self.y:.2f} m {MARGIN + sum(widths)} {self.y:.2f} l S')
+            self.y -= row_height - size
+
+        header()
+        for row in rows:
+            if self.y - row_height < MARGIN:
+                self._flush_page()
+                header()
+            self.y -= size
+            x = MARGIN
+            for value, width in zip(row, widths):
+                self._text_at(_fit(value, width - 4, size), x, self.y, size)
+                x += width
+            self.y -= row_height - size
+
+    def bar_chart(self, title, labels, values, size=8, label_width=130):
+        """Horizontal bar chart with one labelled bar per value"""
+        bar_height = size + 4
+        self.ensure(14 + bar_height * min(len(values), 5))
+        self.text(title, size=10, font='bold', gap=6)
+        peak = max(values, default=0) or 1
+        bar_space = self.width - label_width - 60
+        for label, value in zip(labels, values):
+            self.ensure(bar_height)
+            self.y -= bar_height
+            self._text_at(_fit(label, label_width - 4, size), MARGIN, self.y + 2, size)
+            length = bar_space * value / peak
+            self.ops.append(
+                f'0.25 0.45 0.75 rg {MARGIN + label_width} {self.y + 1:.2f} {length:.2f} {bar_height - 3} re f 0 g'
+            )
+            self._text_at(f'{value:,}', MARGIN + label_width + length + 4, self.y + 2, size)
+        self.y -= 8
+
+    def finish(self):
+        """Write the last page, the page tree and the catalog"""
+        if self.ops or not self.kids:
+            self._flush_page()
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self.kids)
+        self.writer.write_object(
+            b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self.kids)), self.pages_id
+        )
+        catalog_id = self.writer.write_object(b'<< /Type /Catalog /Pages %d 0 R >>' % self.pages_id)
+        self.writer.close(catalog_id)
+        return len(self.kids)
+
+
+def parameter_histograms(dataset, stats, bins=HISTOGRAM_BINS):
+    """
+    Histogram each parameter over the dataset's rows, reading them in
+    bounded chunks. Bin edges come from the precomputed per-type extrema.
+    """
+    edges = {}
+    for column, field in PARAMETERS.items():
+        bounds = [(entry[field]['min'], entry[field]['max']) for entry in stats if field in entry]
+        if bounds:
+            edges[field] = np.histogram_bin_edges(
+                [min(low for low, _ in bounds), max(high for _, high in bounds)], bins=bins
+            )
+    counts = {field: np.zeros(bins, dtype='int64') for field in edges}
+    if not edges:
+        return {}
+
+    chunk_size = settings.EQUIPMENT_INGEST_CHUNK_SIZE
+    rows = Equipment.objects.filter(dataset=dataset).values_list(*edges).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        values = np.array(chunk, dtype='float64').reshape(-1, len(edges))
+        for i, field in enumerate(edges):
+            counts[field] += np.histogram(values[:, i], bins=edges[field])[0]
+    return {field: (edges[field], counts[field]) for field in edges}
+
+
+def render_report(dataset, file):
+    """Write the dataset's PDF report to a binary file and return the page count"""
+    layout = ReportLayout(PDFWriter(file))
+    uploaded_at = localtime(dataset.uploaded_at).strftime('%Y-%m-%d %H:%M:%S %Z')
+
+    layout.text('Chemical Equipment Report', size=18, font='bold', gap=12)
+    for line in [
+        f'Filename: {dataset.filename}',
+        f'Uploaded: {uploaded_at}',
+        f'Total Records: {dataset.total_count}',
+        f'Average Flowrate: {dataset.avg_flowrate:.2f}',
+        f'Average Pressure: {dataset.avg_pressure:.2f}',
+        f'Average Temperature: {dataset.avg_temperature:.2f}',
+    ]:
+        layout.text(line, size=11)
+
+    distribution = sorted((dataset.equipment_distribution or {}).items(), key=lambda item: item[1], reverse=True)
+    if distribution:
+        layout.heading('Equipment Type Distribution')
+        top = distribution[:10]
+        layout.bar_chart('Top 10 types by count', [key for key, _ in top], [value for _, value in top])
+
+    stats = type_stats(dataset)
+    if stats:
+        layout.heading('Statistics by Equipment Type')
+        headers = ['Type', 'Count'] + [f'{column} mean / std' for column in PARAMETERS]
+        widths = [120, 54, 110, 110, 110]
+
+        def summary(values):
+            if values is None:
+                return '-'
+            std = '-' if values['std'] is None else f'{values["std"]:.2f}'
+            return f'{values["mean"]:.2f} / {std}'
+
+        layout.table(headers, widths, (
+            [entry['equipment_type'], entry['count'], *(summary(entry.get(field)) for field in PARAMETERS.values())]
+            for entry in stats
+        ))
+
+        layout.heading('Parameter Distributions')
+        histograms = parameter_histograms(dataset, stats)
+        for column, field in PARAMETERS.items():
+            if field not in histograms:
+                continue
+            edges, counts = histograms[field]
+            labels = [f'{low:.1f} - {high:.1f}' for low, high in zip(edges[:-1], edges[1:])]
+            layout.bar_chart(column, labels, [int(count) for count in counts])
+
+    sample_rows = settings.EQUIPMENT_REPORT_SAMPLE_ROWS
+    if sample_rows and dataset.total_count:
+        shown = min(sample_rows, dataset.total_count)
+        layout.heading(f'Equipment (first {shown} of {dataset.total_count} rows)')
+        fields = ['equipment_name', 'equipment_type', *PARAMETERS.values()]
+        rows = Equipment.objects.filter(dataset=dataset).order_by('id').values_list(*fields)[:sample_rows]
+        layout.table(
+            ['Equipment Name', 'Type', *PARAMETERS], [150, 110, 80, 80, 84],
+            ([name, equipment_type, *(f'{value:.2f}' for value in values)]
+             for name, equipment_type, *values in rows.iterator(chunk_size=1000)),
+        )
+    return layout.finish()
+
+
+def report_key(dataset):
+    """Hash of everything the report is rendered from"""
+    source = [
+        REPORT_VERSION,
+        settings.EQUIPMENT_REPORT_SAMPLE_ROWS,
+        dataset.pk,
+        dataset.filename,
+        dataset.uploaded_at.isoformat(),
+        dataset.total_count,
+        dataset.parameter_moments,
+        dataset.equipment_distribution,
+    ]
+    return hashlib.sha256(json.dumps(source, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def report_dir(dataset_id):
+    return Path(settings.MEDIA_ROOT) / 'reports' / str(dataset_id)
+
+
+def get_report(dataset):
+    """
+    Return the path of the dataset's stored report, rendering it first if
+    there is none for the dataset's current contents.
+
+    Reports are rendered to a temporary file and moved into place, so a
+    concurrent request never sees a partial file.
+    """
+    directory = report_dir(dataset.pk)
+    path = directory / f'{report_key(dataset)}.pdf'
+    if path.exists():
+        return path
+
+    directory.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as tmp:
+        try:
+            render_report(dataset, tmp)
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    os.replace(tmp.name, path)
+    # Renderings of earlier contents (before an append) are superseded.
+    for old in directory.glob('*.pdf'):
+        if old != path:
+            old.unlink(missing_ok=True)
+    return path
+
+
+def delete_reports(dataset_ids):
+    """Remove stored reports of deleted datasets once the transaction commits"""
+    directories = [report_dir(pk) for pk in dataset_ids]
+
+    def remove():
+        for path in directories:
+            shutil.rmtree(path, ignore_errors=True)
+
+    if directories:
+        transaction.on_commit(remove)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_report_executor():
+    """
+    Return the process-wide pool that renders reports for bulk exports.
+
+    Threads pay off because most of a render is spent fetching rows, and the
+    database driver releases the GIL while it waits; each thread uses its
+    own connection.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.EQUIPMENT_REPORT_WORKERS,
+                thread_name_prefix='report',
+            )
+        return _executor
+
+
+def _render_in_worker(dataset):
+    try:
+        return get_report(dataset)
+    finally:
+        # Worker threads open their own connections; don't leak them.
+        connections.close_all()
+
+
+class _ArchiveBuffer:
+    """
+    Write-only sink for zipfile that hands back what was written since the
+    last take(). It has no tell(), so zipfile writes a streamable archive
+    (sizes and CRCs in data descriptors after each entry).
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_reports_zip(datasets):
+    """
+    Yield a ZIP archive of the datasets' reports, chunk by chunk.
+
+    Reports are rendered (or found already stored) in the report pool while
+    earlier entries are being streamed, and entries are written in the
+    order given. At most one copy block plus zip headers is held in memory.
+    A report that fails to render is replaced by a .error.txt entry.
+    """
+    executor = get_report_executor()
+    futures = [executor.submit(_render_in_worker, dataset) for dataset in datasets]
+    buffer = _ArchiveBuffer()
+    try:
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for dataset, future in zip(datasets, futures):
+                name = f'equipment-report-{dataset.pk}'
+                date_time = localtime(dataset.uploaded_at).timetuple()[:6]
+                try:
+                    path = future.result()
+                except Exception as e:
+                    archive.writestr(zipfile.ZipInfo(f'{name}.error.txt', date_time), f'Report failed: {e}\n')
+                    yield buffer.take()
+                    continue
+                with open(path, 'rb') as source, archive.open(zipfile.ZipInfo(f'{name}.pdf', date_time), 'w') as entry:
+                    while block := source.read(ZIP_BLOCK_SIZE):
+                        entry.write(block)
+                        yield buffer.take()
+                yield buffer.take()
+        yield buffer.take()
+    finally:
+        # The client may disconnect part way; don't render what is no longer needed.
+        for future in futures:
+            future.cancel()
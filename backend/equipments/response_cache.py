@@ -0,0 +1,143 @@
+import hashlib
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.utils import timezone
+
+
+CACHE_ALIAS = 'equipments'
+PREFIX = 'equipments'
+# Response headers kept with a cached body.
+STORED_HEADERS = ['Content-Type', 'Content-Disposition']
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version(scope):
+    """
+    Return the current version token of a cache scope.
+
+    Tokens are random rather than counters, so a token evicted from the
+    cache can never come back and revive entries written under it.
+    """
+    cache = get_cache()
+    key = f'{PREFIX}:version:{scope}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def _representation(request):
+    """What distinguishes two renderings of the same resource"""
+    renderer = getattr(request, 'accepted_renderer', None)
+    media_type = getattr(request, 'accepted_media_type', '')
+    params = sorted(request.query_params.lists()) if hasattr(request, 'query_params') else []
+    return f'{getattr(renderer, "format", "")}|{media_type}|{params}'
+
+
+def response_key(user_id, scope, name, request):
+    digest = hashlib.sha1(_representation(request).encode('utf-8')).hexdigest()
+    return f'{PREFIX}:response:{user_id}:{scope}:{_version(scope)}:{name}:{digest}'
+
+
+def history_scope(user_id):
+    return f'history-{user_id}'
+
+
+def dataset_scope(dataset_id):
+    return f'dataset-{dataset_id}'
+
+
+def _count(name, outcome):
+    cache = get_cache()
+    key = f'{PREFIX}:stats:{name}:{outcome}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr; the counters are advisory.
+        pass
+
+
+def cache_stats(names):
+    """Return {name: {'hits': n, 'misses': n}} for the given counter names"""
+    cache = get_cache()
+    return {
+        name: {
+            'hits': cache.get(f'{PREFIX}:stats:{name}:hit', 0),
+            'misses': cache.get(f'{PREFIX}:stats:{name}:miss', 0),
+        }
+        for name in names
+    }
+
+
+def reset_cache_stats(names):
+    get_cache().delete_many([f'{PREFIX}:stats:{name}:{outcome}' for name in names for outcome in ['hit', 'miss']])
+
+
+def cached_response(request, name, user_id, scope, build, finalize):
+    """
+    Serve a rendered response from the cache, or build, render and store it.
+
+    build() returns the response for a miss; finalize(response) prepares it
+    for rendering (the view's finalize_response). Only 200 responses are
+    stored. Either way the response carries an ETag and Last-Modified, and a
+    matching If-None-Match or If-Modified-Since gets a 304.
+    """
+    cache = get_cache()
+    key = response_key(user_id, scope, name, request)
+    entry = cache.get(key)
+    if entry is None:
+        _count(name, 'miss')
+        response = finalize(build())
+        if response.status_code != 200:
+            return response
+        if hasattr(response, 'render'):
+            response.render()
+        entry = {
+            'content': response.content,
+            'headers': {header: response[header] for header in STORED_HEADERS if response.has_header(header)},
+            'etag': '"{}"'.format(hashlib.sha1(response.content).hexdigest()),
+            'last_modified': timezone.now().timestamp(),
+        }
+        cache.set(key, entry)
+        outcome = 'MISS'
+    else:
+        _count(name, 'hit')
+        response = HttpResponse(entry['content'])
+        for header, value in entry['headers'].items():
+            response[header] = value
+        outcome = 'HIT'
+
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    response['X-Cache'] = outcome
+    # Clients may keep the body but must revalidate it before reuse.
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(
+        request, etag=entry['etag'], last_modified=int(entry['last_modified']), response=response
+    )
+
+
+def invalidate(user_ids=(), dataset_ids=()):
+    """
+    Drop cached responses for the given users' history and datasets once
+    the current transaction commits.
+    """
+    keys = version_keys(user_ids, dataset_ids)
+    if keys:
+        transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def version_keys(user_ids=(), dataset_ids=()):
+    """The version token keys whose deletion drops the given users' history and datasets"""
+    scopes = [history_scope(pk) for pk in user_ids] + [dataset_scope(pk) for pk in dataset_ids]
+    return [f'{PREFIX}:version:{scope}' for scope in scopes]
@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import Dataset, RetentionPolicy
+from .reports import delete_reports
+from .response_cache import invalidate
+
+
+def default_policy():
+    return settings.EQUIPMENT_RETENTION_MAX_DATASETS, settings.EQUIPMENT_RETENTION_MAX_AGE_DAYS
+
+
+def policy_groups(user=None):
+    """
+    Yield (user filter, max_datasets, max_age_days) for each distinct policy.
+
+    Users without a RetentionPolicy row share the settings default, so the
+    number of groups is the number of distinct policies, not users.
+    """
+    if user is not None:
+        policy = RetentionPolicy.objects.filter(user=user).first()
+        limits = (policy.max_datasets, policy.max_age_days) if policy else default_policy()
+        yield Q(user=user), *limits
+        return
+
+    yield Q(user__dataset_retention__isnull=True), *default_policy()
+    custom = RetentionPolicy.objects.values_list('max_datasets', 'max_age_days').distinct()
+    for max_datasets, max_age_days in custom:
+        users = Q(
+            user__dataset_retention__max_datasets=max_datasets,
+            user__dataset_retention__max_age_days=max_age_days,
+        )
+        yield users, max_datasets, max_age_days
+
+
+def expired_datasets(user=None, now=None):
+    """Datasets outside their owner's retention policy, as a single queryset"""
+    now = now or timezone.now()
+    expired = Q(pk__in=[])
+    for users, max_datasets, max_age_days in policy_groups(user):
+        if max_datasets is not None:
+            ranked = (
+                Dataset.objects.filter(users)
+                .annotate(position=Window(
+                    RowNumber(),
+                    partition_by=[F('user_id')],
+                    order_by=[F('uploaded_at').desc(), F('id').desc()],
+                ))
+                .filter(position__gt=max_datasets)
+                .values('pk')
+            )
+            expired |= Q(pk__in=ranked)
+        if max_age_days is not None:
+            expired |= users & Q(uploaded_at__lt=now - timedelta(days=max_age_days))
+    return Dataset.objects.filter(expired)
+
+
+def prune_datasets(user=None, now=None):
+    """
+    Delete expired datasets for one user, or everyone, and return their ids.
+
+    The delete is set-based: one statement per table (equipment rows, type
+    statistics, job references, datasets) however many datasets expire.
+    """
+    with transaction.atomic():
+        expired = dict(expired_datasets(user, now).values_list('pk', 'user_id'))
+        if expired:
+            Dataset.objects.filter(pk__in=expired).delete()
+            invalidate(user_ids=set(expired.values()), dataset_ids=expired)
+            delete_reports(expired)
+    return list(expired)
@@ -0,0 +1,103 @@
+"""
+Declared schema of equipment uploads.
+
+Readers parse only these columns, with these types, instead of letting the
+parser infer types over every column of the file. Rows that do not fit are
+found with vectorized checks over whole chunks and reported with their line
+numbers (counting the header as line 1, one record per line).
+"""
+import pandas as pd
+
+
+# CSV column -> kind. 'text' columns must be non-empty, 'number' columns
+# must parse as floats; 'category' is text with few distinct values.
+EQUIPMENT_SCHEMA = {
+    'Equipment Name': 'text',
+    'Type': 'category',
+    'Flowrate': 'number',
+    'Pressure': 'number',
+    'Temperature': 'number',
+}
+REQUIRED_COLUMNS = list(EQUIPMENT_SCHEMA)
+# CSV column -> Equipment field.
+EQUIPMENT_COLUMNS = {
+    'Equipment Name': 'equipment_name',
+    'Type': 'equipment_type',
+    'Flowrate': 'flowrate',
+    'Pressure': 'pressure',
+    'Temperature': 'temperature',
+}
+# Numeric CSV column -> Dataset field holding its mean.
+NUMERIC_COLUMNS = {
+    'Flowrate': 'avg_flowrate',
+    'Pressure': 'avg_pressure',
+    'Temperature': 'avg_temperature',
+}
+PANDAS_DTYPES = {'text': 'string', 'category': 'category', 'number': 'float64'}
+# Invalid rows quoted in an error message; the full list is on the exception.
+REPORTED_ROWS = 10
+
+
+class IngestError(Exception):
+    """Raised when an uploaded file cannot be ingested"""
+
+
+class InvalidRowsError(IngestError):
+    """Raised when rows of an upload do not match the schema"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        lines = ', '.join(
+            f'line {row.line} {row.column} ({row.error})' for row in errors.head(REPORTED_ROWS).itertuples()
+        )
+        more = f' and {len(errors) - REPORTED_ROWS} more' if len(errors) > REPORTED_ROWS else ''
+        super().__init__(f'{len(errors)} invalid value(s): {lines}{more}')
+
+
+def missing_columns_error():
+    return IngestError(f'Missing required columns. Expected: {", ".join(REQUIRED_COLUMNS)}')
+
+
+def pandas_dtypes():
+    return {column: PANDAS_DTYPES[kind] for column, kind in EQUIPMENT_SCHEMA.items()}
+
+
+def row_errors(chunk, first_line):
+    """
+    Return a DataFrame of (line, column, value, error) for every value in
+    chunk that does not fit the schema. first_line is the line number of
+    the chunk's first row.
+    """
+    lines = pd.RangeIndex(first_line, first_line + len(chunk))
+    found = []
+    for column, kind in EQUIPMENT_SCHEMA.items():
+        values = chunk[column]
+        missing = values.isna().to_numpy()
+        if kind == 'number':
+            invalid = pd.to_numeric(values, errors='coerce').isna().to_numpy() & ~missing
+        else:
+            missing = missing | (values.astype('string').str.strip() == '').fillna(True).to_numpy()
+            invalid = None
+        for mask, error in [(missing, 'missing'), (invalid, 'not a number')]:
+            if mask is not None and mask.any():
+                found.append(pd.DataFrame({
+                    'line': lines[mask],
+                    'column': column,
+                    'value': values[mask].astype('string').fillna('').to_numpy(),
+                    'error': error,
+                }))
+    if not found:
+        return pd.DataFrame(columns=['line', 'column', 'value', 'error'])
+    return pd.concat(found, ignore_index=True).sort_values(['line', 'column'], ignore_index=True)
+
+
+def typed_chunk(chunk):
+    """Cast a chunk's schema columns to their declared dtypes"""
+    columns = {}
+    for column, kind in EQUIPMENT_SCHEMA.items():
+        values = chunk[column]
+        if kind == 'number':
+            columns[column] = pd.to_numeric(values, errors='coerce').astype('float64')
+        else:
+            columns[column] = values.astype(PANDAS_DTYPES[kind])
+    return pd.DataFrame(columns, index=chunk.index)
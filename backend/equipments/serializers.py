@@ -1,14 +1,73 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Dataset, Equipment
+from .jobs import rows_processed
+from .models import Dataset, Equipment, IngestJob, QuarantinedRow, UploadSession
 
 class EquipmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Equipment
         fields = ['id', 'equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature']
 
+    def __init__(self, *args, fields=None, **kwargs):
+        """Pass fields=[...] to serialize only a projection of the row"""
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 class DatasetSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Dataset
+        fields = ['id', 'filename', 'uploaded_at', 'total_count', 'avg_flowrate', 'avg_pressure', 'avg_temperature', 'equipment_distribution']
+
+class DatasetDetailSerializer(DatasetSerializer):
     equipment = EquipmentSerializer(many=True, read_only=True)
     
+    class Meta(DatasetSerializer.Meta):
+        fields = DatasetSerializer.Meta.fields + ['equipment']
+
+
+class IngestJobSerializer(serializers.ModelSerializer):
+    rows_processed = serializers.SerializerMethodField()
+    throughput = serializers.SerializerMethodField()
+
     class Meta:
-        model = Dataset
-        fields = ['id', 'filename', 'uploaded_at', 'total_count', 'avg_flowrate', 'avg_pressure', 'avg_temperature', 'equipment_distribution', 'equipment']
\ No newline at end of file
+        model = IngestJob
+        fields = [
+            'id', 'filename', 'content_encoding', 'append', 'tolerant', 'state', 'rows_processed', 'throughput', 'deduplicated',
+            'rows_rejected', 'rejected_summary', 'error', 'dataset', 'created_at', 'started_at', 'finished_at',
+        ]
+
+    def get_rows_processed(self, job):
+        return rows_processed(job)
+
+    def get_throughput(self, job):
+        """Rows per second since the job started"""
+        if not job.started_at:
+            return None
+        elapsed = ((job.finished_at or timezone.now()) - job.started_at).total_seconds()
+        return rows_processed(job) / elapsed if elapsed > 0 else None
+
+
+class QuarantinedRowSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = QuarantinedRow
+        fields = ['line', 'values', 'errors']
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    # Bytes acknowledged so far: where a resumed upload continues
+    offset = serializers.IntegerField(source='received', read_only=True)
+    next_chunk = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'filename', 'content_encoding', 'size', 'chunk_size', 'offset', 'next_chunk', 'append', 'dataset', 'tolerant', 'job',
+            'created_at', 'updated_at',
+        ]
+
+    def get_next_chunk(self, upload):
+        if upload.received >= upload.size:
+            return None
+        return upload.received // upload.chunk_size
@@ -0,0 +1,233 @@
+import math
+
+from django.conf import settings
+from django.db import transaction
+import numpy as np
+import pandas as pd
+
+from .models import Dataset, DatasetTypeStats, Equipment
+from .schema import EQUIPMENT_COLUMNS, NUMERIC_COLUMNS
+
+
+# CSV column -> Equipment field for the per-type statistics.
+PARAMETERS = {column: EQUIPMENT_COLUMNS[column] for column in NUMERIC_COLUMNS}
+QUANTILES = {'p25': 0.25, 'p50': 0.5, 'p75': 0.75}
+
+
+def merge_moments(a, b):
+    """
+    Combine two (count, mean, m2) triples, where m2 is the sum of squared
+    deviations from the mean (Chan et al.'s parallel variance update).
+    """
+    count_a, mean_a, m2_a = a
+    count_b, mean_b, m2_b = b
+    count = count_a + count_b
+    if count == 0:
+        return 0, 0.0, 0.0
+    delta = mean_b - mean_a
+    mean = mean_a + delta * count_b / count
+    m2 = m2_a + m2_b + delta * delta * count_a * count_b / count
+    return count, mean, m2
+
+
+def merge_samples(sample_a, count_a, sample_b, count_b, size, rng):
+    """
+    Merge two uniform samples of populations of count_a and count_b rows into
+    a uniform sample of at most size rows from the combined population.
+    """
+    combined = np.concatenate([sample_a, sample_b])
+    if len(combined) <= size:
+        return combined
+    # How many of the kept rows come from each side follows a hypergeometric draw.
+    take_a = rng.hypergeometric(count_a, count_b, size)
+    take_a = min(take_a, len(sample_a))
+    take_b = min(size - take_a, len(sample_b))
+    return np.concatenate([
+        sample_a[rng.choice(len(sample_a), take_a, replace=False)],
+        sample_b[rng.choice(len(sample_b), take_b, replace=False)],
+    ])
+
+
+class _TypeState:
+    def __init__(self, width):
+        self.count = 0
+        self.moments = [(0, 0.0, 0.0)] * width
+        self.minimum = [math.inf] * width
+        self.maximum = [-math.inf] * width
+        self.sample = np.empty((0, width))
+
+
+def quantile_sketch(row, size):
+    """
+    Stand-in sample of size values for a stored parameter's distribution.
+
+    Values are read off the piecewise linear CDF through the stored minimum,
+    quartiles and maximum at evenly spaced probabilities.
+    """
+    quantiles = [row.min, row.p25, row.p50, row.p75, row.max]
+    if any(value is None for value in quantiles):
+        return np.full(size, row.mean)
+    return np.interp(np.linspace(0, 1, size), [0, 0.25, 0.5, 0.75, 1], quantiles)
+
+
+class TypeStatsAccumulator:
+    """
+    Per-type statistics folded in one chunk at a time.
+
+    Counts, means, standard deviations and extrema are exact. Quantiles are
+    computed from a uniform sample of at most sample_size rows per type, so
+    they are exact for types with fewer rows than that.
+    """
+
+    def __init__(self, sample_size=None, seed=0):
+        self.sample_size = sample_size or settings.EQUIPMENT_STATS_SAMPLE_SIZE
+        self.rng = np.random.default_rng(seed)
+        self.types = {}
+
+    @classmethod
+    def from_dataset(cls, dataset, sample_size=None, seed=0):
+        """
+        Resume accumulation from a dataset's stored statistics.
+
+        Moments and extrema continue exactly. Types small enough to be fully
+        sampled reload their rows, so their quantiles stay exact; for larger
+        types the sample is rebuilt from the stored quartiles.
+        """
+        accumulator = cls(sample_size, seed)
+        stored = stored_type_stats(dataset)
+
+        by_type = {}
+        for row in stored:
+            by_type.setdefault(row.equipment_type, {})[row.parameter] = row
+        counts = {equipment_type: max(row.count for row in rows.values()) for equipment_type, rows in by_type.items()}
+        small = [equipment_type for equipment_type, count in counts.items() if count <= accumulator.sample_size]
+        samples = {}
+        if small:
+            queryset = Equipment.objects.filter(dataset=dataset, equipment_type__in=small)
+            frame = pd.DataFrame.from_records(
+                queryset.values_list('equipment_type', *PARAMETERS.values()),
+                columns=['Type', *PARAMETERS],
+            )
+            for equipment_type, rows in frame.groupby('Type', sort=False):
+                samples[equipment_type] = rows[list(PARAMETERS)].to_numpy(dtype='float64')
+
+        for equipment_type, rows in by_type.items():
+            state = accumulator.types[equipment_type] = _TypeState(len(PARAMETERS))
+            state.count = counts[equipment_type]
+            sketch = np.full((accumulator.sample_size, len(PARAMETERS)), np.nan)
+            for i, parameter in enumerate(PARAMETERS.values()):
+                row = rows.get(parameter)
+                if row is None:
+                    continue
+                m2 = row.std ** 2 * (row.count - 1) if row.std is not None else 0.0
+                state.moments[i] = (row.count, row.mean, m2)
+                state.minimum[i] = row.min
+                state.maximum[i] = row.max
+                sketch[:, i] = quantile_sketch(row, accumulator.sample_size)
+            state.sample = samples[equipment_type] if equipment_type in samples else sketch
+        return accumulator
+
+    def update(self, chunk):
+        values = chunk[list(PARAMETERS)].astype('float64')
+        grouped = values.groupby(chunk['Type'].astype(str), sort=False)
+        summary = grouped.agg(['count', 'mean', 'min', 'max', 'var'])
+        for equipment_type, rows in grouped:
+            state = self.types.setdefault(equipment_type, _TypeState(len(PARAMETERS)))
+            for i, column in enumerate(PARAMETERS):
+                count = int(summary.at[equipment_type, (column, 'count')])
+                if count == 0:
+                    continue
+                var = summary.at[equipment_type, (column, 'var')]
+                m2 = 0.0 if pd.isna(var) else float(var) * (count - 1)
+                state.moments[i] = merge_moments(
+                    state.moments[i], (count, float(summary.at[equipment_type, (column, 'mean')]), m2)
+                )
+                state.minimum[i] = min(state.minimum[i], float(summary.at[equipment_type, (column, 'min')]))
+                state.maximum[i] = max(state.maximum[i], float(summary.at[equipment_type, (column, 'max')]))
+            state.sample = merge_samples(
+                state.sample, state.count, rows.to_numpy(), len(rows), self.sample_size, self.rng
+            )
+            state.count += len(rows)
+
+    def rows(self, dataset):
+        """Build unsaved DatasetTypeStats rows for dataset"""
+        stats = []
+        for equipment_type, state in self.types.items():
+            for i, parameter in enumerate(PARAMETERS.values()):
+                count, mean, m2 = state.moments[i]
+                if count == 0:
+                    continue
+                column = state.sample[:, i]
+                column = column[~np.isnan(column)]
+                quantiles = np.quantile(column, list(QUANTILES.values())) if len(column) else [None] * len(QUANTILES)
+                stats.append(DatasetTypeStats(
+                    dataset=dataset,
+                    equipment_type=equipment_type,
+                    parameter=parameter,
+                    count=count,
+                    mean=mean,
+                    min=state.minimum[i],
+                    max=state.maximum[i],
+                    std=math.sqrt(m2 / (count - 1)) if count > 1 else None,
+                    **{name: None if value is None else float(value) for name, value in zip(QUANTILES, quantiles)},
+                ))
+        return stats
+
+
+def build_type_stats(dataset):
+    """
+    Compute and store per-type statistics from a dataset's stored rows.
+
+    Used to backfill datasets ingested before statistics were precomputed.
+    """
+    accumulator = TypeStatsAccumulator()
+    columns = {'equipment_type': 'Type', **{field: column for column, field in PARAMETERS.items()}}
+    queryset = Equipment.objects.filter(dataset=dataset).values_list(*columns)
+    rows = queryset.iterator(chunk_size=settings.EQUIPMENT_INGEST_CHUNK_SIZE)
+    while True:
+        chunk = pd.DataFrame.from_records(
+            (row for _, row in zip(range(settings.EQUIPMENT_INGEST_CHUNK_SIZE), rows)),
+            columns=list(columns.values()),
+        )
+        if chunk.empty:
+            break
+        accumulator.update(chunk)
+    return DatasetTypeStats.objects.bulk_create(accumulator.rows(dataset))
+
+
+def stored_type_stats(dataset):
+    """
+    Return the dataset's DatasetTypeStats rows, backfilling them first if
+    the dataset predates them.
+
+    The backfill holds a lock on the dataset row and checks again once it
+    has it, so concurrent first reads build the statistics only once.
+    """
+    queryset = DatasetTypeStats.objects.filter(dataset=dataset).order_by('equipment_type', 'parameter')
+    stats = list(queryset)
+    if stats or not dataset.total_count:
+        return stats
+    with transaction.atomic():
+        Dataset.objects.select_for_update().filter(pk=dataset.pk).exists()
+        stats = list(queryset.all())
+        if not stats:
+            stats = build_type_stats(dataset)
+    return stats
+
+
+def type_stats(dataset):
+    """Return the dataset's precomputed statistics grouped by equipment type"""
+    stats = stored_type_stats(dataset)
+
+    by_type = {}
+    for row in stats:
+        entry = by_type.setdefault(row.equipment_type, {'equipment_type': row.equipment_type, 'count': 0})
+        entry['count'] = max(entry['count'], row.count)
+        entry[row.parameter] = {
+            'mean': row.mean,
+            'min': row.min,
+            'max': row.max,
+            'std': row.std,
+            **{name: getattr(row, name) for name in QUANTILES},
+        }
+    return sorted(by_type.values(), key=lambda entry: (-entry['count'], entry['equipment_type']))
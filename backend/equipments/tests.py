@@ -0,0 +1,818 @@
+import gzip
+import hashlib
+import io
+import json
+import shutil
+import struct
+import tempfile
+import threading
+import zipfile
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+import pandas as pd
+from rest_framework.test import APIClient
+import zstandard
+
+from . import ingest, jobs, reports, retention, stats
+from .columnar import MEDIA_TYPE
+from .models import Dataset, DatasetTypeStats, IngestJob, RetentionPolicy
+
+
+CSV_HEADER = 'Equipment Name,Type,Flowrate,Pressure,Temperature\n'
+
+
+def make_csv(rows, types=('Pump', 'Valve', 'Reactor')):
+    """An upload with rows rows cycling through types, with distinct values"""
+    lines = [
+        f'{types[i % len(types)]}-{i},{types[i % len(types)]},{100 + i},{1 + i / 10:.1f},{50 + i % 40}\n'
+        for i in range(rows)
+    ]
+    return (CSV_HEADER + ''.join(lines)).encode('utf-8')
+
+
+class EquipmentTestCase(TestCase):
+    """
+    API tests against a temporary MEDIA_ROOT, with uploads ingested inline
+    when the request's transaction commits.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            EQUIPMENT_INGEST_EXECUTOR='inline',
+            CACHES={
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'equipments': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                    'LOCATION': f'{cls.media_root}/cache',
+                },
+            },
+        )
+        cls.settings_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        jobs._executor = None
+        caches['equipments'].clear()
+        self.user = User.objects.create_user('alice', password='secret-pw-1')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, data, name='equipment.csv', url='/api/equipments/datasets/upload/', **fields):
+        """POST an upload and run its ingest job; return the job as the API reports it"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                url,
+                {'file': SimpleUploadedFile(name, data), **fields},
+                format='multipart',
+            )
+        self.assertEqual(response.status_code, 202, response.data)
+        return self.client.get(f"/api/equipments/datasets/jobs/{response.data['id']}/").data
+
+
+class InsertStrategyTests(EquipmentTestCase):
+    # Quotes and commas in names must survive COPY's CSV encoding.
+    DATA = CSV_HEADER + ''.join(
+        f'"Pump, ""{i}""",{("Pump", "Valve")[i % 2]},{100 + i * 0.25},{1 + i / 8},{50 + i}\n' for i in range(23)
+    )
+
+    def stored(self, **kwargs):
+        dataset = ingest.ingest_csv(io.BytesIO(self.DATA.encode('utf-8')), self.user, 'strategy.csv', **kwargs)
+        rows = list(dataset.equipment.order_by('id').values_list(
+            'equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature'
+        ))
+        summary = (dataset.total_count, dataset.avg_flowrate, dataset.avg_pressure, dataset.equipment_distribution)
+        return rows, summary
+
+    def test_chunk_and_batch_sizes_store_the_same_rows(self):
+        expected = self.stored()
+        self.assertEqual(expected[0][0], ('Pump, "0"', 'Pump', 100.0, 1.0, 50.0))
+        for chunk_size, batch_size in ((5, 1), (7, 3), (23, 1000), (100, 4)):
+            with self.subTest(chunk_size=chunk_size, batch_size=batch_size):
+                self.assertEqual(self.stored(chunk_size=chunk_size, batch_size=batch_size), expected)
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY needs PostgreSQL')
+    def test_copy_matches_executemany(self):
+        copied = self.stored(chunk_size=7)
+        with mock.patch.dict(ingest.CHUNK_WRITERS, {'postgresql': ingest.executemany_chunk}):
+            self.assertEqual(self.stored(chunk_size=7), copied)
+
+
+class ParserTests(EquipmentTestCase):
+    def test_parsers_store_the_same_rows(self):
+        data = CSV_HEADER.replace('\n', ',Notes\n') + ''.join(
+            f'Pump-{i},Pump,{100 + i * 0.5},{1 + i / 10},{50 + i},extra {i}\n' for i in range(20)
+        )
+        stored = {}
+        for engine in ('c', 'pyarrow'):
+            with self.subTest(engine=engine), override_settings(EQUIPMENT_CSV_ENGINE=engine, EQUIPMENT_INGEST_CHUNK_SIZE=7):
+                job = self.upload(data.encode('utf-8'), name=f'{engine}.csv')
+                self.assertEqual(job['state'], 'succeeded', job['error'])
+                self.assertFalse(job['deduplicated'])
+                dataset = Dataset.objects.get(pk=job['dataset'])
+                stored[engine] = list(dataset.equipment.order_by('id').values_list(
+                    'equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature'
+                ))
+                # Otherwise the next upload would reuse this dataset.
+                dataset.delete()
+        self.assertEqual(len(stored['c']), 20)
+        self.assertEqual(stored['c'], stored['pyarrow'])
+
+
+@override_settings(EQUIPMENT_INGEST_CHUNK_SIZE=7)
+class ReaderTests(EquipmentTestCase):
+    FIELDS = ('equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature')
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_csv(40)
+        self.frame = pd.read_csv(io.BytesIO(self.data))
+
+    def stored(self, job):
+        self.assertEqual(job['state'], 'succeeded', job['error'])
+        return list(Dataset.objects.get(pk=job['dataset']).equipment.order_by('id').values_list(*self.FIELDS))
+
+    def test_every_format_stores_the_same_rows(self):
+        parquet, xlsx = io.BytesIO(), io.BytesIO()
+        self.frame.to_parquet(parquet, index=False)
+        self.frame.to_excel(xlsx, index=False)
+        files = {
+            'equipment.csv.gz': gzip.compress(self.data),
+            'equipment.csv.zst': zstandard.ZstdCompressor().compress(self.data),
+            'equipment.parquet': parquet.getvalue(),
+            'equipment.xlsx': xlsx.getvalue(),
+        }
+        expected = self.stored(self.upload(self.data))
+        self.assertEqual(len(expected), 40)
+        Dataset.objects.all().delete()
+        for name, data in files.items():
+            with self.subTest(name=name):
+                self.assertEqual(self.stored(self.upload(data, name=name)), expected)
+                # Otherwise the next upload could reuse this dataset.
+                Dataset.objects.all().delete()
+
+    def test_compressed_copy_is_deduplicated(self):
+        first = self.upload(self.data)
+        again = self.upload(gzip.compress(self.data), name='equipment.csv.gz')
+        self.assertTrue(again['deduplicated'])
+        self.assertEqual(again['dataset'], first['dataset'])
+
+    def post_raw(self, data, **headers):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                '/api/equipments/datasets/upload/', data, content_type='application/octet-stream',
+                HTTP_CONTENT_DISPOSITION='attachment; filename=equipment.csv', **headers
+            )
+
+    def test_raw_body_with_content_encoding(self):
+        expected = self.stored(self.upload(self.data))
+        Dataset.objects.all().delete()
+        response = self.post_raw(gzip.compress(self.data), HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 202, response.data)
+        job = self.client.get(f"/api/equipments/datasets/jobs/{response.data['id']}/").data
+        self.assertEqual(self.stored(job), expected)
+
+        response = self.post_raw(self.data, HTTP_CONTENT_ENCODING='br')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Content-Encoding', response.data['error'])
+
+    def test_unsupported_and_corrupt_files(self):
+        response = self.client.post(
+            '/api/equipments/datasets/upload/',
+            {'file': SimpleUploadedFile('equipment.gz', gzip.compress(self.data))},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, 400)
+        job = self.upload(b'not gzip at all', name='equipment.csv.gz')
+        self.assertEqual(job['state'], 'failed')
+
+
+class TolerantUploadTests(EquipmentTestCase):
+    # Lines counted with the header as line 1: bad rows on 3, 8 and 9, either
+    # side of the chunk boundary after line 7.
+    DATA = CSV_HEADER + (
+        'Pump-1,Pump,100,1.0,50\n'
+        'Pump-2,Pump,fast,1.0,50\n'
+        'Valve-3,Valve,103,1.3,53\n'
+        'Valve-4,Valve,104,1.4,54\n'
+        'Pump-5,Pump,105,1.5,55\n'
+        'Pump-6,Pump,106,1.6,56\n'
+        ',Valve,107,1.7,57\n'
+        'Valve-8,Valve,108,1.8,hot\n'
+        'Pump-9,Pump,109,1.9,59\n'
+    )
+
+    @override_settings(EQUIPMENT_INGEST_CHUNK_SIZE=6)
+    def test_rejected_rows_keep_their_line_numbers(self):
+        job = self.upload(self.DATA.encode('utf-8'), tolerant='true')
+        self.assertEqual(job['state'], 'succeeded', job['error'])
+        self.assertEqual(job['rows_processed'], 6)
+        self.assertEqual(job['rows_rejected'], 3)
+        self.assertEqual(Dataset.objects.get(pk=job['dataset']).total_count, 6)
+
+        url = f"/api/equipments/datasets/jobs/{job['id']}/rejected/"
+        first = self.client.get(url, {'page_size': 2}).data
+        second = self.client.get(first['next']).data
+        rejected = first['results'] + second['results']
+        self.assertIsNone(second['next'])
+        self.assertEqual([row['line'] for row in rejected], [3, 8, 9])
+        self.assertEqual(rejected[0]['values']['Flowrate'], 'fast')
+        self.assertEqual([error['column'] for error in rejected[0]['errors']], ['Flowrate'])
+        self.assertEqual([error['column'] for error in rejected[2]['errors']], ['Temperature'])
+
+    def test_strict_upload_reports_every_bad_line(self):
+        job = self.upload(self.DATA.encode('utf-8'))
+        self.assertEqual(job['state'], 'failed')
+        self.assertIn('3 invalid value(s): line 3 Flowrate', job['error'])
+        self.assertIn('line 9 Temperature', job['error'])
+
+
+@override_settings(EQUIPMENT_UPLOAD_CHUNK_SIZE=64)
+class ChunkedUploadTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = make_csv(10)
+        response = self.client.post(
+            '/api/equipments/datasets/uploads/', {'filename': 'big.csv', 'size': len(self.data)}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.url = f"/api/equipments/datasets/uploads/{response.data['id']}/"
+
+    def put_chunk(self, index, body=None, **headers):
+        if body is None:
+            body = self.data[index * 64:(index + 1) * 64]
+        return self.client.put(
+            f'{self.url}chunks/{index}/', body, content_type='application/octet-stream', **headers
+        )
+
+    def test_chunks_must_arrive_in_order(self):
+        response = self.put_chunk(1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((response.data['offset'], response.data['next_chunk']), (0, 0))
+
+        self.assertEqual(self.put_chunk(0).data['offset'], 64)
+        # A retried chunk whose response was lost is acknowledged again, not appended.
+        retried = self.put_chunk(0)
+        self.assertEqual(retried.status_code, 200)
+        self.assertEqual(retried.data['offset'], 64)
+
+        self.assertEqual(self.put_chunk(1, b'short').status_code, 400)
+        bad_digest = self.put_chunk(1, HTTP_X_CHUNK_SHA256='0' * 64)
+        self.assertEqual(bad_digest.status_code, 400)
+        self.assertEqual(bad_digest.data['offset'], 64)
+
+    def test_resume_from_the_reported_offset(self):
+        self.put_chunk(0)
+        self.put_chunk(1, HTTP_X_CHUNK_SHA256=hashlib.sha256(self.data[64:128]).hexdigest())
+        self.assertEqual(self.client.post(f'{self.url}complete/').status_code, 400)
+
+        # The client restarts and asks where to continue.
+        session = self.client.get(self.url).data
+        self.assertEqual((session['offset'], session['next_chunk']), (128, 2))
+        index = session['next_chunk']
+        while index is not None:
+            index = self.put_chunk(index).data['next_chunk']
+        self.assertEqual(self.client.get(self.url).data['offset'], len(self.data))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            completed = self.client.post(f'{self.url}complete/')
+        self.assertEqual(completed.status_code, 202)
+        job = self.client.get(f"/api/equipments/datasets/jobs/{completed.data['id']}/").data
+        self.assertEqual(job['state'], 'succeeded', job['error'])
+        self.assertEqual(job['rows_processed'], 10)
+        self.assertEqual(self.client.post(f'{self.url}complete/').data['id'], completed.data['id'])
+        self.assertEqual(self.put_chunk(0).status_code, 409)
+
+
+class EquipmentPaginationTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        # 1240 Pump rows: more ties than CursorPagination's offset_cutoff of 1000
+        self.upload(make_csv(3100, types=('Pump', 'Valve', 'Pump', 'Reactor', 'Condenser')))
+        self.dataset = Dataset.objects.get(user=self.user)
+        self.url = f'/api/equipments/datasets/{self.dataset.pk}/equipment/'
+
+    def walk(self, url, link='next'):
+        rows, pages = [], 0
+        while url:
+            data = self.client.get(url).data
+            rows.extend(data['results'])
+            url = data[link]
+            pages += 1
+            self.assertLess(pages, 50, 'pagination does not end')
+        return rows
+
+    def test_every_row_once_on_a_field_with_many_ties(self):
+        for ordering in ('equipment_type', '-equipment_type', 'temperature', '-id'):
+            with self.subTest(ordering=ordering):
+                rows = self.walk(f'{self.url}?ordering={ordering}&page_size=300&fields=id,equipment_type,temperature')
+                ids = [row['id'] for row in rows]
+                self.assertEqual(len(ids), 3100)
+                self.assertEqual(len(set(ids)), 3100)
+                field = ordering.lstrip('-')
+                keys = [(row[field], row['id']) for row in rows]
+                self.assertEqual(keys, sorted(keys, reverse=ordering.startswith('-')))
+
+    def test_previous_links_walk_back_over_ties(self):
+        url = f'{self.url}?ordering=equipment_type&page_size=400&fields=id'
+        forward = self.walk(url)
+        last_page = self.client.get(url)
+        while last_page.data['next']:
+            last_page = self.client.get(last_page.data['next'])
+        backward = self.walk(last_page.data['previous'], link='previous')
+        self.assertEqual(len(backward), 3100 - len(last_page.data['results']))
+        self.assertEqual(
+            sorted(row['id'] for row in backward + last_page.data['results']),
+            sorted(row['id'] for row in forward),
+        )
+
+    def test_invalid_cursor_is_not_found(self):
+        self.assertEqual(self.client.get(f'{self.url}?ordering=equipment_type&cursor=bm9wZQ').status_code, 404)
+
+
+class ResponseCacheTests(EquipmentTestCase):
+    def test_history_is_cached_and_revalidated(self):
+        self.upload(make_csv(3))
+        first = self.client.get('/api/equipments/datasets/history/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        second = self.client.get('/api/equipments/datasets/history/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second['ETag'], first['ETag'])
+        not_modified = self.client.get('/api/equipments/datasets/history/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_upload_and_delete_invalidate_history(self):
+        self.upload(make_csv(3))
+        before = self.client.get('/api/equipments/datasets/history/')
+        self.upload(make_csv(4))
+        after = self.client.get('/api/equipments/datasets/history/')
+        self.assertEqual(after['X-Cache'], 'MISS')
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertEqual(len(after.json()), 2)
+
+        dataset = Dataset.objects.filter(user=self.user).latest('uploaded_at')
+        self.client.get(f'/api/equipments/datasets/{dataset.pk}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/equipments/datasets/{dataset.pk}/')
+        self.assertEqual(self.client.get(f'/api/equipments/datasets/{dataset.pk}/').status_code, 404)
+        self.assertEqual(len(self.client.get('/api/equipments/datasets/history/').json()), 1)
+
+    def test_invalidation_reaches_other_workers(self):
+        # Another Gunicorn worker has its own cache object over the same files.
+        other_worker = FileBasedCache(f'{self.media_root}/cache', {})
+        self.upload(make_csv(3))
+        self.client.get('/api/equipments/datasets/history/')
+        version_key = f'equipments:version:history-{self.user.pk}'
+        self.assertEqual(other_worker.get(version_key), caches['equipments'].get(version_key))
+
+        self.upload(make_csv(4))
+        self.assertIsNone(other_worker.get(version_key))
+
+    def test_default_cache_is_shared_between_processes(self):
+        from backend import settings as project_settings
+        self.assertNotIn('locmem', project_settings.CACHES['equipments']['BACKEND'])
+
+
+class ChartDataTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload(make_csv(50))
+        self.dataset = Dataset.objects.get(user=self.user)
+        self.url = f'/api/equipments/datasets/{self.dataset.pk}/chart-data/'
+
+    def test_payload_is_built_once_per_dataset_contents(self):
+        first = self.client.get(self.url, {'points': 10})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(first.json()['total_count'], 50)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url, {'points': 10})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(self.client.get(self.url, {'points': 20})['X-Cache'], 'MISS')
+
+        self.upload(make_csv(5), url=f'/api/equipments/datasets/{self.dataset.pk}/append/')
+        after = self.client.get(self.url, {'points': 10})
+        self.assertEqual(after['X-Cache'], 'MISS')
+        self.assertEqual(after.json()['total_count'], 55)
+
+    def test_other_users_and_bad_parameters_are_not_cached(self):
+        self.client.get(self.url)
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('bob', password='secret-pw-2'))
+        self.assertEqual(other.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'method': 'spline'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'bins': 0}).status_code, 400)
+
+
+class StatsBackfillTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload(make_csv(30))
+        self.dataset = Dataset.objects.get(user=self.user)
+        self.url = f'/api/equipments/datasets/{self.dataset.pk}/stats/'
+        self.expected = self.client.get(self.url).json()
+        # As if the dataset had been uploaded before DatasetTypeStats existed
+        DatasetTypeStats.objects.filter(dataset=self.dataset).delete()
+
+    def test_first_read_backfills_once(self):
+        with mock.patch.object(stats, 'build_type_stats', wraps=stats.build_type_stats) as build:
+            self.assertEqual(self.client.get(self.url).json(), self.expected)
+            self.assertEqual(self.client.get(self.url).json(), self.expected)
+        build.assert_called_once()
+        self.assertEqual(DatasetTypeStats.objects.filter(dataset=self.dataset).count(), 3 * len(stats.PARAMETERS))
+
+    def test_backfill_rechecks_under_the_dataset_lock(self):
+        select_for_update = Dataset.objects.select_for_update
+        build_type_stats = stats.build_type_stats
+
+        def concurrent_backfill():
+            # Another request backfills while this one waits for the lock.
+            build_type_stats(self.dataset)
+            return select_for_update()
+
+        with mock.patch.object(Dataset.objects, 'select_for_update', side_effect=concurrent_backfill), \
+                mock.patch.object(stats, 'build_type_stats', wraps=stats.build_type_stats) as build:
+            self.assertEqual(self.client.get(self.url).json(), self.expected)
+        build.assert_not_called()
+        self.assertEqual(DatasetTypeStats.objects.filter(dataset=self.dataset).count(), 3 * len(stats.PARAMETERS))
+
+
+class ExportTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload(make_csv(2500))
+        self.dataset = Dataset.objects.get(user=self.user)
+        self.url = f'/api/equipments/datasets/{self.dataset.pk}/export/'
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_export_can_be_uploaded_again(self):
+        response, body = self.export()
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn(f'equipment-{self.dataset.pk}.csv', response['Content-Disposition'])
+        lines = body.splitlines()
+        self.assertEqual(lines[0], 'id,Equipment Name,Type,Flowrate,Pressure,Temperature')
+        self.assertEqual(len(lines), 2501)
+
+        job = self.upload(body.encode('utf-8'), name='export.csv')
+        self.assertEqual(job['state'], 'succeeded', job['error'])
+        copy = Dataset.objects.get(pk=job['dataset'])
+        fields = ('equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature')
+        self.assertEqual(
+            list(copy.equipment.order_by('id').values_list(*fields)),
+            list(self.dataset.equipment.order_by('id').values_list(*fields)),
+        )
+
+    def test_ndjson_export_with_fields_and_type_filter(self):
+        response, body = self.export(format='ndjson', fields='equipment_name,flowrate', type='Valve')
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), self.dataset.equipment.filter(equipment_type='Valve').count())
+        self.assertEqual(rows[0], {'equipment_name': 'Valve-1', 'flowrate': 101.0})
+        self.assertTrue(all(row['equipment_name'].startswith('Valve-') for row in rows))
+
+    def test_csv_export_with_fields(self):
+        _, body = self.export(fields='equipment_type,temperature', type='Pump,Reactor')
+        lines = body.splitlines()
+        self.assertEqual(lines[:3], ['Type,Temperature', 'Pump,50.0', 'Reactor,52.0'])
+        self.assertEqual(len(lines) - 1, self.dataset.equipment.exclude(equipment_type='Valve').count())
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'fields': 'cost'}).status_code, 400)
+
+
+class CompareTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload(make_csv(20))
+        self.upload(make_csv(30))
+        self.ids = list(Dataset.objects.filter(user=self.user).order_by('id').values_list('id', flat=True))
+
+    def compare(self, **params):
+        response = self.client.get('/api/equipments/datasets/compare/', {'ids': ','.join(map(str, self.ids)), **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_names_are_opt_in(self):
+        data = self.compare()
+        self.assertNotIn('by_name', data)
+        pumps = next(entry for entry in data['by_type'] if entry['equipment_type'] == 'Pump')
+        self.assertEqual([values['count'] for values in pumps['values']], [7, 10])
+        self.assertEqual(pumps['deltas'][1]['count'], 3)
+
+    def test_names_are_paged_with_a_cursor(self):
+        names, after = [], None
+        while True:
+            params = {'group': 'name', 'limit': 7}
+            if after is not None:
+                params['after'] = after
+            # The datasets, one name page per dataset and the page's aggregates
+            with self.assertNumQueries(4):
+                data = self.compare(**params)
+            self.assertLessEqual(len(data['by_name']), 7)
+            names.extend(entry['equipment_name'] for entry in data['by_name'])
+            after = data['by_name_after']
+            if after is None:
+                break
+        expected = sorted({f"{('Pump', 'Valve', 'Reactor')[i % 3]}-{i}" for i in range(30)})
+        self.assertEqual(names, expected)
+
+        entry = self.compare(group='name', after='Pump-0', limit=1)['by_name'][0]
+        self.assertEqual(entry['equipment_name'], 'Pump-12')
+        self.assertEqual(entry['values'][1]['flowrate'], 112)
+        self.assertEqual(entry['deltas'], [None, {'count': 0, 'flowrate': 0, 'pressure': 0, 'temperature': 0}])
+        self.assertIsNone(self.compare(group='name', after='Valve-8')['by_name_after'])
+
+    def test_invalid_parameters(self):
+        ids = ','.join(map(str, self.ids))
+        for params in ({'group': 'serial'}, {'group': 'name', 'limit': 0}, {'group': 'name', 'limit': 1001}):
+            with self.subTest(**params):
+                response = self.client.get('/api/equipments/datasets/compare/', {'ids': ids, **params})
+                self.assertEqual(response.status_code, 400)
+
+
+class ReportDownloadTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload(make_csv(20))
+        self.dataset = Dataset.objects.get(user=self.user)
+        self.url = f'/api/equipments/datasets/{self.dataset.pk}/generate_report/'
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.etag = response['ETag']
+        self.pdf = b''.join(response.streaming_content)
+
+    def test_report_is_rendered_once_and_revalidated(self):
+        self.assertTrue(self.pdf.startswith(b'%PDF'))
+        with mock.patch('equipments.reports.render_report') as render:
+            again = self.client.get(self.url)
+            self.assertEqual(b''.join(again.streaming_content), self.pdf)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        render.assert_not_called()
+        self.assertEqual(again['ETag'], self.etag)
+        self.assertEqual(again['Accept-Ranges'], 'bytes')
+        self.assertEqual(not_modified.status_code, 304)
+
+        self.upload(make_csv(5), url=f'/api/equipments/datasets/{self.dataset.pk}/append/')
+        rendered = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        rendered.close()
+        self.assertEqual(rendered.status_code, 200)
+        self.assertNotEqual(rendered['ETag'], self.etag)
+
+    def test_byte_ranges(self):
+        size = len(self.pdf)
+        for header, start, end in (('bytes=0-9', 0, 9), ('bytes=10-', 10, size - 1), ('bytes=-5', size - 5, size - 1)):
+            with self.subTest(range=header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+                self.assertEqual(b''.join(response.streaming_content), self.pdf[start:end + 1])
+
+        stale = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"an-older-report"')
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(b''.join(stale.streaming_content), self.pdf)
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.pdf)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.pdf)}')
+
+
+class BulkReportTests(EquipmentTestCase):
+    def test_reports_are_streamed_in_order(self):
+        self.upload(make_csv(5))
+        self.upload(make_csv(6))
+        first, second = Dataset.objects.filter(user=self.user).order_by('id')
+        with mock.patch('equipments.reports.render_report',
+                        side_effect=lambda dataset, file: file.write(b'%PDF-1.4 ' + str(dataset.pk).encode())):
+            response = self.client.get('/api/equipments/datasets/reports/bulk/', {'ids': f'{second.pk},{first.pk}'})
+            self.assertEqual(response.status_code, 200)
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), [f'equipment-report-{second.pk}.pdf', f'equipment-report-{first.pk}.pdf'])
+        self.assertEqual(archive.read(f'equipment-report-{first.pk}.pdf'), f'%PDF-1.4 {first.pk}'.encode())
+
+    def test_failed_report_becomes_an_error_entry(self):
+        self.upload(make_csv(5))
+        dataset = Dataset.objects.get(user=self.user)
+        with mock.patch('equipments.reports.render_report', side_effect=RuntimeError('no fonts')):
+            response = self.client.get('/api/equipments/datasets/reports/bulk/', {'ids': dataset.pk})
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.read(f'equipment-report-{dataset.pk}.error.txt'), b'Report failed: no fonts\n')
+
+    @override_settings(EQUIPMENT_REPORT_WORKERS=2)
+    def test_reports_render_in_the_pool_and_close_their_connections(self):
+        for rows in (3, 4, 5):
+            self.upload(make_csv(rows))
+        ids = ','.join(str(pk) for pk in Dataset.objects.filter(user=self.user).values_list('pk', flat=True))
+        reports._executor = None
+        self.addCleanup(setattr, reports, '_executor', None)
+        threads, closed = [], []
+
+        def render(dataset, file):
+            threads.append(threading.current_thread().name)
+            file.write(b'%PDF-1.4')
+
+        with mock.patch('equipments.reports.render_report', side_effect=render), \
+                mock.patch('equipments.reports.connections.close_all',
+                           side_effect=lambda: closed.append(threading.current_thread().name)):
+            response = self.client.get('/api/equipments/datasets/reports/bulk/', {'ids': ids})
+            self.assertEqual(len(zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))).namelist()), 3)
+        self.assertTrue(all(name.startswith('report') for name in threads))
+        self.assertEqual(sorted(closed), sorted(threads))
+        self.assertEqual(reports.get_report_executor()._max_workers, 2)
+
+
+@override_settings(EQUIPMENT_RETENTION_MAX_DATASETS=2, EQUIPMENT_RETENTION_MAX_AGE_DAYS=30)
+class RetentionTests(EquipmentTestCase):
+    def dataset(self, user, days_old):
+        dataset = Dataset.objects.create(user=user, filename=f'{days_old}.csv')
+        Dataset.objects.filter(pk=dataset.pk).update(uploaded_at=timezone.now() - timedelta(days=days_old))
+        return dataset.pk
+
+    def remaining(self, user):
+        return set(Dataset.objects.filter(user=user).values_list('pk', flat=True))
+
+    def test_default_policy_keeps_the_newest_within_max_age(self):
+        newest, second, third = self.dataset(self.user, 1), self.dataset(self.user, 2), self.dataset(self.user, 3)
+        self.assertEqual(set(retention.prune_datasets()), {third})
+        self.assertEqual(self.remaining(self.user), {newest, second})
+
+        old = self.dataset(self.user, 40)
+        Dataset.objects.filter(pk=second).delete()
+        self.assertEqual(retention.prune_datasets(), [old])
+
+    def test_per_user_policy_overrides_the_default(self):
+        unlimited = User.objects.create_user('bob', password='secret-pw-2')
+        RetentionPolicy.objects.create(user=unlimited, max_datasets=None, max_age_days=None)
+        strict = User.objects.create_user('carol', password='secret-pw-3')
+        RetentionPolicy.objects.create(user=strict, max_datasets=1, max_age_days=7)
+        created = {
+            user: {self.dataset(user, days) for days in (1, 2, 3, 40)}
+            for user in (self.user, unlimited, strict)
+        }
+        retention.prune_datasets()
+        self.assertEqual(len(self.remaining(self.user)), 2)
+        self.assertEqual(self.remaining(unlimited), created[unlimited])
+        self.assertEqual(len(self.remaining(strict)), 1)
+
+        # Pruning one user leaves everyone else alone
+        self.dataset(strict, 0)
+        self.dataset(self.user, 0)
+        self.assertEqual(len(retention.prune_datasets(user=strict)), 1)
+        self.assertEqual(len(self.remaining(self.user)), 3)
+
+    def test_prune_datasets_command(self):
+        for days in (1, 2, 3, 40):
+            self.dataset(self.user, days)
+        out = io.StringIO()
+        call_command('prune_datasets', '--dry-run', stdout=out)
+        self.assertIn('2 dataset(s) would be deleted', out.getvalue())
+        self.assertEqual(len(self.remaining(self.user)), 4)
+
+        out = io.StringIO()
+        call_command('prune_datasets', '--user', 'alice', stdout=out)
+        self.assertIn('Deleted 2 dataset(s)', out.getvalue())
+        self.assertEqual(len(self.remaining(self.user)), 2)
+        with self.assertRaises(CommandError):
+            call_command('prune_datasets', '--user', 'nobody')
+
+    def test_upload_prunes_the_uploaders_datasets(self):
+        for rows in (3, 4, 5):
+            self.upload(make_csv(rows))
+        totals = Dataset.objects.filter(user=self.user).values_list('total_count', flat=True)
+        self.assertEqual(sorted(totals), [4, 5])
+
+
+class ContentNegotiationTests(EquipmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload(make_csv(5))
+        self.dataset = Dataset.objects.get(user=self.user)
+
+    def negotiated(self, accept, path=''):
+        response = self.client.get(f'/api/equipments/datasets/{self.dataset.pk}/{path}', HTTP_ACCEPT=accept)
+        self.assertEqual(response.status_code, 200)
+        return response['Content-Type'].split(';')[0]
+
+    def test_columnar_preferred_over_json_fallback(self):
+        # The desktop client's Accept header
+        accept = f'{MEDIA_TYPE}, application/json;q=0.5'
+        self.assertEqual(self.negotiated(accept), MEDIA_TYPE)
+        self.assertEqual(self.negotiated(accept, 'equipment/'), MEDIA_TYPE)
+        self.assertEqual(self.negotiated(f'application/json;q=0.5, {MEDIA_TYPE}'), MEDIA_TYPE)
+
+    def test_json_when_preferred_or_unspecified(self):
+        self.assertEqual(self.negotiated(f'application/json, {MEDIA_TYPE};q=0.5'), 'application/json')
+        self.assertEqual(self.negotiated('application/json'), 'application/json')
+        self.assertEqual(self.negotiated('*/*'), 'application/json')
+        self.assertEqual(self.negotiated(f'{MEDIA_TYPE};q=0, */*'), 'application/json')
+
+    def test_columnar_payload_header(self):
+        payload = self.client.get(f'/api/equipments/datasets/{self.dataset.pk}/', HTTP_ACCEPT=MEDIA_TYPE).content
+        self.assertEqual(payload[:8], b'CHEMVIZC')
+        (length,) = struct.unpack_from('<I', payload, 8)
+        header = json.loads(payload[12:12 + length].rstrip(b'\0'))
+        self.assertEqual(header['rows'], 5)
+        self.assertEqual(header['metadata']['total_count'], 5)
+
+
+class IngestJobTests(EquipmentTestCase):
+    def test_retention_failure_does_not_fail_the_job(self):
+        with mock.patch('equipments.jobs.prune_datasets', side_effect=RuntimeError('disk full')), \
+                self.assertLogs('equipments.jobs', level='ERROR') as logs:
+            job = self.upload(make_csv(3))
+        self.assertEqual(job['state'], 'succeeded')
+        self.assertEqual(job['rows_processed'], 3)
+        self.assertIn('disk full', '\n'.join(logs.output))
+        self.assertTrue(Dataset.objects.filter(pk=job['dataset']).exists())
+
+    def test_success_records_rows_and_aggregates(self):
+        job = self.upload(make_csv(6))
+        self.assertEqual(job['state'], 'succeeded')
+        self.assertEqual(job['rows_processed'], 6)
+        self.assertFalse(job['deduplicated'])
+        dataset = Dataset.objects.get(pk=job['dataset'])
+        self.assertEqual(dataset.total_count, 6)
+        self.assertEqual(dataset.equipment.count(), 6)
+        self.assertAlmostEqual(dataset.avg_flowrate, 102.5)
+        self.assertEqual(dataset.equipment_distribution, {'Pump': 2, 'Valve': 2, 'Reactor': 2})
+        self.assertFalse(IngestJob.objects.get(pk=job['id']).file)
+
+    def test_parse_failure_fails_the_job_and_stores_nothing(self):
+        data = CSV_HEADER + 'Pump-1,Pump,100,1.0,50\nPump-2,Pump,not-a-number,1.0,50\n'
+        job = self.upload(data.encode('utf-8'))
+        self.assertEqual(job['state'], 'failed')
+        self.assertIn('line 3', job['error'])
+        self.assertIsNone(job['dataset'])
+        self.assertFalse(Dataset.objects.filter(user=self.user).exists())
+
+    def test_identical_upload_reuses_the_dataset(self):
+        first = self.upload(make_csv(4))
+        # CRLF line endings do not change the content
+        second = self.upload(make_csv(4).replace(b'\n', b'\r\n'), name='copy.csv')
+        self.assertEqual(second['state'], 'succeeded')
+        self.assertTrue(second['deduplicated'])
+        self.assertEqual(second['dataset'], first['dataset'])
+        self.assertEqual(Dataset.objects.filter(user=self.user).count(), 1)
+
+    def test_progress_is_visible_to_other_workers(self):
+        job = IngestJob.objects.create(user=self.user, filename='a.csv', state=IngestJob.RUNNING)
+        jobs._ProgressReporter(job.pk)(1234)
+        # A poll handled by another worker shares only the cache directory.
+        other_worker = FileBasedCache(f'{self.media_root}/cache', {})
+        self.assertEqual(other_worker.get(f'equipments:progress:{job.pk}')[0], 1234)
+        self.assertEqual(self.client.get(f'/api/equipments/datasets/jobs/{job.pk}/').data['rows_processed'], 1234)
+
+    @override_settings(EQUIPMENT_INGEST_STALE_SECONDS=60)
+    def test_jobs_without_progress_are_failed_when_polled(self):
+        long_ago = timezone.now() - timedelta(minutes=5)
+        stale = IngestJob.objects.create(user=self.user, filename='a.csv', state=IngestJob.RUNNING)
+        alive = IngestJob.objects.create(user=self.user, filename='b.csv', state=IngestJob.RUNNING)
+        queued = IngestJob.objects.create(user=self.user, filename='c.csv')
+        IngestJob.objects.update(created_at=long_ago, started_at=long_ago)
+        jobs._ProgressReporter(alive.pk)(10)
+
+        response = self.client.get(f'/api/equipments/datasets/jobs/{stale.pk}/')
+        self.assertEqual(response.data['state'], 'failed')
+        self.assertEqual(response.data['error'], jobs.STALE_JOB_ERROR)
+        self.assertEqual(self.client.get(f'/api/equipments/datasets/jobs/{alive.pk}/').data['state'], 'running')
+
+        self.assertEqual(jobs.fail_stale_jobs(), 1)
+        # A worker that picks up a job the sweep gave up on leaves it failed.
+        self.assertEqual(jobs.run_ingest_job(queued.pk).state, IngestJob.FAILED)
+
+
+class QueryPlanTests(EquipmentTestCase):
+    def check_query_plans(self, **options):
+        out = io.StringIO()
+        call_command('check_query_plans', stdout=out, **options)
+        return out.getvalue()
+
+    def test_read_endpoints_use_indexes(self):
+        # Few other users used to make a full scan the cheaper equipment list plan.
+        for options in ({'rows': 2000, 'datasets': 5, 'other_users': 5},
+                        {'rows': 200, 'datasets': 2, 'other_users': 0}):
+            with self.subTest(**options):
+                output = self.check_query_plans(**options)
+                self.assertNotIn('FAIL', output)
+                self.assertIn('equipment list', output)
@@ -0,0 +1,151 @@
+"""
+Chunked, resumable uploads.
+
+A client creates an UploadSession with the file's name and size, then PUTs
+the file as numbered chunks of the session's chunk_size, in order. Each
+chunk is written at its offset in a partial file under MEDIA_ROOT and then
+acknowledged by advancing the session's received count, so after a dropped
+connection the client reads the session and resumes from there. Completing
+the session moves the file into place as an IngestJob's upload.
+"""
+import hashlib
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .jobs import enqueue_ingest
+from .models import IngestJob, UploadSession
+
+
+COPY_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Raised when a chunk or completion request does not fit the upload"""
+    status = 400
+
+
+class UploadConflict(UploadError):
+    """Raised when a chunk is not the next one the upload expects"""
+    status = 409
+
+
+def partial_path(upload):
+    return Path(settings.MEDIA_ROOT) / 'uploads' / 'partial' / str(upload.pk)
+
+
+def create_upload(user, filename, size, **fields):
+    """Start a chunked upload of size bytes; fields are passed on to its IngestJob"""
+    prune_uploads(user)
+    upload = UploadSession.objects.create(
+        user=user, filename=filename, size=size, chunk_size=settings.EQUIPMENT_UPLOAD_CHUNK_SIZE, **fields
+    )
+    path = partial_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    return upload
+
+
+def chunk_length(upload, index):
+    """The size chunk index must have: chunk_size, except for the last one"""
+    return max(min(upload.chunk_size, upload.size - index * upload.chunk_size), 0)
+
+
+def store_chunk(upload, index, stream, length, sha256=None):
+    """
+    Write chunk index, read from stream, and return the refreshed upload.
+
+    A chunk that was already acknowledged (a client retrying after a lost
+    response) is accepted without being written again. No lock is held
+    while the body is read: the chunk is written at its offset and then
+    acknowledged with a conditional update, so a concurrent duplicate of the
+    same chunk cannot advance the upload twice.
+    """
+    if upload.job_id:
+        raise UploadConflict('Upload is already complete')
+    next_index = upload.received // upload.chunk_size
+    if index < next_index:
+        return upload
+    if index > next_index:
+        raise UploadConflict(f'Expected chunk {next_index}')
+    expected = chunk_length(upload, index)
+    if expected == 0:
+        raise UploadError('Chunk is past the end of the file')
+    if length != expected:
+        raise UploadError(f'Chunk {index} must be {expected} bytes, got {length}')
+
+    digest = hashlib.sha256()
+    written = 0
+    with open(partial_path(upload), 'r+b') as f:
+        f.seek(upload.received)
+        while written < expected:
+            block = stream.read(min(COPY_BLOCK_SIZE, expected - written))
+            if not block:
+                break
+            f.write(block)
+            digest.update(block)
+            written += len(block)
+    if written != expected:
+        raise UploadError(f'Chunk {index} ended after {written} of {expected} bytes')
+    if sha256 and sha256.lower() != digest.hexdigest():
+        raise UploadError(f'Chunk {index} does not match its SHA-256')
+
+    UploadSession.objects.filter(pk=upload.pk, received=upload.received, job__isnull=True).update(
+        received=upload.received + written, updated_at=timezone.now()
+    )
+    upload.refresh_from_db()
+    return upload
+
+
+def complete_upload(upload):
+    """
+    Hand a fully received upload to the ingestion pipeline and return its
+    IngestJob. Completing an upload twice returns the same job.
+    """
+    with transaction.atomic():
+        upload = UploadSession.objects.select_for_update().get(pk=upload.pk)
+        if upload.job_id:
+            return upload.job
+        if upload.received != upload.size:
+            raise UploadError(f'Upload is incomplete: {upload.received} of {upload.size} bytes received')
+
+        name = default_storage.get_available_name(f'uploads/{get_valid_filename(upload.filename)}')
+        job = IngestJob.objects.create(
+            user=upload.user,
+            filename=upload.filename,
+            append=upload.append,
+            dataset=upload.dataset,
+            tolerant=upload.tolerant,
+            content_encoding=upload.content_encoding,
+        )
+        os.replace(partial_path(upload), default_storage.path(name))
+        job.file.name = name
+        job.save(update_fields=['file'])
+        upload.job = job
+        upload.save(update_fields=['job', 'updated_at'])
+        enqueue_ingest(job)
+    return job
+
+
+def delete_upload(upload):
+    partial_path(upload).unlink(missing_ok=True)
+    upload.delete()
+
+
+def prune_uploads(user=None):
+    """Delete uploads untouched for EQUIPMENT_UPLOAD_EXPIRY_HOURS; return how many"""
+    cutoff = timezone.now() - timedelta(hours=settings.EQUIPMENT_UPLOAD_EXPIRY_HOURS)
+    stale = UploadSession.objects.filter(updated_at__lt=cutoff)
+    if user is not None:
+        stale = stale.filter(user=user)
+    count = 0
+    for upload in stale:
+        delete_upload(upload)
+        count += 1
+    return count
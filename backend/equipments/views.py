@@ -3,161 +3,362 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from django.http import HttpResponse
-from django.utils.timezone import localtime
-from .models import Dataset, Equipment
-from .serializers import DatasetSerializer, EquipmentSerializer
-import pandas as pd
-
-
-def _escape_pdf_text(text: str) -> str:
-    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
-
-
-def _build_simple_pdf(lines):
-    content_lines = ["BT", "/F1 12 Tf", "72 720 Td"]
-    for idx, line in enumerate(lines):
-        if idx > 0:
-            content_lines.append("0 -16 Td")
-        content_lines.append(f"({_escape_pdf_text(line)}) Tj")
-    content_lines.append("ET")
-    content = "\n".join(content_lines).encode("latin-1", "replace")
-
-    objects = [
-        b"<< /Type /Catalog /Pages 2 0 R >>",
-        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
-        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
-        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
-        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
-    ]
-
-    pdf = bytearray()
-    pdf.extend(b"%PDF-1.4\n%\xE2\xE3\xCF\xD3\n")
-
-    offsets = [0]
-    for i, obj in enumerate(objects, start=1):
-        offsets.append(len(pdf))
-        pdf.extend(f"{i} 0 obj\n".encode("latin-1"))
-        pdf.extend(obj)
-        pdf.extend(b"\nendobj\n")
-
-    xref_start = len(pdf)
-    pdf.extend(f"xref\n0 {len(offsets)}\n".encode("latin-1"))
-    pdf.extend(b"0000000000 65535 f \n")
-    for off in offsets[1:]:
-        pdf.extend(f"{off:010d} 00000 n \n".encode("latin-1"))
-    pdf.extend(
-        f"trailer\n<< /Size {len(offsets)} /Root 1 0 R >>\nstartxref\n{xref_start}\n%%EOF".encode("latin-1")
-    )
-    return bytes(pdf)
+from rest_framework.parsers import FileUploadParser, FormParser, MultiPartParser
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from .models import Dataset, Equipment, IngestJob, UploadSession
+from .serializers import (
+    DatasetSerializer, DatasetDetailSerializer, EquipmentSerializer, IngestJobSerializer, QuarantinedRowSerializer,
+    UploadSessionSerializer,
+)
+from .jobs import enqueue_ingest, fail_stale_jobs
+from .readers import CONTENT_ENCODINGS, SUPPORTED_SUFFIXES, content_encoding, reader_for
+from .pagination import (
+    EQUIPMENT_FIELDS, EquipmentCursorPagination, QuarantineCursorPagination, filter_equipment, int_param, parse_fields,
+)
+from .charts import DOWNSAMPLE_METHODS, chart_data
+from .stats import type_stats
+from .compare import GROUPS, MAX_NAME_PAGE_SIZE, NAME_PAGE_SIZE, compare_datasets
+from .columnar import ColumnarData, ColumnarRenderer, QualityContentNegotiation, equipment_frame, records_frame
+from .response_cache import cached_response, dataset_scope, history_scope, invalidate
+from .reports import BULK_REPORT_LIMIT, delete_reports, get_report, stream_reports_zip
+from .downloads import file_response
+from .exports import EXPORT_FORMATS, EXPORT_RENDERERS, export_rows
+from .uploads import UploadError, complete_upload, create_upload, delete_upload, store_chunk
+
+
+def _flag(value):
+    return str(value or '').lower() in ('true', '1', 'yes')
+
+
+def _unsupported_upload(filename, encoding):
+    """An error response if no reader handles this file name and Content-Encoding, else None"""
+    if encoding is None:
+        return Response(
+            {'error': f'Unsupported Content-Encoding. Allowed: {", ".join(CONTENT_ENCODINGS)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if reader_for(filename, encoding) is None:
+        return Response(
+            {'error': f'Unsupported file type. Allowed: {", ".join(SUPPORTED_SUFFIXES)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return None
 
 
 class DatasetViewSet(ModelViewSet):
     serializer_class = DatasetSerializer
     permission_classes = [IsAuthenticated]
+    content_negotiation_class = QualityContentNegotiation
     
     def get_queryset(self):
         return Dataset.objects.filter(user=self.request.user).order_by('-uploaded_at')
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return DatasetDetailSerializer
+        return DatasetSerializer
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.action in ('retrieve', 'equipment'):
+            renderers.append(ColumnarRenderer())
+        if self.action == 'export':
+            renderers.extend(renderer() for renderer in EXPORT_RENDERERS)
+        return renderers
+
+    def _wants_columnar(self, request):
+        return request.accepted_renderer.format == ColumnarRenderer.format
+
+    def _cached(self, request, scope, build):
+        """Serve build()'s response through the response cache for this user"""
+        finalize = lambda response: self.finalize_response(request, response)
+        return cached_response(request, self.action, request.user.pk, scope, build, finalize)
+
+    def retrieve(self, request, *args, **kwargs):
+        def build():
+            if not self._wants_columnar(request):
+                return super(DatasetViewSet, self).retrieve(request, *args, **kwargs)
+            dataset = self.get_object()
+            frame = equipment_frame(dataset.equipment.order_by('id'))
+            return Response(ColumnarData(frame, DatasetSerializer(dataset).data))
+        return self._cached(request, dataset_scope(kwargs['pk']), build)
     
     def perform_create(self, serializer):
         """Set the user when creating a dataset"""
         serializer.save(user=self.request.user)
+        invalidate(user_ids=[self.request.user.pk])
+
+    def perform_update(self, serializer):
+        dataset = serializer.save()
+        invalidate(user_ids=[dataset.user_id], dataset_ids=[dataset.pk])
+
+    def perform_destroy(self, instance):
+        invalidate(user_ids=[instance.user_id], dataset_ids=[instance.pk])
+        delete_reports([instance.pk])
+        instance.delete()
     
-    @action(detail=False, methods=['post'])
-    def upload(self, request):
-        """Upload a CSV file with equipment data"""
+    def _start_ingest(self, request, **job_fields):
         if 'file' not in request.FILES:
             return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
         
         file = request.FILES['file']
-        if not file.name.endswith('.csv'):
-            return Response({'error': 'Only CSV files allowed'}, status=status.HTTP_400_BAD_REQUEST)
+        # A raw body may be compressed as a whole; it is stored as sent.
+        encoding = content_encoding(request.headers.get('Content-Encoding'))
+        error = _unsupported_upload(file.name, encoding)
+        if error:
+            return error
         
+        tolerant = request.data.get('tolerant') or request.query_params.get('tolerant')
+        job = IngestJob.objects.create(
+            user=request.user, filename=file.name, file=file, content_encoding=encoding, tolerant=_flag(tolerant),
+            **job_fields
+        )
+        enqueue_ingest(job)
+        job.refresh_from_db()
+        return Response(IngestJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser, FileUploadParser])
+    def upload(self, request):
+        """
+        Accept a CSV, compressed CSV, Parquet or XLSX file and ingest it in
+        the background, returning the job. With tolerant=true invalid rows are
+        set aside (see rejected_rows) instead of failing the upload.
+
+        The file is a multipart "file" field, or the raw body named by
+        Content-Disposition, which may be sent with Content-Encoding: gzip
+        or zstd.
+        """
+        return self._start_ingest(request)
+
+    @action(detail=True, methods=['post'], parser_classes=[MultiPartParser, FormParser, FileUploadParser])
+    def append(self, request, pk=None):
+        """Append the rows of an uploaded file to this dataset in the background, returning the job"""
+        dataset = self.get_object()
+        return self._start_ingest(request, dataset=dataset, append=True)
+
+    @action(detail=False, methods=['post'])
+    def uploads(self, request):
+        """
+        Start a chunked upload of {"filename", "size"}, optionally with
+        "tolerant", "dataset" (to append to it) and "content_encoding" (when
+        the bytes sent are the file compressed with gzip or zstd; size is
+        then the compressed size). The response gives the chunk_size to PUT
+        the file in, to uploads/<id>/chunks/<n>/.
+        """
+        filename = str(request.data.get('filename') or '')
+        encoding = content_encoding(request.data.get('content_encoding'))
+        error = _unsupported_upload(filename, encoding)
+        if error:
+            return error
         try:
-            df = pd.read_csv(file)
-            required_columns = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
-            
-            if not all(col in df.columns for col in required_columns):
-                return Response(
-                    {'error': f'Missing required columns. Expected: {", ".join(required_columns)}'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            total_count = len(df)
-            avg_flowrate = float(df['Flowrate'].mean())
-            avg_pressure = float(df['Pressure'].mean())
-            avg_temperature = float(df['Temperature'].mean())
-            equipment_distribution = df['Type'].value_counts().to_dict()
-            
-            dataset = Dataset.objects.create(
-                user=request.user,
-                filename=file.name,
-                total_count=total_count,
-                avg_flowrate=avg_flowrate,
-                avg_pressure=avg_pressure,
-                avg_temperature=avg_temperature,
-                equipment_distribution=equipment_distribution
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            return Response({'error': 'size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        max_size = settings.EQUIPMENT_UPLOAD_MAX_SIZE
+        if size < 0 or (max_size and size > max_size):
+            return Response(
+                {'error': f'size must be between 0 and {max_size or "unlimited"} bytes'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            equipment_records = []
-            for _, row in df.iterrows():
-                equipment_records.append(Equipment(
-                    dataset=dataset,
-                    equipment_name=row['Equipment Name'],
-                    equipment_type=row['Type'],
-                    flowrate=float(row['Flowrate']),
-                    pressure=float(row['Pressure']),
-                    temperature=float(row['Temperature'])
-                ))
-            
-            Equipment.objects.bulk_create(equipment_records)
-            
-            # Keep only last 5 datasets
-            user_datasets = Dataset.objects.filter(user=request.user).order_by('-uploaded_at')
-            if user_datasets.count() > 5:
-                for ds in user_datasets[5:]:
-                    ds.delete()
-            
-            return Response(DatasetSerializer(dataset).data, status=status.HTTP_201_CREATED)
-            
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        fields = {'tolerant': _flag(request.data.get('tolerant')), 'content_encoding': encoding}
+        if request.data.get('dataset'):
+            fields['dataset'] = get_object_or_404(self.get_queryset(), pk=request.data['dataset'])
+            fields['append'] = True
+        upload = create_upload(request.user, filename, size, **fields)
+        return Response(UploadSessionSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get', 'delete'], url_path=r'uploads/(?P<upload_id>[0-9]+)')
+    def upload_session(self, request, upload_id=None):
+        """Report a chunked upload's progress (the offset to resume from), or abandon it"""
+        upload = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+        if request.method == 'DELETE':
+            delete_upload(upload)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(UploadSessionSerializer(upload).data)
+
+    @action(detail=False, methods=['put'], url_path=r'uploads/(?P<upload_id>[0-9]+)/chunks/(?P<index>[0-9]+)')
+    def upload_chunk(self, request, upload_id=None, index=None):
+        """
+        Store chunk <index> of a chunked upload from the raw request body.
+        An X-Chunk-SHA256 header, if sent, is checked against the body.
+        """
+        upload = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        try:
+            upload = store_chunk(
+                upload, int(index), request.stream, length, sha256=request.headers.get('X-Chunk-SHA256')
+            )
+        except UploadError as e:
+            return Response({'error': str(e), **UploadSessionSerializer(upload).data}, status=e.status)
+        return Response(UploadSessionSerializer(upload).data)
+
+    @action(detail=False, methods=['post'], url_path=r'uploads/(?P<upload_id>[0-9]+)/complete')
+    def upload_complete(self, request, upload_id=None):
+        """Ingest a fully received chunked upload in the background, returning the job"""
+        upload = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+        try:
+            job = complete_upload(upload)
+        except UploadError as e:
+            return Response({'error': str(e), **UploadSessionSerializer(upload).data}, status=e.status)
+        job.refresh_from_db()
+        return Response(IngestJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>[0-9]+)')
+    def jobs(self, request, job_id=None):
+        """Report the state, progress and throughput of an upload job"""
+        job = get_object_or_404(IngestJob, pk=job_id, user=request.user)
+        if not job.is_finished and fail_stale_jobs(IngestJob.objects.filter(pk=job.pk)):
+            job.refresh_from_db()
+        return Response(IngestJobSerializer(job).data)
+
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>[0-9]+)/rejected')
+    def rejected_rows(self, request, job_id=None):
+        """Page through the rows a tolerant upload set aside, with their line numbers and errors"""
+        job = get_object_or_404(IngestJob, pk=job_id, user=request.user)
+        paginator = QuarantineCursorPagination()
+        page = paginator.paginate_queryset(job.quarantined_rows.all(), request, view=self)
+        return paginator.get_paginated_response(QuarantinedRowSerializer(page, many=True).data)
     
+    @action(detail=False, methods=['get'])
+    def compare(self, request):
+        """
+        Compare datasets given as ?ids=1,2,3 (in that order), grouped by
+        equipment type, or by ?group=type,name or ?group=name. Names come a
+        page of ?limit= at a time; pass by_name_after back as ?after= for the next.
+        """
+        params = request.query_params
+        groups = [group for group in params.get('group', '').split(',') if group]
+        if any(group not in GROUPS for group in groups):
+            return Response({'error': f'group must be one of: {", ".join(GROUPS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = int_param(params, 'limit', NAME_PAGE_SIZE, 1, MAX_NAME_PAGE_SIZE)
+        datasets = self._requested_datasets(request, 2, 10)
+        if isinstance(datasets, Response):
+            return datasets
+        return Response(compare_datasets(datasets, groups, after=params.get('after'), limit=limit))
+
+    @action(detail=False, methods=['get'], url_path='reports/bulk')
+    def bulk_reports(self, request):
+        """Stream the PDF reports of ?ids=1,2,3 as a ZIP archive, rendered in parallel"""
+        datasets = self._requested_datasets(request, 1, BULK_REPORT_LIMIT)
+        if isinstance(datasets, Response):
+            return datasets
+        response = StreamingHttpResponse(stream_reports_zip(datasets), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="equipment-reports.zip"'
+        return response
+
+    def _requested_datasets(self, request, minimum, maximum):
+        """
+        The user's datasets named by ?ids= in that order, or an error
+        Response if the list is malformed, out of bounds or not all found.
+        """
+        try:
+            ids = [int(pk) for pk in request.query_params.get('ids', '').split(',') if pk]
+        except ValueError:
+            return Response({'error': 'ids must be a comma separated list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not minimum <= len(set(ids)) <= maximum or len(set(ids)) != len(ids):
+            return Response(
+                {'error': f'Provide between {minimum} and {maximum} distinct dataset ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        datasets = self.get_queryset().in_bulk(ids)
+        if len(datasets) != len(ids):
+            return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+        return [datasets[pk] for pk in ids]
+
     @action(detail=False, methods=['get'])
     def history(self, request):
         """Get upload history for the current user (last 5)"""
-        datasets = self.get_queryset()[:5]
-        serializer = self.get_serializer(datasets, many=True)
-        return Response(serializer.data)
+        def build():
+            datasets = self.get_queryset()[:5]
+            serializer = self.get_serializer(datasets, many=True)
+            return Response(serializer.data)
+        return self._cached(request, history_scope(request.user.pk), build)
 
     @action(detail=True, methods=['get'])
-    def generate_report(self, request, pk=None):
-        """Generate a simple PDF report for the dataset"""
+    def equipment(self, request, pk=None):
+        """
+        Page through a dataset's equipment rows.
+
+        Supports ?fields= projection, ?ordering=, ?type= and
+        ?<flowrate|pressure|temperature>_<min|max>= filters.
+        """
+        dataset = self.get_object()
+        fields = parse_fields(request.query_params)
+        queryset = filter_equipment(dataset.equipment.all(), request.query_params)
+
+        # Fetch only the projected columns plus what the cursor needs.
+        paginator = EquipmentCursorPagination()
+        ordering = paginator.get_ordering(request, queryset, self)
+        columns = {'id', *(fields or EQUIPMENT_FIELDS), *(field.lstrip('-') for field in ordering)}
+        page = paginator.paginate_queryset(queryset.values(*columns), request, view=self)
+        if self._wants_columnar(request):
+            metadata = {'next': paginator.get_next_link(), 'previous': paginator.get_previous_link()}
+            return Response(ColumnarData(records_frame(page, fields), metadata))
+        serializer = EquipmentSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """
+        Stream every row of a dataset as ?format=csv (the default) or
+        ?format=ndjson. Supports the same ?fields= and filters as equipment.
+        """
         dataset = self.get_object()
-        uploaded_at = localtime(dataset.uploaded_at).strftime('%Y-%m-%d %H:%M:%S %Z')
-        distribution = dataset.equipment_distribution or {}
-        distribution_lines = [
-            f"{key}: {value}" for key, value in sorted(distribution.items(), key=lambda item: item[1], reverse=True)
-        ][:10]
-
-        lines = [
-            "Chemical Equipment Report",
-            f"Filename: {dataset.filename}",
-            f"Uploaded: {uploaded_at}",
-            f"Total Records: {dataset.total_count}",
-            f"Average Flowrate: {dataset.avg_flowrate:.2f}",
-            f"Average Pressure: {dataset.avg_pressure:.2f}",
-            f"Average Temperature: {dataset.avg_temperature:.2f}",
-            "Equipment Type Distribution (Top 10):",
-            *distribution_lines,
-        ]
-
-        pdf_bytes = _build_simple_pdf(lines)
-        filename = f"equipment-report-{dataset.id}.pdf"
-        response = HttpResponse(pdf_bytes, content_type="application/pdf")
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        export_format = request.accepted_renderer.format
+        if export_format not in EXPORT_FORMATS:
+            export_format = 'csv'
+        fields = parse_fields(request.query_params) or EQUIPMENT_FIELDS
+        queryset = filter_equipment(dataset.equipment.order_by('id'), request.query_params)
+
+        stream, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(stream(export_rows(queryset, fields), fields), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="equipment-{dataset.id}.{export_format}"'
         return response
 
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """Per-type count, mean, min, max, std and quartiles of each parameter"""
+        dataset = self.get_object()
+        stats = type_stats(dataset)
+        if request.query_params.get('type'):
+            types = request.query_params['type'].split(',')
+            stats = [entry for entry in stats if entry['equipment_type'] in types]
+        return Response(stats)
+
+    @action(detail=True, methods=['get'], url_path='chart-data')
+    def chart_data(self, request, pk=None):
+        """
+        Pre-aggregated chart series: per-type statistics, histograms with
+        ?bins= buckets and series downsampled to ?points= with ?method=lttb|minmax.
+        Each combination is built once per dataset contents and then cached.
+        """
+        params = request.query_params
+        method = params.get('method', 'lttb')
+        if method not in DOWNSAMPLE_METHODS:
+            return Response(
+                {'error': f'method must be one of: {", ".join(DOWNSAMPLE_METHODS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        bins = int_param(params, 'bins', 20, 1, 200)
+        points = int_param(params, 'points', 500, 3, 5000)
+
+        def build():
+            dataset = self.get_object()
+            return Response(chart_data(dataset, bins=bins, points=points, method=method))
+        return self._cached(request, dataset_scope(pk), build)
+
+    @action(detail=True, methods=['get'])
+    def generate_report(self, request, pk=None):
+        """Download the dataset's PDF report, rendering and storing it on first request"""
+        dataset = self.get_object()
+        path = get_report(dataset)
+        return file_response(
+            request, path, f"equipment-report-{dataset.id}.pdf", "application/pdf", etag=path.stem
+        )
+
 
 class EquipmentViewSet(ReadOnlyModelViewSet):
     serializer_class = EquipmentSerializer
@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=['jaraco.text', 'jaraco.context', 'jaraco.functools', 'platformdirs'],
+    hiddenimports=['jaraco.text', 'jaraco.context', 'jaraco.functools', 'platformdirs', 'brotli'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,191 @@
+"""
+Compare request latency of per-call connections with the pooled APIClient.
+
+Starts a local stand-in for the backend that serves a history-sized JSON
+payload (gzip-compressed when the client accepts it) and delays every new
+connection by --connect-delay milliseconds, standing in for the TCP and
+TLS handshakes to the remote backend. Then times --requests sequential
+calls made with module-level requests.get, as the client used to, and
+with APIClient's keep-alive session.
+
+It then sends a synthetic CSV of --upload-rows rows to the stand-in, which
+reads request bodies no faster than --link-mbps, as is and compressed the
+way upload_csv compresses it (compression time included).
+
+    python benchmark_client.py --requests 200 --connect-delay 60 --link-mbps 10
+"""
+import argparse
+import csv
+import gzip
+import importlib.util
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from main import APIClient, compress_file
+
+
+HISTORY = [
+    {
+        'id': i,
+        'filename': f'equipment-{i}.csv',
+        'uploaded_at': '2026-01-01T00:00:00Z',
+        'total_count': 100000,
+        'avg_flowrate': 120.5,
+        'avg_pressure': 6.25,
+        'avg_temperature': 105.0,
+        'equipment_distribution': {'Pump': 20000, 'Valve': 20000, 'Reactor': 20000, 'Compressor': 40000},
+    }
+    for i in range(5)
+]
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, connect_delay, link_bytes_per_second):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.connect_delay = connect_delay
+        self.link_bytes_per_second = link_bytes_per_second
+        self.connections = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.connections = 0
+            self.bytes_sent = 0
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, Nagle's
+    # algorithm and delayed ACKs add ~40ms to every keep-alive response.
+    disable_nagle_algorithm = True
+    payload = json.dumps(HISTORY).encode('utf-8')
+    compressed = gzip.compress(payload)
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        time.sleep(self.server.connect_delay)
+
+    def do_GET(self):
+        body = self.payload
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = self.compressed
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.bytes_sent += len(body)
+
+    def do_PUT(self):
+        # Read the body at the link's rate, as a slow uplink would deliver it.
+        remaining = int(self.headers.get('Content-Length', 0))
+        block_size = 16 * 1024
+        while remaining:
+            block = self.rfile.read(min(block_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            time.sleep(len(block) / self.server.link_bytes_per_second)
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def run(name, call, count, server):
+    server.reset()
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(
+        f"{name:>10} mean={statistics.mean(timings):7.2f}ms p50={timings[len(timings) // 2]:7.2f}ms "
+        f"p95={timings[int(len(timings) * 0.95) - 1]:7.2f}ms connections={server.connections:<5} "
+        f"body bytes={server.bytes_sent}"
+    )
+
+
+def write_csv(path, rows):
+    """Synthetic export in the upload format"""
+    types = ['Pump', 'Valve', 'Reactor', 'Compressor', 'Heat Exchanger']
+    rng = random.Random(0)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'])
+        for i in range(rows):
+            kind = types[i % len(types)]
+            writer.writerow([
+                f'{kind}-{i}', kind, round(rng.uniform(50, 250), 1), round(rng.uniform(1, 10), 1),
+                round(rng.uniform(60, 150), 1),
+            ])
+
+
+def upload(name, path, url, session, encoding=None):
+    started = time.perf_counter()
+    send_path = compress_file(path, encoding) if encoding else path
+    try:
+        with open(send_path, 'rb') as f:
+            session.put(url, data=f, headers={'Content-Encoding': encoding or 'identity'}).raise_for_status()
+        size = os.path.getsize(send_path)
+    finally:
+        if send_path != path:
+            os.remove(send_path)
+    elapsed = time.perf_counter() - started
+    print(f"{name:>10} sent={size / 1024 / 1024:7.2f}MB time={elapsed:7.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--connect-delay', type=float, default=60, help='Milliseconds per new connection')
+    parser.add_argument('--upload-rows', type=int, default=200000)
+    parser.add_argument('--link-mbps', type=float, default=10, help='Upload bandwidth in megabits per second')
+    args = parser.parse_args()
+
+    server = StandInServer(args.connect_delay / 1000, args.link_mbps * 1_000_000 / 8)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}/api'
+    url = f'{base_url}/equipments/datasets/history/'
+    client = APIClient(base_url)
+    client.set_token('benchmark')
+
+    try:
+        run('per-call', lambda: requests.get(url, headers={'Authorization': 'Bearer benchmark'}).json(),
+            args.requests, server)
+        run('pooled', client.get_history, args.requests, server)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'upload.csv')
+            write_csv(path, args.upload_rows)
+            upload_url = f'{base_url}/upload/'
+            upload('raw', path, upload_url, client.session)
+            upload('gzip', path, upload_url, client.session, 'gzip')
+            if importlib.util.find_spec('zstandard'):
+                upload('zstd', path, upload_url, client.session, 'zstd')
+            else:
+                print('zstandard is not installed; skipping zstd')
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -6,9 +6,20 @@ os.environ['QT_ASSUME_STDERR_HAS_CONSOLE'] = '0'
 
 import sys
 import json
+import gzip
+import hashlib
+import sqlite3
+import tempfile
+import struct
+import threading
+import time
 import warnings
 import logging
 import requests
+import numpy as np
+import platformdirs
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
 
 # Suppress Python warnings
 warnings.filterwarnings('ignore')
@@ -17,8 +28,9 @@ logging.getLogger('matplotlib').setLevel(logging.WARNING)
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                               QPushButton, QLabel, QLineEdit, QFileDialog, QTableWidget,
                               QTableWidgetItem, QTabWidget, QMessageBox, QTextEdit, QGroupBox,
-                              QFormLayout, QStackedWidget, QFrame, QButtonGroup, QSplitter)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+                              QFormLayout, QStackedWidget, QFrame, QButtonGroup, QSplitter,
+                              QProgressBar)
+from PyQt5.QtCore import Qt, QObject, QThread, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QFont, QColor, QPalette
 
 import matplotlib.pyplot as plt
@@ -37,9 +49,253 @@ def _patched_init(self, figure):
 FigureCanvas.__init__ = _patched_init
 
 
+COLUMNAR_MEDIA_TYPE = 'application/vnd.chemviz.columnar'
+EQUIPMENT_COLUMNS = ['equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature']
+# Above this many rows the parameter chart switches from one bar group per
+# row to server-side downsampled series.
+MAX_BAR_CHART_ROWS = 50
+CHART_POINTS = 400
+TRANSFER_CHUNK_SIZE = 64 * 1024
+# Seconds to wait for a connection, and between bytes of a response
+CONNECT_TIMEOUT = float(os.environ.get('CHEMVIZ_CONNECT_TIMEOUT', 10))
+READ_TIMEOUT = float(os.environ.get('CHEMVIZ_READ_TIMEOUT', 120))
+# Retries of idempotent requests on connection errors and 502/503/504
+MAX_RETRIES = int(os.environ.get('CHEMVIZ_MAX_RETRIES', 3))
+# Keep-alive connections per host; at least the number of concurrent workers
+POOL_SIZE = 8
+# Consecutive failed attempts at sending an upload chunk before giving up
+UPLOAD_ATTEMPTS = 5
+# CSV uploads are compressed before sending: gzip, zstd (needs the
+# zstandard package) or identity to send them as they are
+UPLOAD_ENCODING = os.environ.get('CHEMVIZ_UPLOAD_ENCODING', 'gzip').lower()
+# Datasets and history are kept on disk here, least recently used first out
+# above CACHE_MAX_MB (0 disables the cache)
+CACHE_DIR = os.environ.get('CHEMVIZ_CACHE_DIR') or platformdirs.user_cache_dir('ChemVizPro', appauthor=False)
+CACHE_MAX_MB = float(os.environ.get('CHEMVIZ_CACHE_MAX_MB', 512))
+
+
+def format_size(num_bytes):
+    for unit in ['B', 'KB', 'MB']:
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f} {unit}" if unit == 'B' else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GB"
+
+
+def decode_columnar(payload):
+    """
+    Decode the backend's columnar equipment payload.
+
+    Returns (header metadata, {column: array}). Numeric columns and the
+    equipment_type codes are NumPy views over ``payload`` (no copy);
+    equipment_type is exposed as a pandas Categorical over those codes.
+    See backend/equipments/columnar.py for the layout.
+    """
+    if payload[:8] != b'CHEMVIZC':
+        raise ValueError("Not a columnar payload")
+    (header_length,) = struct.unpack_from('<I', payload, 8)
+    header = json.loads(payload[12:12 + header_length].decode('utf-8'))
+    body = 12 + header_length
+    body += -body % 8
+    rows = header['rows']
+
+    columns = {}
+    for column in header['columns']:
+        buffers = column['buffers']
+        if column['type'] in ('int64', 'float64'):
+            dtype = '<i8' if column['type'] == 'int64' else '<f8'
+            columns[column['name']] = np.frombuffer(payload, dtype, count=rows, offset=body + buffers[0]['offset'])
+        elif column['type'] == 'dictionary':
+            codes = np.frombuffer(payload, '<i4', count=rows, offset=body + buffers[0]['offset'])
+            columns[column['name']] = pd.Categorical.from_codes(codes, categories=column['dictionary'])
+        else:
+            offsets = np.frombuffer(payload, '<i4', count=rows + 1, offset=body + buffers[0]['offset'])
+            data = payload[body + buffers[1]['offset']:body + buffers[1]['offset'] + buffers[1]['length']]
+            columns[column['name']] = [
+                data[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])
+            ]
+    return header['metadata'], columns
+
+
+class RequestCancelled(Exception):
+    """Raised by a long-running API call when its cancel event is set"""
+
+
+def _check_cancelled(cancel):
+    if cancel is not None and cancel.is_set():
+        raise RequestCancelled()
+
+
+class FileChunk:
+    """
+    length bytes of an open file from offset, read from disk as they are sent.
+
+    Each read reports the whole upload's progress to progress(sent, total)
+    and raises RequestCancelled once cancel is set.
+    """
+    def __init__(self, file, offset, length, total, progress=None, cancel=None):
+        self.file = file
+        self.offset = offset
+        self.length = length
+        self.total = total
+        self.sent = 0
+        self.progress = progress
+        self.cancel = cancel
+
+    def __len__(self):
+        return self.length
+
+    def sha256(self):
+        """Digest of the chunk, read in blocks; leaves the file at the chunk's start"""
+        digest = hashlib.sha256()
+        self.file.seek(self.offset)
+        remaining = self.length
+        while remaining:
+            block = self.file.read(min(TRANSFER_CHUNK_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+        self.file.seek(self.offset)
+        return digest.hexdigest()
+
+    def read(self, size=-1):
+        _check_cancelled(self.cancel)
+        remaining = self.length - self.sent
+        size = remaining if size is None or size < 0 else min(size, remaining)
+        data = self.file.read(size)
+        self.sent += len(data)
+        if self.progress:
+            self.progress(self.offset + self.sent, self.total)
+        return data
+
+
+def compress_file(file_path, encoding, cancel=None):
+    """
+    Compress file_path with gzip or zstd into a temporary file and return
+    its path. The file is read and written in blocks, not held in memory.
+    """
+    if encoding == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception('zstd-compressed uploads need the zstandard package installed')
+        open_compressed = lambda f: zstandard.ZstdCompressor().stream_writer(f)
+    else:
+        open_compressed = lambda f: gzip.GzipFile(fileobj=f, mode='wb', compresslevel=6, mtime=0)
+    suffix = '.zst' if encoding == 'zstd' else '.gz'
+    fd, path = tempfile.mkstemp(prefix='chemviz-upload-', suffix=suffix)
+    try:
+        with open(file_path, 'rb') as src, os.fdopen(fd, 'wb') as dst, open_compressed(dst) as out:
+            while block := src.read(TRANSFER_CHUNK_SIZE * 16):
+                _check_cancelled(cancel)
+                out.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def create_session(max_retries=MAX_RETRIES, pool_size=POOL_SIZE):
+    """
+    A requests session that keeps connections alive between calls.
+
+    GET and HEAD requests are retried with exponential backoff on
+    connection errors and 502/503/504, honouring Retry-After; uploads and
+    other POSTs are never retried. Responses may be gzip, deflate or,
+    when the brotli package is installed, brotli compressed.
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = make_headers(accept_encoding=True)['accept-encoding']
+    return session
+
+
+class ResponseCache:
+    """
+    API response bodies in a SQLite file, with the ETag they were sent with.
+
+    Entries are evicted least recently used first once their bodies add up
+    to more than max_bytes. Safe to share between worker threads.
+    """
+    def __init__(self, path, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, etag TEXT NOT NULL, content_type TEXT NOT NULL, body BLOB NOT NULL, "
+            "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    @classmethod
+    def open_default(cls):
+        """The cache under CACHE_DIR, or None if it is disabled or cannot be opened"""
+        if CACHE_MAX_MB <= 0:
+            return None
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            return cls(os.path.join(CACHE_DIR, 'responses.sqlite3'), int(CACHE_MAX_MB * 1024 * 1024))
+        except (OSError, sqlite3.Error):
+            logging.getLogger(__name__).warning("Response cache unavailable at %s", CACHE_DIR, exc_info=True)
+            return None
+
+    def get(self, key):
+        """(etag, content_type, body) stored under key, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, content_type, body FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+        return row
+
+    def put(self, key, etag, content_type, body):
+        if len(body) > self.max_bytes:
+            self.delete(key)
+            return
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, etag, content_type, body, size, accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, etag, content_type, body, len(body), time.time())
+                )
+                self._evict()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
 class APIClient:
     """Handle API communication"""
-    def __init__(self, base_url=None):
+    def __init__(self, base_url=None, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), session=None, cache=None):
         # Use environment variable or default to localhost
         if base_url:
             self.base_url = base_url
@@ -48,72 +304,412 @@ class APIClient:
             # Default to the Render backend URL; override as needed.
             self.base_url = os.environ.get('CHEMVIZ_API_URL', 'https://chemical-equipment-visualizer-t6zk.onrender.com/api')
         self.token = None
-        self.headers = {"Content-Type": "application/json"}
-    
+        self.timeout = timeout
+        # One pooled session for every call, shared by the worker threads.
+        self.session = session or create_session()
+        # Unfinished chunked uploads by (path, size, mtime), to resume on retry:
+        # the upload id and the file being sent, which may be a compressed copy
+        self._uploads = {}
+        # Datasets and history of the signed-in user, kept between sessions
+        self.cache = cache or ResponseCache.open_default()
+        self.user_id = None
+        # True when the last cached GET was answered from the cache because
+        # the backend could not be reached
+        self.offline = False
+
     def set_token(self, token):
         self.token = token
-        self.headers["Authorization"] = f"Bearer {token}"
+        self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def _signed_in(self, data):
+        self.set_token(data['token'])
+        self.user_id = data['user']['id']
+        return data
+
+    def _get(self, path, **kwargs):
+        return self.session.get(f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+
+    def _post(self, path, **kwargs):
+        return self.session.post(f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+
+    def _cached_get(self, path, headers=None, **kwargs):
+        """
+        GET path through the response cache; return (status, content type, body).
+
+        A cached copy is revalidated with If-None-Match, so an unchanged
+        body is not downloaded again, and is used as is when the backend
+        cannot be reached (self.offline is then True).
+        """
+        key = f"{self.base_url}|{self.user_id}|{path}" if self.cache and self.user_id else None
+        cached = self.cache.get(key) if key else None
+        headers = dict(headers or {})
+        if cached:
+            headers["If-None-Match"] = cached[0]
+        try:
+            response = self._get(path, headers=headers, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if cached is None:
+                raise
+            response = None
+        if cached and (response is None or response.status_code in (502, 503, 504)):
+            self.offline = True
+            return 200, cached[1], cached[2]
+        self.offline = False
+        if cached and response.status_code == 304:
+            return 200, cached[1], cached[2]
+        content_type = response.headers.get('Content-Type', '')
+        if key and response.status_code == 200 and 'ETag' in response.headers:
+            self.cache.put(key, response.headers['ETag'], content_type, response.content)
+        elif key and response.status_code == 404:
+            self.cache.delete(key)
+        return response.status_code, content_type, response.content
     
     def login(self, username, password):
-        response = requests.post(
-            f"{self.base_url}/accounts/auth/login/",
+        response = self._post(
+            "/accounts/auth/login/",
             json={"username": username, "password": password}
         )
         if response.status_code == 200:
-            data = response.json()
-            self.set_token(data['token'])
-            return data
+            return self._signed_in(response.json())
         raise Exception(response.json().get('error', 'Login failed'))
     
     def register(self, username, email, password):
-        response = requests.post(
-            f"{self.base_url}/accounts/auth/register/",
+        response = self._post(
+            "/accounts/auth/register/",
             json={"username": username, "email": email, "password": password}
         )
         if response.status_code == 201:
-            data = response.json()
-            self.set_token(data['token'])
-            return data
+            return self._signed_in(response.json())
         raise Exception(response.json().get('error', 'Registration failed'))
     
-    def upload_csv(self, file_path):
-        with open(file_path, 'rb') as f:
-            files = {'file': f}
-            response = requests.post(
-                f"{self.base_url}/equipments/datasets/upload/",
-                files=files,
-                headers={"Authorization": f"Bearer {self.token}"}
+    def upload_csv(self, file_path, poll_interval=0.5, progress=None, cancel=None):
+        """
+        Upload a data file in chunks and wait for the backend to ingest it.
+
+        CSV files are compressed first (see UPLOAD_ENCODING) and sent with
+        their Content-Encoding, so progress(sent, total) counts compressed
+        bytes. Dropped connections resume from the last chunk the backend
+        acknowledged, as does calling this again for the same file after a
+        failure or cancel. Setting the cancel event stops the upload, or
+        stops waiting for the ingest job.
+        """
+        key = (os.path.abspath(file_path), os.path.getsize(file_path), os.stat(file_path).st_mtime_ns)
+        upload = self._resume_upload(key) or self._start_upload(key, file_path, cancel)
+        self._send_chunks(upload, self._uploads[key]['path'], progress, cancel)
+
+        response = self._post(f"/equipments/datasets/uploads/{upload['id']}/complete/")
+        if response.status_code != 202:
+            raise Exception(response.json().get('error', 'Upload failed'))
+        self._discard_upload(key)
+
+        # The backend ingests in the background; wait for the job to finish.
+        job = response.json()
+        while job['state'] not in ('succeeded', 'failed'):
+            _check_cancelled(cancel)
+            time.sleep(poll_interval)
+            job = self.get_upload_job(job['id'])
+        if job['state'] == 'failed':
+            raise Exception(job.get('error') or 'Upload failed')
+        return self.get_dataset(job['dataset'])
+
+    def _start_upload(self, key, file_path, cancel=None):
+        path, encoding, temp = file_path, '', False
+        if UPLOAD_ENCODING != 'identity' and file_path.lower().endswith('.csv'):
+            path, encoding, temp = compress_file(file_path, UPLOAD_ENCODING, cancel), UPLOAD_ENCODING, True
+        try:
+            response = self._post(
+                "/equipments/datasets/uploads/",
+                json={"filename": os.path.basename(file_path), "size": os.path.getsize(path), "content_encoding": encoding}
             )
-        if response.status_code == 201:
+            if response.status_code != 201:
+                raise Exception(response.json().get('error', 'Upload failed'))
+        except BaseException:
+            if temp:
+                os.remove(path)
+            raise
+        upload = response.json()
+        # temp marks a compressed copy this client made, and may delete
+        self._uploads[key] = {'id': upload['id'], 'path': path, 'temp': temp}
+        return upload
+
+    def _resume_upload(self, key):
+        """The backend's state of an earlier, unfinished upload of this file, if it still has it"""
+        pending = self._uploads.get(key)
+        if pending is None:
+            return None
+        response = self._get(f"/equipments/datasets/uploads/{pending['id']}/")
+        if response.status_code != 200 or not os.path.exists(pending['path']):
+            self._discard_upload(key)
+            return None
+        return response.json()
+
+    def discard_uploads(self):
+        """Forget unfinished uploads and delete their compressed copies"""
+        for key in list(self._uploads):
+            self._discard_upload(key)
+
+    def _discard_upload(self, key):
+        """Forget an upload, deleting its compressed copy if it has one"""
+        pending = self._uploads.pop(key, None)
+        if pending and pending['temp']:
+            try:
+                os.remove(pending['path'])
+            except OSError:
+                pass
+
+    def _send_chunks(self, upload, file_path, progress=None, cancel=None):
+        """PUT the file's chunks from the upload's acknowledged offset to the end"""
+        failures = 0
+        # Set after a failed request: the chunk may have arrived even though
+        # the response did not, so ask for the upload's state before resending.
+        resync = False
+        with open(file_path, 'rb') as f:
+            while resync or upload['next_chunk'] is not None:
+                _check_cancelled(cancel)
+                try:
+                    if resync:
+                        response = self._get(f"/equipments/datasets/uploads/{upload['id']}/")
+                    else:
+                        index = upload['next_chunk']
+                        offset = index * upload['chunk_size']
+                        chunk = FileChunk(
+                            f, offset, min(upload['chunk_size'], upload['size'] - offset), upload['size'],
+                            progress, cancel
+                        )
+                        response = self.session.put(
+                            f"{self.base_url}/equipments/datasets/uploads/{upload['id']}/chunks/{index}/",
+                            data=chunk,
+                            headers={"Content-Type": "application/octet-stream", "X-Chunk-SHA256": chunk.sha256()},
+                            timeout=self.timeout
+                        )
+                except requests.RequestException:
+                    # requests wraps errors raised while reading the body.
+                    # A failed status check uses up an attempt like a failed PUT.
+                    _check_cancelled(cancel)
+                    failures += 1
+                    if failures >= UPLOAD_ATTEMPTS:
+                        raise
+                    time.sleep(min(0.5 * 2 ** failures, 30))
+                    resync = True
+                    continue
+                if response.status_code not in (200, 409):
+                    raise Exception(response.json().get('error', 'Upload failed'))
+                # Each carries the upload's state; a 409 means another chunk was expected.
+                if not resync:
+                    failures = 0
+                resync = False
+                upload = response.json()
+
+    def get_upload_job(self, job_id):
+        response = self._get(f"/equipments/datasets/jobs/{job_id}/")
+        if response.status_code == 200:
             return response.json()
-        raise Exception(response.json().get('error', 'Upload failed'))
+        raise Exception("Failed to fetch upload status")
     
     def get_history(self):
-        response = requests.get(
-            f"{self.base_url}/equipments/datasets/history/",
-            headers=self.headers
-        )
-        if response.status_code == 200:
-            return response.json()
+        status, _, body = self._cached_get("/equipments/datasets/history/")
+        if status == 200:
+            return json.loads(body)
         raise Exception("Failed to fetch history")
     
     def get_dataset(self, dataset_id):
-        response = requests.get(
-            f"{self.base_url}/equipments/datasets/{dataset_id}/",
-            headers=self.headers
+        """Fetch a dataset summary with its equipment as a DataFrame, from the cache if unchanged"""
+        status, content_type, body = self._cached_get(
+            f"/equipments/datasets/{dataset_id}/",
+            headers={"Accept": f"{COLUMNAR_MEDIA_TYPE}, application/json;q=0.5"}
+        )
+        if status != 200:
+            raise Exception("Failed to fetch dataset")
+        if not content_type.startswith(COLUMNAR_MEDIA_TYPE):
+            dataset = json.loads(body)
+            dataset['equipment'] = pd.DataFrame(dataset.get('equipment') or [], columns=EQUIPMENT_COLUMNS)
+            return dataset
+        dataset, columns = decode_columnar(body)
+        dataset['equipment'] = pd.DataFrame(columns, columns=EQUIPMENT_COLUMNS)
+        return dataset
+
+    def get_chart_data(self, dataset_id, points=CHART_POINTS, bins=20):
+        response = self._get(
+            f"/equipments/datasets/{dataset_id}/chart-data/",
+            params={"points": points, "bins": bins}
         )
         if response.status_code == 200:
             return response.json()
-        raise Exception("Failed to fetch dataset")
+        raise Exception("Failed to fetch chart data")
+
+    def download_report(self, dataset_id, save_path, progress=None, cancel=None):
+        """Stream a dataset's PDF report to save_path"""
+        response = self._get(f"/equipments/datasets/{dataset_id}/generate_report/", stream=True)
+        if response.status_code != 200:
+            raise Exception("Failed to generate report")
+        self._save_stream(response, save_path, progress, cancel)
 
-    def generate_report(self, dataset_id):
-        response = requests.get(
-            f"{self.base_url}/equipments/datasets/{dataset_id}/generate_report/",
-            headers=self.headers
+    def download_reports(self, dataset_ids, save_path, progress=None, cancel=None):
+        """Stream the reports of several datasets into one ZIP file at save_path"""
+        response = self._get(
+            "/equipments/datasets/reports/bulk/",
+            params={"ids": ",".join(str(pk) for pk in dataset_ids)},
+            stream=True
         )
-        if response.status_code == 200:
-            return response.content
-        raise Exception("Failed to generate report")
+        if response.status_code != 200:
+            raise Exception(response.json().get('error', 'Failed to download reports'))
+        self._save_stream(response, save_path, progress, cancel)
+
+    def _save_stream(self, response, save_path, progress=None, cancel=None):
+        """
+        Write a streamed response to save_path, calling progress(received,
+        total) per chunk with the bytes read off the wire; total is None when
+        the length is not known. The file only appears at save_path once the
+        download is complete.
+        """
+        # Content-Length counts the possibly compressed bytes, as does raw.tell().
+        total = int(response.headers['Content-Length']) if 'Content-Length' in response.headers else None
+        partial_path = save_path + '.part'
+        try:
+            with response, open(partial_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=TRANSFER_CHUNK_SIZE):
+                    _check_cancelled(cancel)
+                    f.write(chunk)
+                    if progress:
+                        progress(response.raw.tell(), total)
+            os.replace(partial_path, save_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+
+class RequestWorker(QThread):
+    """Run one blocking API call on a worker thread"""
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(object)
+    progressed = pyqtSignal(object, object)
+
+    # Minimum seconds between progress signals, so fast transfers do not
+    # flood the GUI thread's event queue.
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, fn, args, kwargs, parent=None):
+        super().__init__(parent)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.cancel_event = threading.Event()
+        self._last_progress = 0.0
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def report_progress(self, done, total):
+        now = time.monotonic()
+        if done == total or now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = now
+            self.progressed.emit(done, total)
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as exc:
+            self.failed.emit(exc)
+        else:
+            self.succeeded.emit(result)
+
+
+class _Request:
+    """An in-flight request and the callbacks waiting on it"""
+    def __init__(self, worker):
+        self.worker = worker
+        self.on_success = []
+        self.on_error = []
+        self.on_progress = []
+
+
+class RequestExecutor(QObject):
+    """
+    Run API calls off the GUI thread and deliver their results on it.
+
+    Requests are identified by a key: submitting a key that is already in
+    flight attaches the new callbacks to the running request instead of
+    starting another one. A cancelled request delivers no callbacks.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._requests = {}
+        self._workers = set()
+
+    def submit(self, key, fn, *args, on_success=None, on_error=None, on_progress=None, **kwargs):
+        """
+        Call fn(*args, **kwargs) on a worker thread. If on_progress is given,
+        fn is also passed progress= and cancel= so it can report progress
+        and stop early; other calls just have their result discarded when
+        cancelled.
+        """
+        request = self._requests.get(key)
+        if request is None:
+            worker = RequestWorker(fn, args, kwargs, self)
+            if on_progress is not None:
+                worker.kwargs.update(progress=worker.report_progress, cancel=worker.cancel_event)
+            worker.succeeded.connect(self._on_succeeded)
+            worker.failed.connect(self._on_failed)
+            worker.progressed.connect(self._on_progressed)
+            worker.finished.connect(self._on_finished)
+            request = self._requests[key] = _Request(worker)
+            self._workers.add(worker)
+            worker.start()
+        for callbacks, callback in [(request.on_success, on_success),
+                                    (request.on_error, on_error),
+                                    (request.on_progress, on_progress)]:
+            if callback is not None:
+                callbacks.append(callback)
+        return key
+
+    def is_running(self, key):
+        return key in self._requests
+
+    def cancel(self, key):
+        request = self._requests.pop(key, None)
+        if request is not None:
+            request.worker.cancel()
+
+    def shutdown(self, timeout_ms=5000):
+        """Cancel everything in flight and wait briefly for the workers to stop"""
+        for key in list(self._requests):
+            self.cancel(key)
+        for worker in list(self._workers):
+            worker.wait(timeout_ms)
+
+    def _take(self, worker):
+        """Remove and return the request run by worker, unless it was cancelled"""
+        for key, request in self._requests.items():
+            if request.worker is worker:
+                return self._requests.pop(key)
+        return None
+
+    @pyqtSlot(object)
+    def _on_succeeded(self, result):
+        request = self._take(self.sender())
+        for callback in request.on_success if request else []:
+            callback(result)
+
+    @pyqtSlot(object)
+    def _on_failed(self, exc):
+        request = self._take(self.sender())
+        if request is None or isinstance(exc, RequestCancelled):
+            return
+        for callback in request.on_error:
+            callback(exc)
+
+    @pyqtSlot(object, object)
+    def _on_progressed(self, done, total):
+        for request in self._requests.values():
+            if request.worker is self.sender():
+                for callback in request.on_progress:
+                    callback(done, total)
+
+    @pyqtSlot()
+    def _on_finished(self):
+        worker = self.sender()
+        self._workers.discard(worker)
+        worker.deleteLater()
 
 
 class LoginWindow(QWidget):
@@ -384,17 +980,17 @@ class ChartWidget(QWidget):
         self.canvas.draw()
     
     def plot_parameters(self, equipment_data):
-        if not equipment_data:
+        if equipment_data is None or len(equipment_data) == 0:
             self._show_empty("No equipment data available")
             return
         self.figure.clear()
         ax = self.figure.add_subplot(111)
         ax.set_facecolor('#1e293b')
         
-        names = [e['equipment_name'] for e in equipment_data]
-        flowrates = [e['flowrate'] for e in equipment_data]
-        pressures = [e['pressure'] for e in equipment_data]
-        temps = [e['temperature'] for e in equipment_data]
+        names = equipment_data['equipment_name'].tolist()
+        flowrates = equipment_data['flowrate'].to_numpy()
+        pressures = equipment_data['pressure'].to_numpy()
+        temps = equipment_data['temperature'].to_numpy()
         
         x = range(len(names))
         width = 0.25
@@ -418,6 +1014,34 @@ class ChartWidget(QWidget):
         self.figure.tight_layout()
         self.canvas.draw()
 
+    def plot_series(self, chart_data):
+        """Plot downsampled parameter series from the chart-data endpoint"""
+        series = (chart_data or {}).get('series') or {}
+        if not series.get('flowrate', {}).get('x'):
+            self._show_empty("No equipment data available")
+            return
+        self.figure.clear()
+        ax = self.figure.add_subplot(111)
+        ax.set_facecolor('#1e293b')
+
+        for name, label, color in [('flowrate', 'Flowrate', '#3b82f6'),
+                                   ('pressure', 'Pressure', '#8b5cf6'),
+                                   ('temperature', 'Temperature', '#ec4899')]:
+            ax.plot(series[name]['x'], series[name]['y'], label=label, color=color, linewidth=1)
+
+        ax.set_xlabel(f"Equipment row ({chart_data.get('total_count', 0)} rows, downsampled)", color='white')
+        ax.set_ylabel('Values', color='white')
+        ax.set_title('Equipment Parameters Comparison', color='white', pad=20)
+        ax.tick_params(colors='white')
+        ax.legend(facecolor='#1e293b', edgecolor='white', labelcolor='white')
+        ax.spines['bottom'].set_color('white')
+        ax.spines['left'].set_color('white')
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+
+        self.figure.tight_layout()
+        self.canvas.draw()
+
 
 class MainWindow(QMainWindow):
     """Main application window"""
@@ -426,6 +1050,9 @@ class MainWindow(QMainWindow):
         self.api_client = api_client
         self.user_data = user_data
         self.current_dataset = None
+        self.executor = RequestExecutor(self)
+        # Status bar transfers, key -> label; the most recent one is shown.
+        self.transfers = {}
         self.init_ui()
     
     def init_ui(self):
@@ -504,6 +1131,93 @@ class MainWindow(QMainWindow):
         self.tabs.addTab(self.create_dashboard_tab(), "Dashboard")
         self.tabs.addTab(self.create_history_tab(), "History")
         main_layout.addWidget(self.tabs)
+
+        self.create_status_bar()
+
+    def create_status_bar(self):
+        status_bar = self.statusBar()
+        status_bar.setStyleSheet("color: #94a3b8;")
+        self.transfer_label = QLabel()
+        self.transfer_progress = QProgressBar()
+        self.transfer_progress.setMaximumWidth(260)
+        self.transfer_progress.setTextVisible(False)
+        self.transfer_cancel_btn = QPushButton("Cancel")
+        self.transfer_cancel_btn.setStyleSheet("padding: 4px 12px; font-size: 12px; background-color: #475569;")
+        self.transfer_cancel_btn.clicked.connect(self.cancel_transfer)
+        for widget in (self.transfer_label, self.transfer_progress, self.transfer_cancel_btn):
+            status_bar.addPermanentWidget(widget)
+            widget.hide()
+
+    def closeEvent(self, event):
+        self.executor.shutdown()
+        self.api_client.discard_uploads()
+        super().closeEvent(event)
+
+    def run_transfer(self, key, label, fn, *args, on_success, error_message, track_progress=False):
+        """
+        Run a user-initiated API call in the background, shown in the status
+        bar with a Cancel button until it finishes. fn must accept progress=
+        and cancel= when track_progress is set.
+        """
+        if self.executor.is_running(key):
+            self.statusBar().showMessage(f"{label} is already in progress", 3000)
+            return
+
+        def succeeded(result):
+            self._end_transfer(key)
+            on_success(result)
+
+        def failed(exc):
+            self._end_transfer(key)
+            QMessageBox.critical(self, "Error", f"{error_message}: {str(exc)}")
+
+        self.transfers[key] = label
+        self._show_transfer(key)
+        self.executor.submit(
+            key, fn, *args,
+            on_success=succeeded,
+            on_error=failed,
+            on_progress=(lambda done, total: self._update_transfer(key, done, total)) if track_progress else None,
+        )
+
+    def _current_transfer(self):
+        return next(reversed(self.transfers), None)
+
+    def _show_transfer(self, key):
+        self.transfer_label.setText(self.transfers[key])
+        # Busy indicator until the first progress report
+        self.transfer_progress.setRange(0, 0)
+        for widget in (self.transfer_label, self.transfer_progress, self.transfer_cancel_btn):
+            widget.show()
+
+    def _update_transfer(self, key, done, total):
+        if key != self._current_transfer():
+            return
+        label = self.transfers[key]
+        if total:
+            self.transfer_progress.setRange(0, 1000)
+            self.transfer_progress.setValue(int(done * 1000 / total))
+            self.transfer_label.setText(f"{label} {format_size(done)} / {format_size(total)}")
+        else:
+            self.transfer_label.setText(f"{label} {format_size(done)}")
+
+    def _end_transfer(self, key):
+        self.transfers.pop(key, None)
+        current = self._current_transfer()
+        if current is not None:
+            self._show_transfer(current)
+            return
+        for widget in (self.transfer_label, self.transfer_progress, self.transfer_cancel_btn):
+            widget.hide()
+
+    def cancel_transfer(self):
+        key = self._current_transfer()
+        if key is None:
+            return
+        label = self.transfers[key]
+        self.executor.cancel(key)
+        self._end_transfer(key)
+        self.statusBar().showMessage(f"{label} cancelled", 3000)
     
     def create_header(self):
         header = QWidget()
@@ -618,6 +1332,11 @@ class MainWindow(QMainWindow):
         download_btn.clicked.connect(self.download_selected_report)
         controls.addWidget(download_btn)
 
+        download_all_btn = QPushButton("Download All Reports")
+        download_all_btn.setStyleSheet("background-color: #10b981;")
+        download_all_btn.clicked.connect(self.download_all_reports)
+        controls.addWidget(download_all_btn)
+
         controls.addStretch()
         layout.addLayout(controls)
         
@@ -633,7 +1352,8 @@ class MainWindow(QMainWindow):
     
     def select_file(self):
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "Select CSV File", "", "CSV Files (*.csv)"
+            self, "Select Data File", "",
+            "Equipment Data (*.csv *.csv.gz *.csv.zst *.parquet *.xlsx);;CSV Files (*.csv)"
         )
         if file_path:
             self.selected_file = file_path
@@ -644,13 +1364,20 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Error", "Please select a file first")
             return
         
-        try:
-            dataset = self.api_client.upload_csv(self.selected_file)
-            self.current_dataset = dataset
-            self.display_dataset(dataset)
-            QMessageBox.information(self, "Success", "File uploaded successfully!")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
+        self.run_transfer(
+            ('upload', self.selected_file),
+            f"Uploading {os.path.basename(self.selected_file)}",
+            self.api_client.upload_csv, self.selected_file,
+            on_success=self._upload_finished,
+            error_message="Upload failed",
+            track_progress=True,
+        )
+
+    def _upload_finished(self, dataset):
+        self.current_dataset = dataset
+        self.display_dataset(dataset)
+        self.load_history()
+        QMessageBox.information(self, "Success", "File uploaded successfully!")
     
     def display_dataset(self, dataset):
         if not isinstance(dataset, dict):
@@ -671,9 +1398,14 @@ class MainWindow(QMainWindow):
         # Plot charts
         self.chart1.plot_distribution(dataset.get('equipment_distribution') or {})
         
-        equipment = dataset.get('equipment') or []
-        if equipment:
-            self.chart2.plot_parameters(equipment)
+        equipment = dataset.get('equipment')
+        if not isinstance(equipment, pd.DataFrame):
+            equipment = pd.DataFrame(equipment or [], columns=EQUIPMENT_COLUMNS)
+        if len(equipment):
+            if len(equipment) > MAX_BAR_CHART_ROWS and dataset.get('id'):
+                self.load_chart_data(dataset['id'])
+            else:
+                self.chart2.plot_parameters(equipment)
             
             # Display table
             self.data_table.setRowCount(len(equipment))
@@ -682,34 +1414,54 @@ class MainWindow(QMainWindow):
                 "Name", "Type", "Flowrate", "Pressure", "Temperature"
             ])
             
-            for i, eq in enumerate(equipment):
-                self.data_table.setItem(i, 0, QTableWidgetItem(eq['equipment_name']))
-                self.data_table.setItem(i, 1, QTableWidgetItem(eq['equipment_type']))
-                self.data_table.setItem(i, 2, QTableWidgetItem(f"{eq['flowrate']:.1f}"))
-                self.data_table.setItem(i, 3, QTableWidgetItem(f"{eq['pressure']:.1f}"))
-                self.data_table.setItem(i, 4, QTableWidgetItem(f"{eq['temperature']:.1f}"))
+            for i, eq in enumerate(equipment.itertuples(index=False)):
+                self.data_table.setItem(i, 0, QTableWidgetItem(eq.equipment_name))
+                self.data_table.setItem(i, 1, QTableWidgetItem(eq.equipment_type))
+                self.data_table.setItem(i, 2, QTableWidgetItem(f"{eq.flowrate:.1f}"))
+                self.data_table.setItem(i, 3, QTableWidgetItem(f"{eq.pressure:.1f}"))
+                self.data_table.setItem(i, 4, QTableWidgetItem(f"{eq.temperature:.1f}"))
         else:
-            self.chart2.plot_parameters([])
+            self.chart2.plot_parameters(None)
             self.data_table.setRowCount(0)
             self.data_table.setColumnCount(0)
 
         self.download_btn.setEnabled(bool(dataset.get('id')))
     
+    def load_chart_data(self, dataset_id):
+        self.chart2._show_empty("Loading chart...")
+        self.executor.submit(
+            ('chart-data', dataset_id),
+            self.api_client.get_chart_data, dataset_id,
+            on_success=lambda chart_data: self._show_chart_data(dataset_id, chart_data),
+            on_error=lambda exc: self.chart2._show_empty("Failed to load chart data"),
+        )
+
+    def _show_chart_data(self, dataset_id, chart_data):
+        # Ignore charts for a dataset that is no longer displayed.
+        if self.current_dataset and self.current_dataset.get('id') == dataset_id:
+            self.chart2.plot_series(chart_data)
+
     def load_history(self):
-        try:
-            datasets = self.api_client.get_history()
-            self.history_table.setRowCount(len(datasets))
-            
-            for i, ds in enumerate(datasets):
-                filename_item = QTableWidgetItem(ds['filename'])
-                filename_item.setData(Qt.UserRole, ds['id'])
-                self.history_table.setItem(i, 0, filename_item)
-                self.history_table.setItem(i, 1, QTableWidgetItem(ds['uploaded_at'][:19]))
-                self.history_table.setItem(i, 2, QTableWidgetItem(str(ds['total_count'])))
-                self.history_table.setItem(i, 3, QTableWidgetItem(f"{ds['avg_flowrate']:.2f}"))
-                self.history_table.setItem(i, 4, QTableWidgetItem(f"{ds['avg_pressure']:.2f}"))
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to load history: {str(e)}")
+        # Repeated refreshes while one is in flight share its result.
+        self.executor.submit(
+            ('history',),
+            self.api_client.get_history,
+            on_success=self._show_history,
+            on_error=lambda exc: QMessageBox.critical(self, "Error", f"Failed to load history: {str(exc)}"),
+        )
+
+    def _show_history(self, datasets):
+        self._note_offline()
+        self.history_table.setRowCount(len(datasets))
+
+        for i, ds in enumerate(datasets):
+            filename_item = QTableWidgetItem(ds['filename'])
+            filename_item.setData(Qt.UserRole, ds['id'])
+            self.history_table.setItem(i, 0, filename_item)
+            self.history_table.setItem(i, 1, QTableWidgetItem(ds['uploaded_at'][:19]))
+            self.history_table.setItem(i, 2, QTableWidgetItem(str(ds['total_count'])))
+            self.history_table.setItem(i, 3, QTableWidgetItem(f"{ds['avg_flowrate']:.2f}"))
+            self.history_table.setItem(i, 4, QTableWidgetItem(f"{ds['avg_pressure']:.2f}"))
 
     def get_selected_history_id(self):
         row = self.history_table.currentRow()
@@ -725,13 +1477,23 @@ class MainWindow(QMainWindow):
         if not dataset_id:
             QMessageBox.warning(self, "Select Dataset", "Please select a dataset from history.")
             return
-        try:
-            dataset = self.api_client.get_dataset(dataset_id)
-            self.current_dataset = dataset
-            self.display_dataset(dataset)
-            self.tabs.setCurrentIndex(0)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to load dataset: {str(e)}")
+        self.run_transfer(
+            ('dataset', dataset_id),
+            "Loading dataset",
+            self.api_client.get_dataset, dataset_id,
+            on_success=self._show_selected_dataset,
+            error_message="Failed to load dataset",
+        )
+
+    def _note_offline(self):
+        if self.api_client.offline:
+            self.statusBar().showMessage("Offline: showing saved copies of your datasets", 10000)
+
+    def _show_selected_dataset(self, dataset):
+        self._note_offline()
+        self.current_dataset = dataset
+        self.display_dataset(dataset)
+        self.tabs.setCurrentIndex(0)
 
     def download_current_report(self):
         if not self.current_dataset:
@@ -746,23 +1508,50 @@ class MainWindow(QMainWindow):
             return
         self.download_report(dataset_id)
 
+    def download_all_reports(self):
+        dataset_ids = [
+            self.history_table.item(row, 0).data(Qt.UserRole)
+            for row in range(self.history_table.rowCount())
+            if self.history_table.item(row, 0)
+        ]
+        if not dataset_ids:
+            QMessageBox.warning(self, "No Datasets", "There are no datasets in history.")
+            return
+        save_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save Reports",
+            "equipment-reports.zip",
+            "ZIP Archives (*.zip)"
+        )
+        if not save_path:
+            return
+        self.run_transfer(
+            ('reports', tuple(dataset_ids), save_path),
+            "Downloading reports",
+            self.api_client.download_reports, dataset_ids, save_path,
+            on_success=lambda _: QMessageBox.information(self, "Reports Saved", f"Reports saved to:\n{save_path}"),
+            error_message="Failed to download reports",
+            track_progress=True,
+        )
+
     def download_report(self, dataset_id):
-        try:
-            pdf_bytes = self.api_client.generate_report(dataset_id)
-            default_name = f"equipment-report-{dataset_id}.pdf"
-            save_path, _ = QFileDialog.getSaveFileName(
-                self,
-                "Save Report",
-                default_name,
-                "PDF Files (*.pdf)"
-            )
-            if not save_path:
-                return
-            with open(save_path, 'wb') as f:
-                f.write(pdf_bytes)
-            QMessageBox.information(self, "Report Saved", f"Report saved to:\n{save_path}")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to download report: {str(e)}")
+        default_name = f"equipment-report-{dataset_id}.pdf"
+        save_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save Report",
+            default_name,
+            "PDF Files (*.pdf)"
+        )
+        if not save_path:
+            return
+        self.run_transfer(
+            ('report', dataset_id, save_path),
+            "Downloading report",
+            self.api_client.download_report, dataset_id, save_path,
+            on_success=lambda _: QMessageBox.information(self, "Report Saved", f"Report saved to:\n{save_path}"),
+            error_message="Failed to download report",
+            track_progress=True,
+        )
 
 
 def main():
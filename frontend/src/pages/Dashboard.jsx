@@ -1,4 +1,4 @@
-import React, { useState, useRef } from 'react';
+import React, { useState, useRef, useEffect } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { Upload, FileText, Download, TrendingUp, Activity, Thermometer, Gauge, MonitorDown } from 'lucide-react';
 import { Chart as ChartJS, CategoryScale, LinearScale, BarElement, LineElement, PointElement, ArcElement, Title, Tooltip, Legend } from 'chart.js';
@@ -10,12 +10,33 @@ import AnimatedBackground from '../components/AnimatedBackground';
 
 ChartJS.register(CategoryScale, LinearScale, BarElement, LineElement, PointElement, ArcElement, Title, Tooltip, Legend);
 
+// Above this many rows the parameter chart uses server-side downsampled
+// series instead of one bar group per equipment row.
+const MAX_BAR_CHART_ROWS = 50;
+const CHART_POINTS = 400;
+
 const Dashboard = () => {
   const [dataset, setDataset] = useState(null);
   const [loading, setLoading] = useState(false);
   const [uploading, setUploading] = useState(false);
+  const [chartData, setChartData] = useState(null);
   const fileInputRef = useRef(null);
 
+  useEffect(() => {
+    setChartData(null);
+    if (!dataset?.id || dataset.total_count <= MAX_BAR_CHART_ROWS) return;
+
+    let cancelled = false;
+    datasetAPI.getChartData(dataset.id, { points: CHART_POINTS })
+      .then((response) => {
+        if (!cancelled) setChartData(response.data);
+      })
+      .catch(() => toast.error('Failed to load chart data'));
+    return () => {
+      cancelled = true;
+    };
+  }, [dataset]);
+
   const getDesktopDownloadUrl = () => {
     const urls = {
       windows: import.meta.env.VITE_DESKTOP_WINDOWS_URL,
@@ -128,6 +149,26 @@ const Dashboard = () => {
     }]
   };
 
+  const toPoints = (series) => series.x.map((x, i) => ({ x, y: series.y[i] }));
+  const lineData = chartData && {
+    datasets: [{
+      label: 'Flowrate',
+      data: toPoints(chartData.series.flowrate),
+      borderColor: 'rgba(59, 130, 246, 0.8)',
+      pointRadius: 0,
+    }, {
+      label: 'Pressure',
+      data: toPoints(chartData.series.pressure),
+      borderColor: 'rgba(139, 92, 246, 0.8)',
+      pointRadius: 0,
+    }, {
+      label: 'Temperature',
+      data: toPoints(chartData.series.temperature),
+      borderColor: 'rgba(236, 72, 153, 0.8)',
+      pointRadius: 0,
+    }]
+  };
+
   const chartOptions = {
     responsive: true,
     maintainAspectRatio: false,
@@ -179,7 +220,7 @@ const Dashboard = () => {
             <input
               ref={fileInputRef}
               type="file"
-              accept=".csv"
+              accept=".csv,.csv.gz,.csv.zst,.parquet,.xlsx"
               onChange={handleFileUpload}
               className="hidden"
             />
@@ -243,7 +284,14 @@ const Dashboard = () => {
               </ChartCard>
               <ChartCard title="Parameter Comparison">
                 <div className="h-80">
-                  <Bar data={barData} options={chartOptions} />
+                  {lineData ? (
+                    <Line
+                      data={lineData}
+                      options={{ ...chartOptions, scales: { ...chartOptions.scales, x: { ...chartOptions.scales.x, type: 'linear' } } }}
+                    />
+                  ) : (
+                    <Bar data={barData} options={chartOptions} />
+                  )}
                 </div>
               </ChartCard>
             </div>
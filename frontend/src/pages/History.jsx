@@ -37,6 +37,24 @@ const History = () => {
     }
   };
 
+  const handleDownloadAll = async () => {
+    try {
+      const response = await datasetAPI.downloadReports(datasets.map(d => d.id));
+      const blob = new Blob([response.data], { type: 'application/zip' });
+      const url = window.URL.createObjectURL(blob);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = 'equipment-reports.zip';
+      document.body.appendChild(link);
+      link.click();
+      link.remove();
+      window.URL.revokeObjectURL(url);
+      toast.success('Reports downloaded!');
+    } catch (error) {
+      toast.error('Failed to download reports');
+    }
+  };
+
   const handleDownload = async (id) => {
     try {
       const response = await datasetAPI.generateReport(id);
@@ -70,9 +88,22 @@ const History = () => {
           <h1 className="text-5xl font-display font-bold text-gradient mb-3">
             Upload History
           </h1>
-          <p className="text-blue-300/70 text-lg">
-            View and manage your last 5 uploaded datasets
-          </p>
+          <div className="flex items-center justify-between">
+            <p className="text-blue-300/70 text-lg">
+              View and manage your last 5 uploaded datasets
+            </p>
+            {datasets.length > 0 && (
+              <motion.button
+                whileHover={{ scale: 1.05 }}
+                whileTap={{ scale: 0.95 }}
+                onClick={handleDownloadAll}
+                className="flex items-center space-x-2 px-4 py-2 rounded-lg bg-green-500/20 hover:bg-green-500/30 border border-green-500/30"
+              >
+                <Download className="w-5 h-5 text-green-400" />
+                <span>Download All Reports</span>
+              </motion.button>
+            )}
+          </div>
         </motion.div>
 
         {loading ? (
@@ -54,9 +54,16 @@ export const authAPI = {
     api.get('/accounts/auth/user/'),
 };
 
-// Dataset API
-export const datasetAPI = {
-  upload: (file) => {
+const JOB_POLL_INTERVAL_MS = 500;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// CSV exports compress 10-20x, so send them gzip-compressed as the raw
+// request body with Content-Encoding; the backend decompresses them while
+// parsing. Other formats, and browsers without CompressionStream, use a
+// plain multipart upload.
+const postUpload = async (file) => {
+  if (typeof CompressionStream === 'undefined' || !file.name.toLowerCase().endsWith('.csv')) {
     const formData = new FormData();
     formData.append('file', file);
     return api.post('/equipments/datasets/upload/', formData, {
@@ -64,7 +71,37 @@ export const datasetAPI = {
         'Content-Type': 'multipart/form-data',
       },
     });
+  }
+  const compressed = await new Response(file.stream().pipeThrough(new CompressionStream('gzip'))).blob();
+  return api.post('/equipments/datasets/upload/', compressed, {
+    headers: {
+      'Content-Type': 'text/csv',
+      'Content-Encoding': 'gzip',
+      'Content-Disposition': `attachment; filename*=UTF-8''${encodeURIComponent(file.name)}`,
+    },
+  });
+};
+
+// Dataset API
+export const datasetAPI = {
+  // Uploads are ingested in the background: wait for the job, then resolve
+  // with the dataset response so callers can use `response.data` as before.
+  upload: async (file) => {
+    let { data: job } = await postUpload(file);
+    while (job.state !== 'succeeded' && job.state !== 'failed') {
+      await sleep(JOB_POLL_INTERVAL_MS);
+      ({ data: job } = await datasetAPI.getJob(job.id));
+    }
+    if (job.state === 'failed') {
+      const error = new Error(job.error || 'Upload failed');
+      error.response = { data: { error: job.error || 'Upload failed' } };
+      throw error;
+    }
+    return datasetAPI.getById(job.dataset);
   },
+
+  getJob: (id) =>
+    api.get(`/equipments/datasets/jobs/${id}/`),
   
   getAll: () =>
     api.get('/equipments/datasets/'),
@@ -72,6 +109,14 @@ export const datasetAPI = {
   getById: (id) =>
     api.get(`/equipments/datasets/${id}/`),
   
+  // params: { cursor, page_size, fields, ordering, type, flowrate_min, ... }
+  getEquipment: (id, params = {}) =>
+    api.get(`/equipments/datasets/${id}/equipment/`, { params }),
+  
+  // params: { bins, points, method: 'lttb' | 'minmax' }
+  getChartData: (id, params = {}) =>
+    api.get(`/equipments/datasets/${id}/chart-data/`, { params }),
+  
   getSummary: (id) =>
     api.get(`/equipments/datasets/${id}/summary/`),
   
@@ -85,6 +130,12 @@ export const datasetAPI = {
     api.get(`/equipments/datasets/${id}/generate_report/`, {
       responseType: 'blob',
     }),
+
+  downloadReports: (ids) =>
+    api.get('/equipments/datasets/reports/bulk/', {
+      params: { ids: ids.join(',') },
+      responseType: 'blob',
+    }),
 };
 
 export default api;